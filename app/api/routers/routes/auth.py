@@ -49,7 +49,7 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     await db.commit()
 
     # ✅ Send email
-    send_auth_otp_email(
+    await send_auth_otp_email(
         email=new_user.email,
         name=new_user.full_name or "User",
         otp=otp
@@ -143,7 +143,7 @@ async def resend_otp(
     await db.commit()
 
     # ✅ New Template Mail
-    resend_auth_otp_email(
+    await resend_auth_otp_email(
         email=user.email,
         name=user.full_name or "User",
         otp=otp
@@ -177,7 +177,7 @@ async def create_pharmacist_account(
     await db.commit()
 
     # ✅ Send OTP Email
-    send_auth_otp_email(
+    await send_auth_otp_email(
         email=new_user.email,
         name=new_user.full_name,
         otp=otp
@@ -245,7 +245,7 @@ async def create_delivery_agent_account(
     )
     await db.commit()
 
-    send_auth_otp_email(
+    await send_auth_otp_email(
         email=new_user.email,
         name=new_user.full_name,
         otp=otp
@@ -455,7 +455,7 @@ async def forgot_password(email: str, db: AsyncSession = Depends(get_db)):
     </html>
     """
 
-    send_html_email(
+    await send_html_email(
         to_email=user.email,
         subject="Password Reset Request",
         html_body=email_body
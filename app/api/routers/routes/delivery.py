@@ -11,19 +11,18 @@ from core.websocket_manager import manager   # ✅ ADD THIS
 from models.order_address import OrderAddress
 from models.delivery import Delivery, DeliveryCancelReason, DeliveryStatus
 from models.order import Order, OrderStatus
-from models.order_item import OrderItem
 from models.user import User
  
-from services.redis_geo_service import RedisGeoService
+from services.agent_availability_service import AgentAvailability
 from services.delivery_otp_redis_service import DeliveryOTPService
 from services.email_service import (
     send_delivery_assignment_email,
     send_delivery_otp_email,
     resend_delivery_otp_email,
-    send_invoice_email,
 )
-from services.invoice_service import generate_gst_invoice
+from services.invoice_service import enqueue_invoice
 from services.eta_service import calculate_eta
+from services.trip_history_service import schedule_trip_summary
  
  
 router = APIRouter(prefix="/delivery", tags=["Delivery"])
@@ -65,23 +64,25 @@ async def assign_delivery(
     if not address:
         raise HTTPException(400, "Order address missing")
 
-    # 🔍 Find nearest delivery agent
-    agent_id = await RedisGeoService.find_nearest_agent(
+    # 🔍 Nearest *available* agent, reserved atomically
+    agent_id = await AgentAvailability.claim_nearest(
         redis, address.latitude, address.longitude
     )
 
     if not agent_id:
-        raise HTTPException(404, "No delivery agents nearby")
+        raise HTTPException(404, "No delivery agents available nearby")
 
-    agent = await db.get(User, int(agent_id))
+    agent = await db.get(User, agent_id)
 
     if not agent:
+        await AgentAvailability.release(redis, agent_id)
         raise HTTPException(
             status_code=404,
             detail="Assigned delivery agent not found in database"
         )
 
     if agent.last_latitude is None or agent.last_longitude is None:
+        await AgentAvailability.release(redis, agent_id)
         raise HTTPException(
             status_code=400,
             detail="Agent location not available"
@@ -123,8 +124,31 @@ async def assign_delivery(
         }
     )
 
+    # 📡 Agent → customers riding along (location fan-out)
+    await redis.hset(f"delivery:agent:{agent.id}:orders", order.id, order.user_id)
+
+    # 🔔 Push to rider + customer
+    await manager.send_delivery(
+        agent.id,
+        {
+            "event": "DELIVERY_ASSIGNED",
+            "order_id": order.id,
+            "eta_minutes": eta
+        }
+    )
+    await manager.send_user(
+        order.user_id,
+        {
+            "event": "DELIVERY_ASSIGNED",
+            "order_id": order.id,
+            "agent_id": agent.id,
+            "agent_name": agent.full_name,
+            "eta_minutes": eta
+        }
+    )
+
     # 📧 Send email notification
-    send_delivery_assignment_email(agent.email, order.id)
+    await send_delivery_assignment_email(agent.email, order.id)
 
     return {
         "message": "Delivery assigned successfully",
@@ -174,6 +198,9 @@ async def confirm_pickup(
  
     await db.commit()
  
+    # rider is demonstrably online and carrying this order → busy
+    await AgentAvailability.mark_online(redis, agent.id)
+ 
     # 🔔 Notify customer
     await manager.send_user(
         order.user_id,
@@ -207,9 +234,9 @@ async def generate_delivery_otp(
     customer = await db.get(User, order.user_id)
  
     if resend:
-        resend_delivery_otp_email(customer.email, customer.full_name, otp)
+        await resend_delivery_otp_email(customer.email, customer.full_name, otp)
     else:
-        send_delivery_otp_email(customer.email, customer.full_name, otp)
+        await send_delivery_otp_email(customer.email, customer.full_name, otp)
  
     return {"message": "OTP sent", "expires_in": 300}
  
@@ -238,18 +265,14 @@ async def verify_delivery_otp(
     order = await db.get(Order, order_id)
     order.status = OrderStatus.DELIVERED
  
-    items = (
-        await db.execute(select(OrderItem).where(OrderItem.order_id == order_id))
-    ).scalars().all()
- 
-    invoice_path = generate_gst_invoice(order, items)
-    order.invoice_path = invoice_path
- 
-    customer = await db.get(User, order.user_id)
-    send_invoice_email(customer.email, order.id, invoice_path)
- 
     await db.commit()
+
+    # 🧾 PDF + email happen in the invoice worker
+    await enqueue_invoice(redis, order.id)
     await redis.hset(f"delivery:order:{order_id}", "status", "DELIVERED")
+    await schedule_trip_summary(redis, delivery.id)
+    await redis.hdel(f"delivery:agent:{agent.id}:orders", order_id)
+    await AgentAvailability.release(redis, agent.id)
  
     # 🔔 PUSH TO CUSTOMER
     await manager.send_user(
@@ -261,7 +284,7 @@ async def verify_delivery_otp(
         }
     )
  
-    return {"message": "Order delivered successfully"}
+    return {"message": "Order delivered successfully", "invoice_status": "QUEUED"}
  
  
 # ======================================================
@@ -301,6 +324,9 @@ async def cancel_delivery(
     delivery.status = DeliveryStatus.CANCELLED
     delivery.cancel_reason = reason
     delivery.cancelled_at = datetime.now(timezone.utc)
+
+    await redis.hdel(f"delivery:agent:{agent.id}:orders", order_id)
+    await AgentAvailability.release(redis, agent.id)
  
     order = await db.get(Order, order_id)
  
@@ -349,10 +375,12 @@ async def cancel_delivery(
         )
     ).scalar_one_or_none()
  
-    new_agent_id = await RedisGeoService.find_nearest_agent(
+    # never hand it straight back to the agent who cancelled
+    new_agent_id = await AgentAvailability.claim_nearest(
         redis,
         address.latitude,
-        address.longitude
+        address.longitude,
+        exclude_agent_id=agent.id,
     )
  
     if not new_agent_id:
@@ -364,14 +392,18 @@ async def cancel_delivery(
     db.add(
         Delivery(
             order_id=order_id,
-            delivery_user_id=int(new_agent_id),
+            delivery_user_id=new_agent_id,
             status=DeliveryStatus.ASSIGNED,
             assigned_at=datetime.now(timezone.utc)
         )
     )
  
+    order.delivery_agent_id = new_agent_id
     order.status = OrderStatus.OUT_FOR_DELIVERY
     await db.commit()
+
+    await redis.hset(f"delivery:order:{order_id}", mapping={"agent_id": new_agent_id, "status": "ASSIGNED"})
+    await redis.hset(f"delivery:agent:{new_agent_id}:orders", order_id, order.user_id)
  
     return {
         "message": "Delivery cancelled and reassigned",
@@ -6,6 +6,8 @@ from core.database import get_db
 from core.rbac import require_role
 from models.user import User
 from services.geocoding_service import geocode_address
+from services.redis_geo_service import RedisGeoService
+from services.agent_availability_service import AgentAvailability
 from core.redis import get_redis
 
 import enum
@@ -59,10 +61,8 @@ async def set_delivery_address(
 
     # 🔹 Push to Redis GEO
     redis = await get_redis()
-    await redis.geoadd(
-        "delivery_agents:live",
-        (lng, lat, current_user.id)
-    )
+    await RedisGeoService.update_agent_location(redis, current_user.id, lat, lng)
+    await AgentAvailability.mark_online(redis, current_user.id)
 
     await db.commit()
 
@@ -83,14 +83,13 @@ async def go_online_delivery(
         raise HTTPException(400, "Delivery address not set")
 
     redis = await get_redis()
-    await redis.geoadd(
-        "delivery_agents:live",
-        (
-            current_user.last_longitude,
-            current_user.last_latitude,
-            current_user.id,
-        ),
+    await RedisGeoService.update_agent_location(
+        redis,
+        current_user.id,
+        current_user.last_latitude,
+        current_user.last_longitude,
     )
+    await AgentAvailability.mark_online(redis, current_user.id)
 
     current_user.is_online = True
     await db.commit()
@@ -103,7 +102,8 @@ async def go_offline_delivery(
     current_user: User = Depends(require_role("delivery_agent")),
 ):
     redis = await get_redis()
-    await redis.zrem("delivery_agents:live", current_user.id)
+    await RedisGeoService.remove_agent(redis, current_user.id)
+    await AgentAvailability.mark_offline(redis, current_user.id)
 
     current_user.is_online = False
     await db.commit()
@@ -1,27 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import select
 
 from core.database import get_db
 from core.redis import get_redis
 from core.rbac import require_role
-from core.websocket_manager import manager
 
-from schemas.agent_location import AgentLocationUpdate
+from schemas.agent_location import AgentLocationUpdate, AgentPointsBatch
 from models.delivery_location import DeliveryLocation
 from models.delivery import Delivery
+from models.order import Order
 from models.order_address import OrderAddress
 from models.user import User
 
-from services.delivery_live_service import DeliveryLiveService
+from services.gps_ingest_service import ingest_points
 from services.redis_geo_service import RedisGeoService
 from services.map_services import get_route_polyline
+from services.order_tracking_service import get_order_snapshot
 from services.geocoding_service import geocode_address
 
 router = APIRouter(prefix="/tracking", tags=["Tracking"])
 
 THROTTLE_SECONDS = 5
-OFFLINE_TTL = 30
 
 
 # ======================================================
@@ -48,31 +52,24 @@ async def update_agent_location(
         if datetime.now(timezone.utc) - last_time < timedelta(seconds=THROTTLE_SECONDS):
             return {"message": "Location throttled"}
 
-    await DeliveryLiveService.update_agent_location(redis, agent_id, latitude, longitude)
-
-    await redis.hset(
-        f"delivery:agent:{agent_id}",
-        mapping={
-            "lat": latitude,
-            "lng": longitude,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-            "online": 1
-        }
+    await ingest_points(
+        redis, agent.id, [(datetime.now(timezone.utc).timestamp(), latitude, longitude)]
     )
 
-    await redis.setex(f"delivery:agent:online:{agent_id}", OFFLINE_TTL, 1)
+    return {"message": "Location updated", "lat": latitude, "lng": longitude}
 
-    await manager.send_delivery(
-        agent.id,
-        {
-            "type": "AGENT_LOCATION",
-            "agent_id": agent.id,
-            "lat": latitude,
-            "lng": longitude,
-        }
-    )
 
-    return {"message": "Location updated", "lat": latitude, "lng": longitude}
+# ======================================================
+# 📍 RAW GPS INGESTION (batched, no geocoding)
+# ACCESS: DELIVERY_AGENT
+# ======================================================
+@router.post("/agent/points")
+async def ingest_agent_points(
+    payload: AgentPointsBatch,
+    redis=Depends(get_redis),
+    agent: User = Depends(require_role("delivery_agent")),
+):
+    return await ingest_points(redis, agent.id, payload.points)
 
 
 # ======================================================
@@ -108,7 +105,7 @@ async def live_delivery_tracking(
     if not agent_id:
         raise HTTPException(404, "Delivery not assigned")
 
-    location = await DeliveryLiveService.get_agent_location(redis, agent_id)
+    location = await RedisGeoService.get_agent_location(redis, agent_id)
     if not location:
         raise HTTPException(404, "Live location unavailable")
 
@@ -137,11 +134,11 @@ async def order_route_animation(
         await db.execute(select(OrderAddress).where(OrderAddress.order_id == order_id))
     ).scalar_one()
 
-    pos = await redis.geopos("delivery:agents:live", str(delivery.delivery_user_id))
-    if not pos or not pos[0]:
+    location = await RedisGeoService.get_agent_location(redis, delivery.delivery_user_id)
+    if not location:
         raise HTTPException(404, "Agent location unavailable")
 
-    lng, lat = pos[0]
+    lat, lng = location["lat"], location["lng"]
     polyline = get_route_polyline(
         f"{lat},{lng}",
         f"{address.latitude},{address.longitude}"
@@ -154,27 +151,109 @@ async def order_route_animation(
     }
 
 
+# ======================================================
+# 🧾 ORDER TRACKING SNAPSHOT (status + agent + ETA + route)
+# ACCESS: USER (own orders), ADMIN
+# ======================================================
+@router.get("/order/{order_id}/snapshot")
+async def order_tracking_snapshot(
+    order_id: int,
+    redis=Depends(get_redis),
+    db=Depends(get_db),
+    user=Depends(require_role("user", "admin")),
+):
+    # ownership first (one PK lookup) – the snapshot build calls the
+    # Directions API and fills the shared micro-cache
+    if user.role != "admin":
+        owner_id = await db.scalar(select(Order.user_id).where(Order.id == order_id))
+        if owner_id != user.id:
+            raise HTTPException(404, "Order not found")
+
+    snapshot = await get_order_snapshot(redis, order_id)
+    if not snapshot:
+        raise HTTPException(404, "Order not found")
+
+    return {k: v for k, v in snapshot.items() if k != "user_id"}
+
+
 # ======================================================
 # 📊 ADMIN LIVE MAP – ALL AGENTS
 # ACCESS: ADMIN
+# optional viewport: min_lat, min_lng, max_lat, max_lng
 # ======================================================
+class Viewport:
+    def __init__(
+        self,
+        min_lat: float | None = Query(None, ge=-90, le=90),
+        min_lng: float | None = Query(None, ge=-180, le=180),
+        max_lat: float | None = Query(None, ge=-90, le=90),
+        max_lng: float | None = Query(None, ge=-180, le=180),
+    ):
+        bounds = (min_lat, min_lng, max_lat, max_lng)
+        if any(b is not None for b in bounds) and any(b is None for b in bounds):
+            raise HTTPException(400, "Viewport needs min_lat, min_lng, max_lat and max_lng")
+
+        self.bounds = bounds if min_lat is not None else None
+
+
+async def _agent_positions(redis, viewport: Viewport) -> dict:
+    if viewport.bounds:
+        return await RedisGeoService.get_agents_in_box(redis, *viewport.bounds)
+    return await RedisGeoService.get_all_agent_positions(redis)
+
+
 @router.get("/admin/agents")
 async def admin_agents_map(
+    viewport: Viewport = Depends(),
+    redis=Depends(get_redis),
+    admin=Depends(require_role("admin")),
+):
+    positions = await _agent_positions(redis, viewport)
+
+    return [
+        {"agent_id": agent_id, "lat": lat, "lng": lng, "online": True}
+        for agent_id, (lat, lng) in positions.items()
+    ]
+
+
+# ======================================================
+# 📡 ADMIN LIVE MAP – DIFF STREAM (SSE)
+# first frame is the full viewport, then only moved / new / gone agents
+# ACCESS: ADMIN
+# ======================================================
+MAP_FRAME_SECONDS = 2
+
+
+@router.get("/admin/agents/stream")
+async def admin_agents_stream(
+    request: Request,
+    viewport: Viewport = Depends(),
     redis=Depends(get_redis),
     admin=Depends(require_role("admin")),
 ):
-    agent_ids = await redis.zrange("delivery:agents:live", 0, -1)
-    response = []
-
-    for agent_id in agent_ids:
-        pos = await redis.geopos("delivery:agents:live", agent_id)
-        if pos and pos[0]:
-            lng, lat = pos[0]
-            response.append({
-                "agent_id": agent_id,
-                "lat": lat,
-                "lng": lng,
-                "online": True,
-            })
-
-    return response
+    async def frames():
+        previous: dict = {}
+
+        while not await request.is_disconnected():
+            current = await _agent_positions(redis, viewport)
+
+            changed = [
+                {"agent_id": agent_id, "lat": lat, "lng": lng}
+                for agent_id, (lat, lng) in current.items()
+                if previous.get(agent_id) != (lat, lng)
+            ]
+            removed = [agent_id for agent_id in previous if agent_id not in current]
+
+            if changed or removed:
+                yield f"data: {json.dumps({'changed': changed, 'removed': removed})}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+            previous = current
+            await asyncio.sleep(MAP_FRAME_SECONDS)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
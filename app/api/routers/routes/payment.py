@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from utils.payment_id import generate_payment_id
 from core.database import get_db
+from core.redis import get_redis
 from core.rbac import require_role
-from core.razorpay_client import razorpay_client
 from core.config import settings
 from services.razorpay_service import razorpay_service
+from services.webhook_service import webhook_service
 from services.pharmacist_assignment_service import assign_nearest_pharmacists
 from schemas.payment import CreatePaymentOrder, VerifyPayment
 from models.order import Order, OrderStatus
@@ -59,12 +61,15 @@ async def verify_payment(
 ):
     # 🔐 Verify Razorpay signature
     try:
-        await razorpay_service.verify_payment(
+        verified = await razorpay_service.verify_payment(
             payload.razorpay_order_id,
             payload.razorpay_key_id,
             payload.razorpay_signature,
         )
     except Exception:
+        verified = False
+
+    if not verified:
         # ❌ Payment verification failed
         return {
             "message": "Payment verification failed",
@@ -116,5 +121,28 @@ async def verify_payment(
         "payment_id":order.payment_id,
         "order_status": order.status
     }
- 
- 
\ No newline at end of file
+
+
+# ======================================================
+# 📬 RAZORPAY WEBHOOK (GATEWAY → US)
+# Only verifies + enqueues; the webhook worker applies it.
+# ======================================================
+@router.post("/webhook")
+async def razorpay_webhook(
+    request: Request,
+    redis=Depends(get_redis),
+):
+    body = await request.body()
+    signature = request.headers.get("X-Razorpay-Signature", "")
+
+    if not webhook_service.verify_razorpay(body, signature):
+        raise HTTPException(400, "Invalid webhook signature")
+
+    event_id = (
+        request.headers.get("X-Razorpay-Event-Id")
+        or hashlib.sha256(body).hexdigest()
+    )
+
+    await webhook_service.enqueue(redis, event_id, body)
+
+    return {"status": "ok"}
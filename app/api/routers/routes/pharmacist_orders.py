@@ -1,65 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 
 from models.user import User
 from core.database import get_db
+from core.redis import get_redis
 from core.rbac import require_role
 from models.order import Order, OrderStatus
-from models.order_item import OrderItem
 from models.order_address import OrderAddress
 from models.pharmacist_order import PharmacistOrder
-from services.pharmacist_assignment_service import notify_next_pharmacist
+from services.pharmacist_assignment_service import (
+    notify_next_pharmacist,
+    cancel_dispatch,
+    claim_order,
+    notify_pharmacists,
+)
 
 router = APIRouter(prefix="/pharmacist_orders", tags=["Pharmacist Orders"])
 
+
+def _items(order: Order) -> list[dict]:
+    return [
+        {
+            "name": i.product_name,
+            "qty": i.quantity,
+            "price": i.price
+        }
+        for i in order.items
+    ]
+
 #=====================================
 #Pharmasist check near by orders
 #=====================================
 @router.get("/nearby-orders")
 async def nearby_orders(
+    before_id: int | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
     pharmacist=Depends(require_role("pharmacist"))
 ):
-    result = await db.execute(
+    query = (
         select(PharmacistOrder, Order, OrderAddress)
         .join(Order, Order.id == PharmacistOrder.order_id)
         .join(OrderAddress, OrderAddress.order_id == Order.id)
+        .options(selectinload(Order.items))   # ✅ one IN query for all items
         .where(
             PharmacistOrder.pharmacist_id == pharmacist.id,
             PharmacistOrder.status == "PENDING"
         )
         .order_by(PharmacistOrder.id.desc())
+        .limit(limit + 1)
     )
+    if before_id is not None:
+        query = query.where(PharmacistOrder.id < before_id)
 
-    orders = []
-    for po, order, address in result.all():
-        items = (
-            await db.execute(
-                select(OrderItem)
-                .where(OrderItem.order_id == order.id)
-            )
-        ).scalars().all()
+    rows = (await db.execute(query)).all()
+    page = rows[:limit]
 
-        orders.append({
+    orders = [
+        {
             "order_id": order.id,
             "pharmacist_order_status": po.status,
             "order_status": order.status,
             "total": order.total,
             "address": address.address,
-            "items": [
-                {
-                    "name": i.product_name,
-                    "qty": i.quantity,
-                    "price": i.price
-                }
-                for i in items
-            ]
-        })
+            "items": _items(order),
+        }
+        for po, order, address in page
+    ]
 
     return {
         "count": len(orders),
-        "orders": orders
+        "orders": orders,
+        "next_cursor": page[-1][0].id if len(rows) > limit else None,
     }
 
 #=====================================
@@ -69,61 +83,64 @@ async def nearby_orders(
 async def accept_order(
     order_id: int,
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     pharmacist: User = Depends(require_role("pharmacist")),
 ):
-    # 1️⃣ Fetch pharmacist-order assignment
-    result = await db.execute(
-        select(PharmacistOrder)
-        .where(
-            PharmacistOrder.order_id == order_id,
-            PharmacistOrder.pharmacist_id == pharmacist.id
-        )
-    )
-    po = result.scalar_one_or_none()
- 
-    if not po:
-        raise HTTPException(
-            404,
-            "This order is not assigned to you"
-        )
- 
-    # 2️⃣ Prevent double actions
-    if po.status != "PENDING":
-        raise HTTPException(
-            400,
-            f"Order already {po.status.lower()}"
-        )
- 
-    # 3️⃣ Validate order state
-    order = await db.get(Order, order_id)
-    if not order:
-        raise HTTPException(404, "Order not found")
- 
-    if order.status != OrderStatus.WAITING_PHARMACIST:
+    # 1️⃣ Atomic claim – first pharmacist wins, losers rejected in same tx
+    losers = await claim_order(db, order_id, pharmacist.id)
+
+    if losers is None:
+        # 🔍 Explain why (only on the losing path)
+        po = (
+            await db.execute(
+                select(PharmacistOrder)
+                .where(
+                    PharmacistOrder.order_id == order_id,
+                    PharmacistOrder.pharmacist_id == pharmacist.id
+                )
+            )
+        ).scalar_one_or_none()
+
+        if not po:
+            raise HTTPException(
+                404,
+                "This order is not assigned to you"
+            )
+
+        if po.status != "PENDING":
+            raise HTTPException(
+                400,
+                f"Order already {po.status.lower()}"
+            )
+
+        order = await db.get(Order, order_id)
+        if order and order.status != OrderStatus.WAITING_PHARMACIST and order.pharmacy_id:
+            raise HTTPException(
+                409,
+                "Order already accepted by another pharmacist"
+            )
+
         raise HTTPException(
             400,
-            f"Order cannot be accepted in state {order.status}"
-        )
- 
-    # 4️⃣ Accept order
-    po.status = "ACCEPTED"
-    order.status = OrderStatus.ACCEPTED
- 
-    # 5️⃣ Reject other pharmacists automatically (IMPORTANT)
-    await db.execute(
-        select(PharmacistOrder)
-        .where(
-            PharmacistOrder.order_id == order_id,
-            PharmacistOrder.pharmacist_id != pharmacist.id
+            f"Order cannot be accepted in state {order.status if order else 'UNKNOWN'}"
         )
+
+    # 2️⃣ Stop expanding the dispatch radius
+    await cancel_dispatch(redis, order_id)
+
+    # 3️⃣ Tell the other pharmacists the offer is gone
+    await notify_pharmacists(
+        losers,
+        {
+            "event": "ORDER_TAKEN",
+            "order_id": order_id,
+        }
     )
- 
-    await db.commit()
- 
+
     return {
         "message": "Order accepted successfully",
-        "order_id": order.id,
-        "order_status": order.status
+        "order_id": order_id,
+        "order_status": OrderStatus.ACCEPTED
     }
 
 # ================================================
@@ -187,44 +204,41 @@ async def ready_for_delivery(order_id: int, db: AsyncSession = Depends(get_db),p
 #===========================
 @router.get("/my")
 async def my_orders(
+    before_id: int | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db),
     pharmacist=Depends(require_role("pharmacist"))
 ):
-    result = await db.execute(
+    query = (
         select(PharmacistOrder, Order)
         .join(Order, Order.id == PharmacistOrder.order_id)
+        .options(selectinload(Order.items))   # ✅ one IN query for all items
         .where(
             PharmacistOrder.pharmacist_id == pharmacist.id,
             PharmacistOrder.status.in_(["ACCEPTED"])
         )
         .order_by(PharmacistOrder.id.desc())
+        .limit(limit + 1)
     )
+    if before_id is not None:
+        query = query.where(PharmacistOrder.id < before_id)
 
-    orders = []
-    for po, order in result.all():
-        items = (
-            await db.execute(
-                select(OrderItem)
-                .where(OrderItem.order_id == order.id)
-            )
-        ).scalars().all()
+    rows = (await db.execute(query)).all()
+    page = rows[:limit]
 
-        orders.append({
+    orders = [
+        {
             "order_id": order.id,
             "status": order.status,
             "total": order.total,
             "created_at": order.created_at,
-            "items": [
-                {
-                    "name": i.product_name,
-                    "qty": i.quantity,
-                    "price": i.price
-                }
-                for i in items
-            ]
-        })
+            "items": _items(order),
+        }
+        for po, order in page
+    ]
 
     return {
         "count": len(orders),
-        "orders": orders
+        "orders": orders,
+        "next_cursor": page[-1][0].id if len(rows) > limit else None,
     }
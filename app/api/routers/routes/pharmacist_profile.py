@@ -6,6 +6,7 @@ from core.database import get_db
 from core.rbac import require_role
 from models.user import User
 from services.geocoding_service import geocode_address
+from services.redis_geo_service import RedisGeoService
 from core.redis import get_redis
  
 import enum
@@ -84,10 +85,7 @@ async def set_store_address(
  
     # 🔹 Push pharmacist to Redis GEO (static)
     redis = await get_redis()
-    await redis.geoadd(
-        "pharmacists:live",
-        (lng, lat, current_user.id)
-    )
+    await RedisGeoService.update_pharmacist_location(redis, current_user.id, lat, lng)
  
     await db.commit()
  
@@ -111,13 +109,11 @@ async def go_online(
         raise HTTPException(400, "Store address not set")
  
     redis = await get_redis()
-    await redis.geoadd(
-        "pharmacists:live",
-        (
-            current_user.last_longitude,
-            current_user.last_latitude,
-            current_user.id
-        )
+    await RedisGeoService.update_pharmacist_location(
+        redis,
+        current_user.id,
+        current_user.last_latitude,
+        current_user.last_longitude
     )
  
     current_user.is_online = True
@@ -135,7 +131,7 @@ async def go_offline(
     current_user: User = Depends(require_role("pharmacist"))
 ):
     redis = await get_redis()
-    await redis.zrem("pharmacists:live", current_user.id)
+    await RedisGeoService.remove_pharmacist(redis, current_user.id)
  
     current_user.is_online = False
     await db.commit()
@@ -210,7 +210,7 @@ async def reject_refund_request(
             )
         else:
             # fallback
-            send_html_email(to_email=user.email, subject=subject, html_body=html)
+            await send_html_email(to_email=user.email, subject=subject, html_body=html)
 
     return {
         "message": "Refund request rejected successfully",
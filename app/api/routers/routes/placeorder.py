@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import get_db
+from core.redis import get_redis
 from core.rbac import require_role
 from models.order import Order, OrderStatus
+from services.invoice_service import READY, build_invoice, invoice_status
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -45,4 +49,78 @@ async def place_order(
         "message": "Order placed successfully. Waiting for pharmacist approval.",
         "order_id": order.id,
         "order_status": order.status
-    }
\ No newline at end of file
+    }
+
+
+# ======================================================
+# 🧾 INVOICE JOB STATUS
+# ACCESS: USER (own orders), ADMIN
+# ======================================================
+@router.get("/{order_id}/invoice/status")
+async def get_invoice_status(
+    order_id: int,
+    db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
+    user=Depends(require_role("user", "admin")),
+):
+    order = await db.get(Order, order_id)
+    if not order or (user.role != "admin" and order.user_id != user.id):
+        raise HTTPException(404, "Order not found")
+
+    job = await invoice_status(redis, order_id)
+    if job:
+        return {"order_id": order_id, **job}
+
+    # job record expired – the order row still knows about a finished PDF
+    if order.invoice_path:
+        return {"order_id": order_id, "status": READY, "hash": order.invoice_hash}
+
+    return {"order_id": order_id, "status": None}
+
+
+# ======================================================
+# 📄 INVOICE DOWNLOAD (sendfile + ETag + Range)
+# ACCESS: USER (own orders), ADMIN
+# ======================================================
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+@router.get("/{order_id}/invoice")
+async def download_invoice(
+    order_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(require_role("user", "admin")),
+):
+    order = await db.get(Order, order_id)
+    if not order or (user.role != "admin" and order.user_id != user.id):
+        raise HTTPException(404, "Order not found")
+
+    if not order.invoice_path and order.status != OrderStatus.DELIVERED:
+        raise HTTPException(404, "Invoice not available yet")
+
+    # lazy (re)render: build_invoice recomputes the content hash and only
+    # renders when it changed (order edit, TEMPLATE_VERSION bump) or the
+    # file was cleaned up – otherwise it is two small reads
+    order = await build_invoice(db, order_id)
+
+    # the content hash is a perfect strong validator
+    etag = f'"{order.invoice_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse: zero-copy sendfile when the server supports it,
+    # Last-Modified from the file, Range / If-Range handled by Starlette
+    return FileResponse(
+        order.invoice_path,
+        media_type="application/pdf",
+        filename=f"invoice_order_{order_id}.pdf",
+        headers=headers,
+    )
@@ -1,15 +1,13 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-import shutil, os
+import asyncio, shutil, os, uuid
  
 from core.rbac import require_role
 from core.database import get_db
-from services.ocr_service import extract_text
-from services.prescription_validator import has_doctor_details
+from core.redis import get_redis
 from services.prescription_medicine_matcher import match_products
+from services.prescription_ocr_service import enqueue_ocr, prescription_result
 from models.prescription import Prescription, PrescriptionStatus
-from models.prescription_item import PrescriptionItem
  
 router = APIRouter(prefix="/prescription", tags=["Prescription"])
  
@@ -17,64 +15,44 @@ UPLOAD_DIR = "uploads/prescriptions"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
  
 
-@router.post("/upload")
+def _save_upload(file: UploadFile, file_path: str):
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+
+@router.post("/upload", status_code=202)
 async def upload_prescription(
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
     current_user=Depends(require_role("user"))
 ):
-    # 1️⃣ Save file
-    file_path = f"{UPLOAD_DIR}/{file.filename}"
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # 2️⃣ OCR extract
-    extracted_text = extract_text(file_path)
-
-    # 3️⃣ Doctor validation
-    has_details = has_doctor_details(extracted_text)
-
-    status = (
-        PrescriptionStatus.approved
-        if has_details
-        else PrescriptionStatus.rejected
-    )
+    # 1️⃣ Save file (unique name – uploads never overwrite each other)
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    file_path = f"{UPLOAD_DIR}/{uuid.uuid4().hex}{ext}"
+    await asyncio.to_thread(_save_upload, file, file_path)
 
-    # 4️⃣ Save prescription
+    # 2️⃣ Record the job
     prescription = Prescription(
+        user_id=current_user.id,
         file_path=file_path,
-        extracted_text=extracted_text,
-        status=status
+        status=PrescriptionStatus.queued
     )
 
     db.add(prescription)
     await db.commit()
     await db.refresh(prescription)
 
-    # ❌ If rejected → stop
-    if status == PrescriptionStatus.rejected:
-        return {
-            "status": status,
-            "prescription_id": prescription.id,
-            "prescription_image": f"/{prescription.file_path}",
-            "available_medicines": [],
-            "unavailable_medicines": [],
-            "message": "Prescription rejected (doctor details missing)"
-        }
-
-    # ✅ If approved → match medicines
-    available, unavailable = await match_products(db, extracted_text)
+    # 3️⃣ OCR + doctor check + matching run in scripts/ocr_worker.py
+    await enqueue_ocr(redis, prescription.id)
 
     return {
-        "status": status,
+        "job_id": prescription.id,
         "prescription_id": prescription.id,
+        "status": prescription.status,
         "prescription_image": f"/{prescription.file_path}",
-        "available_medicines": available,
-        "unavailable_medicines": unavailable,
-        "message": "Prescription auto-approved"
+        "message": "Prescription queued for processing"
     }
-
  
  
 # ======================================================
@@ -90,31 +68,23 @@ async def get_prescription_by_id(
 ):
     prescription = await db.get(Prescription, prescription_id)
  
-    if not prescription:
+    if not prescription or (prescription.user_id and prescription.user_id != current_user.id):
         raise HTTPException(status_code=404, detail="Prescription not found")
  
-    # Base response
-    response = {
-        "prescription_id": prescription.id,
-        "status": prescription.status,
-        "prescription_image": f"/{prescription.file_path}",
-        "available_medicines": [],
-        "unavailable_medicines": []
-    }
+    # Base response (queued / processing / failed / rejected → empty lists)
+    response = prescription_result(prescription)
  
-    # 🔒 If NOT approved → return empty lists
+    # 🔒 If NOT approved → return as is
     if prescription.status != PrescriptionStatus.approved:
         return response
  
-    # ✅ If approved → calculate medicines NOW
-    available, unavailable = await match_products(
-        db,
-        prescription.extracted_text
-    )
- 
-    response["available_medicines"] = available
-    response["unavailable_medicines"] = unavailable
+    # ✅ Approved before OCR jobs stored matches → calculate NOW
+    if prescription.matches is None:
+        available, unavailable = await match_products(
+            db,
+            prescription.extracted_text
+        )
+        response["available_medicines"] = available
+        response["unavailable_medicines"] = unavailable
  
     return response
- 
-
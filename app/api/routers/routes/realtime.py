@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from core.rbac import authenticate_websocket, require_role
+from core.redis import get_redis
+from core.websocket_manager import Connection, manager
+from schemas.agent_location import AgentPointsBatch
+from services.gps_ingest_service import ingest_points
+from utils.jwt import create_ws_reconnect_token
+
+router = APIRouter(prefix="/ws", tags=["Realtime"])
+
+HEARTBEAT_SECONDS = 25
+IDLE_TIMEOUT = HEARTBEAT_SECONDS * 2 + 10   # two missed PONGs → drop
+
+WS_UNAUTHORIZED = 4401
+
+
+# ======================================================
+# 🔁 SHARED SOCKET LOOP
+# ======================================================
+async def _heartbeat(conn: Connection, user, session_exp: int):
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+
+        # access token expired → the client has to log in again
+        if time.time() >= session_exp:
+            await conn.close(WS_UNAUTHORIZED)
+            return
+
+        conn.send({
+            "type": "PING",
+            "reconnect_token": create_ws_reconnect_token(user.id, user.role, session_exp),
+        })
+
+
+async def _serve(ws: WebSocket, user, connect, disconnect, on_message=None):
+    session_exp = ws.state.session_exp
+
+    # HELLO first, then (resume) only the events missed since last_event_id;
+    # every outbound frame goes through the connection's writer task
+    hello = {
+        "type": "HELLO",
+        "user_id": user.id,
+        "heartbeat_interval": HEARTBEAT_SECONDS,
+        "reconnect_token": create_ws_reconnect_token(user.id, user.role, session_exp),
+    }
+    conn = await connect(user.id, ws, ws.query_params.get("last_event_id"), hello)
+
+    heartbeat = asyncio.create_task(_heartbeat(conn, user, session_exp))
+    try:
+        while True:
+            message = await asyncio.wait_for(ws.receive_json(), timeout=IDLE_TIMEOUT)
+            kind = message.get("type") if isinstance(message, dict) else None
+
+            if kind == "PING":
+                conn.send({"type": "PONG"})
+            elif kind == "PONG":
+                continue
+            elif on_message:
+                await on_message(user, conn, message)
+
+    except (WebSocketDisconnect, asyncio.TimeoutError, ValueError, RuntimeError):
+        pass
+    finally:
+        heartbeat.cancel()
+        await disconnect(user.id, ws)
+
+
+# ======================================================
+# 💊 PHARMACIST – NEW_ORDER / ORDER_TAKEN
+# ======================================================
+@router.websocket("/pharmacist")
+async def pharmacist_socket(ws: WebSocket):
+    user = await authenticate_websocket(ws, "pharmacist")
+    if not user:
+        await ws.close(code=WS_UNAUTHORIZED)
+        return
+
+    await _serve(ws, user, manager.connect_pharmacist, manager.disconnect_pharmacist)
+
+
+# ======================================================
+# 🚴 DELIVERY AGENT – assignments / own location echo
+# inbound: {"type": "LOCATION_BATCH", "seq": n, "points": [[ts, lat, lng], ...]}
+# ======================================================
+async def _rider_message(user, conn: Connection, message: dict):
+    if message.get("type") != "LOCATION_BATCH":
+        return
+
+    try:
+        batch = AgentPointsBatch.model_validate(message)
+    except ValidationError:
+        conn.send({"type": "ERROR", "seq": message.get("seq"), "detail": "Invalid LOCATION_BATCH"})
+        return
+
+    result = await ingest_points(await get_redis(), user.id, batch.points)
+    conn.send({"type": "LOCATION_ACK", "seq": message.get("seq"), "accepted": result["accepted"]})
+
+
+@router.websocket("/delivery")
+async def delivery_socket(ws: WebSocket):
+    user = await authenticate_websocket(ws, "delivery_agent")
+    if not user:
+        await ws.close(code=WS_UNAUTHORIZED)
+        return
+
+    await _serve(ws, user, manager.connect_delivery, manager.disconnect_delivery, _rider_message)
+
+
+# ======================================================
+# 👤 CUSTOMER – order status + live agent location
+# ======================================================
+@router.websocket("/user")
+async def user_socket(ws: WebSocket):
+    user = await authenticate_websocket(ws, "user")
+    if not user:
+        await ws.close(code=WS_UNAUTHORIZED)
+        return
+
+    await _serve(ws, user, manager.connect_user, manager.disconnect_user)
+
+
+# ======================================================
+# 📊 GATEWAY METRICS (this process)
+# ACCESS: ADMIN
+# ======================================================
+@router.get("/metrics")
+async def websocket_metrics(admin=Depends(require_role("admin"))):
+    return manager.snapshot()
@@ -19,6 +19,10 @@ class Settings(BaseSettings):
     PAYMENT_MODE: str = "MOCK"
     RAZORPAY_KEY_ID: str | None = None
     RAZORPAY_KEY_SECRET: str | None = None
+    # point at scripts/mock_razorpay_gateway.py for offline load tests
+    RAZORPAY_BASE_URL: str = "https://api.razorpay.com/v1"
+    RAZORPAY_MAX_CONNECTIONS: int = 50
+    RAZORPAY_WEBHOOK_SECRET: str | None = None
 
     # =========================
     # ✅ EMAIL SETTINGS (NEW)
@@ -28,9 +32,23 @@ class Settings(BaseSettings):
     EMAIL_USERNAME: str
     EMAIL_PASSWORD: str
     EMAIL_FROM: str | None = None  # optional
+    EMAIL_USE_TLS: bool = True     # off for scripts/mock_smtp_server.py
+    EMAIL_SMTP_CONNECTIONS: int = 3
 
     GOOGLE_MAPS_API_KEY: str | None = None
 
+    # =========================
+    # ✅ DISPATCH
+    # =========================
+    DISPATCH_RING_WAIT_SECONDS: int = 30
+    DELIVERY_BATCH_INTERVAL_SECONDS: int = 5
+    DELIVERY_ETA_REFRESH_SECONDS: int = 30
+
+    # =========================
+    # ✅ INVOICES
+    # =========================
+    INVOICE_RENDER_PROCESSES: int = 2
+
     class Config:
         env_file = BASE_DIR / ".env"
         env_file_encoding = "utf-8"
@@ -1,6 +1,7 @@
 from fastapi import Depends, Request, HTTPException
 from jose import jwt, JWTError
 from core.config import settings
+from utils.jwt import WS_RECONNECT_TYP
 
 def get_current_user(request: Request):
     token = request.cookies.get("access_token")
@@ -20,10 +21,14 @@ def get_current_user(request: Request):
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+    # websocket reconnect tokens only re-open /ws/* sockets
+    if payload.get("typ") == WS_RECONNECT_TYP:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return payload
+
 
 def require_role(allowed_roles: list):
     def role_checker(payload=Depends(get_current_user)):
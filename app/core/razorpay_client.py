@@ -1,6 +1,116 @@
-import razorpay
+import hashlib
+import hmac
+
+import httpx
 from core.config import settings
 
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+
+class RazorpayError(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(f"Razorpay error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class AsyncRazorpayClient:
+    """
+    Minimal async Razorpay REST adapter.
+
+    One pooled httpx client per process keeps HTTP/1.1 keep-alive
+    connections open, so we don't pay TCP/TLS setup per call and we
+    never touch the default thread pool.
+    """
+
+    def __init__(
+        self,
+        key_id: str | None,
+        key_secret: str | None,
+        base_url: str,
+        max_connections: int = 50,
+        timeout: float = 10.0,
+    ):
+        self.key_id = (key_id or "").strip()
+        self.key_secret = (key_secret or "").strip()
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._http: httpx.AsyncClient | None = None
+
+    # ---------------- HTTP POOL ----------------
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id, self.key_secret),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+                http2=False,
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _request(self, method: str, path: str, **kwargs):
+        res = await self.http.request(method, path, **kwargs)
+
+        if res.status_code >= 400:
+            try:
+                detail = res.json().get("error", res.text)
+            except ValueError:
+                detail = res.text
+            raise RazorpayError(res.status_code, detail)
+
+        return res.json()
+
+    # ---------------- ORDERS ----------------
+    async def create_order(self, data: dict) -> dict:
+        return await self._request("POST", "/orders", json=data)
+
+    async def fetch_order(self, order_id: str) -> dict:
+        return await self._request("GET", f"/orders/{order_id}")
+
+    # ---------------- PAYMENTS ----------------
+    async def list_payments(
+        self,
+        from_ts: int,
+        to_ts: int,
+        count: int = 100,
+        skip: int = 0,
+    ) -> list[dict]:
+        data = await self._request(
+            "GET",
+            "/payments",
+            params={"from": from_ts, "to": to_ts, "count": count, "skip": skip},
+        )
+        return data.get("items", [])
+
+    # ---------------- SIGNATURES (no I/O) ----------------
+    def verify_payment_signature(
+        self,
+        razorpay_order_id: str,
+        razorpay_payment_id: str,
+        signature: str,
+    ) -> bool:
+        expected = hmac.new(
+            self.key_secret.encode(),
+            f"{razorpay_order_id}|{razorpay_payment_id}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+
+        return hmac.compare_digest(expected, signature or "")
+
+
+razorpay_client = AsyncRazorpayClient(
+    key_id=settings.RAZORPAY_KEY_ID,
+    key_secret=settings.RAZORPAY_KEY_SECRET,
+    base_url=settings.RAZORPAY_BASE_URL,
+    max_connections=settings.RAZORPAY_MAX_CONNECTIONS,
 )
@@ -1,11 +1,12 @@
-from fastapi import Depends, HTTPException, Request
+from fastapi import Depends, HTTPException, Request, WebSocket
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
 
-from core.database import get_db
+from core.database import get_db, AsyncSessionLocal
 from models.user import User
 from core.config import settings
+from utils.jwt import WS_RECONNECT_TYP
 
 security = HTTPBearer(auto_error=False)  # Don't auto-error
 
@@ -38,6 +39,10 @@ def require_role(*roles: str):
                 algorithms=[settings.ALGORITHM]
             )
             print(f"Payload from token: {payload}")
+
+            # websocket reconnect tokens only re-open /ws/* sockets
+            if payload.get("typ") == WS_RECONNECT_TYP:
+                raise HTTPException(status_code=401, detail="Invalid token")
             
             user_id = payload.get("sub")
             user_role = payload.get("role")
@@ -64,4 +69,55 @@ def require_role(*roles: str):
             print(f"JWT Error: {e}")
             raise HTTPException(status_code=401, detail="Invalid token")
     
-    return role_checker
\ No newline at end of file
+    return role_checker
+
+
+# ======================================================
+# 🔌 WEBSOCKET AUTH
+# token: ?token=<access JWT> | ?reconnect_token=<ws token> | cookie
+# ======================================================
+async def authenticate_websocket(websocket: WebSocket, *roles: str):
+    reconnect_token = websocket.query_params.get("reconnect_token")
+    token = (
+        reconnect_token
+        or websocket.query_params.get("token")
+        or websocket.cookies.get("access_token")
+    )
+
+    if not token:
+        return None
+
+    try:
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+
+    # reconnect tokens can't be used as access tokens and vice versa
+    if (payload.get("typ") == WS_RECONNECT_TYP) != bool(reconnect_token):
+        return None
+
+    # the socket session ends when the original access token does
+    session_exp = payload.get("session_exp") if reconnect_token else payload.get("exp")
+    if not session_exp:
+        return None
+
+    allowed_roles = [r.strip().lower() for r in roles]
+    if (payload.get("role") or "").strip().lower() not in allowed_roles:
+        return None
+
+    user_id = payload.get("sub")
+    if not user_id:
+        return None
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, int(user_id))
+
+    if not user or not user.is_active:
+        return None
+
+    websocket.state.session_exp = int(session_exp)
+    return user
@@ -9,3 +9,21 @@ redis_client = redis.Redis(
 
 async def get_redis():
     return redis_client
+
+
+# ======================================================
+# 📜 SCRIPTS IN HOT PIPELINES
+# a registered Script called on a pipeline makes redis-py send
+# SCRIPT EXISTS before every execute(); hot paths load their
+# scripts once at startup and queue a plain EVALSHA instead
+# ======================================================
+async def load_scripts(redis, *scripts):
+    for script in scripts:
+        await redis.script_load(script.script)
+
+
+async def run_script(script, keys: list, args: list, client):
+    if isinstance(client, redis.client.Pipeline):
+        # NOSCRIPT comes back from execute(); see load_scripts
+        return client.evalsha(script.sha, len(keys), *keys, *args)
+    return await script(keys=keys, args=args, client=client)
@@ -1,62 +1,423 @@
+import asyncio
+import json
+import time
+from collections import deque
+
 from fastapi import WebSocket
 from typing import Dict, List
 
+# ======================================================
+# 📡 CROSS-WORKER FAN-OUT
+# every send_* is PUBLISHed on ws:{audience}:{id}; each process
+# SUBSCRIBEs only to the ids it holds sockets for and delivers locally
+# ======================================================
+CHANNEL_PREFIX = "ws"
+
+DELIVERY = "delivery"
+PHARMACIST = "pharmacist"
+USER = "user"
+
+
+def _channel(audience: str, target_id: int) -> str:
+    return f"{CHANNEL_PREFIX}:{audience}:{target_id}"
+
+
+# ======================================================
+# ⏪ RESUMABLE EVENTS
+# durable events are XADDed to a capped per-recipient stream and
+# PUBLISHed with their stream id in one script; a reconnecting client
+# passes last_event_id and gets only the gap via one XRANGE
+# ======================================================
+STREAM_MAXLEN = 200
+STREAM_TTL = 24 * 3600
+
+EPHEMERAL_ID = "-"   # not persisted, never replayed
+
+_PUBLISH_DURABLE = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[3], '*', 'data', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('PUBLISH', ARGV[1], id .. ' ' .. ARGV[2])
+return id
+"""
+
+
+def _stream_key(audience: str, target_id: int) -> str:
+    # hash-tagged so a recipient's stream stays on one cluster slot
+    return f"{CHANNEL_PREFIX}:stream:{{{audience}:{target_id}}}"
+
+
+def _stream_pos(event_id: str) -> tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+# ======================================================
+# 🐢 SLOW CONSUMERS
+# each socket gets a bounded outbox + its own writer task, so a
+# stalled phone never blocks the request that produced the event
+# ======================================================
+QUEUE_SIZE = 64
+REPLAY_LIMIT = QUEUE_SIZE // 2   # longer gaps → RESYNC; leaves room for live events
+SEND_TIMEOUT = 5             # one frame taking longer → evict
+SLOW_CONSUMER_SECONDS = 15   # outbox full for longer → evict
+WS_TRY_AGAIN_LATER = 1013
+
+COALESCE_TYPES = {"AGENT_LOCATION"}
+EPHEMERAL_TYPES = COALESCE_TYPES
+
+
+def _coalesce_key(message: dict):
+    kind = message.get("type") or message.get("event")
+    if kind not in COALESCE_TYPES:
+        return None
+    return kind, message.get("agent_id"), message.get("order_id")
+
+
+class Connection:
+    def __init__(self, ws: WebSocket, metrics: dict, on_evict):
+        self.ws = ws
+        self.outbox: deque = deque()
+        self.full_since: float | None = None
+
+        # live events parked while the backlog is being replayed
+        self._held: list | None = None
+        self._replayed_to: tuple[int, int] | None = None
+
+        self._metrics = metrics
+        self._on_evict = on_evict
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+
+    def hold(self):
+        self._held = []
+
+    def resume(self, backlog: list[dict]):
+        """Queue the replayed backlog, then the live events held meanwhile."""
+        held, self._held = self._held or [], None
+
+        # at most REPLAY_LIMIT frames, queued whole – never dropped by the cap
+        self.outbox.extend(backlog)
+        if backlog:
+            self._ready.set()
+            if backlog[-1].get("event_id"):
+                self._replayed_to = _stream_pos(backlog[-1]["event_id"])
+
+        for message in held:
+            self.send(message)
+
+    def send(self, message: dict):
+        """Queue a frame; never blocks."""
+        if self._held is not None:
+            self._held.append(message)
+            return
+
+        # already delivered by the replay
+        event_id = message.get("event_id")
+        if event_id and self._replayed_to and _stream_pos(event_id) <= self._replayed_to:
+            return
+
+        if len(self.outbox) >= QUEUE_SIZE:
+            if self._replace_stale(message):
+                return
+
+            self._metrics["dropped"] += 1
+            now = time.monotonic()
+            self.full_since = self.full_since or now
+            if now - self.full_since > SLOW_CONSUMER_SECONDS:
+                self._on_evict(self, "slow consumer")
+            return
+
+        self.outbox.append(message)
+        self._ready.set()
+
+    def _replace_stale(self, message: dict) -> bool:
+        # only the newest location matters – overwrite the queued one
+        key = _coalesce_key(message)
+        if key is None:
+            return False
+
+        for i, queued in enumerate(self.outbox):
+            if _coalesce_key(queued) == key:
+                self.outbox[i] = message
+                self._metrics["coalesced"] += 1
+                return True
+        return False
+
+    async def _write(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self.outbox:
+                    message = self.outbox.popleft()
+                    await asyncio.wait_for(self.ws.send_json(message), SEND_TIMEOUT)
+                    self._metrics["sent"] += 1
+                    if len(self.outbox) < QUEUE_SIZE // 2:
+                        self.full_since = None
+                self._ready.clear()
+
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._on_evict(self, "send timeout")
+        except Exception:
+            self._on_evict(self, "send failed")
+
+    def detach(self):
+        self._writer.cancel()
+
+    async def close(self, code: int):
+        self.detach()
+        try:
+            await asyncio.wait_for(self.ws.close(code=code), SEND_TIMEOUT)
+        except Exception:
+            pass
+
 
 class ConnectionManager:
     def __init__(self):
         # delivery_id -> sockets
-        self.delivery_connections: Dict[int, List[WebSocket]] = {}
+        self.delivery_connections: Dict[int, List[Connection]] = {}
 
         # pharmacist_id -> sockets
-        self.pharmacist_connections: Dict[int, List[WebSocket]] = {}
-        
+        self.pharmacist_connections: Dict[int, List[Connection]] = {}
+
         # user_id (customer) -> sockets
-        self.user_connections: Dict[int, List[WebSocket]] = {}
+        self.user_connections: Dict[int, List[Connection]] = {}
 
-    # ---------------- DELIVERY ----------------
-    async def connect_delivery(self, delivery_id: int, ws: WebSocket):
+        self._connections = {
+            DELIVERY: self.delivery_connections,
+            PHARMACIST: self.pharmacist_connections,
+            USER: self.user_connections,
+        }
+
+        self.metrics = {
+            "connects": 0,
+            "disconnects": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "evicted": 0,
+            "replayed": 0,
+            "resyncs": 0,
+        }
+
+        self._redis = None
+        self._pubsub = None
+        self._publish_durable = None
+        self._listener: asyncio.Task | None = None
+
+    def snapshot(self) -> dict:
+        sockets = [
+            conn
+            for conns in self._connections.values()
+            for sockets in conns.values()
+            for conn in sockets
+        ]
+        return {
+            **self.metrics,
+            "open": {audience: sum(map(len, conns.values())) for audience, conns in self._connections.items()},
+            "queued": sum(len(conn.outbox) for conn in sockets),
+        }
+
+    # ---------------- BROKER ----------------
+    async def start(self, redis, listen: bool = True):
+        """listen=False: publish only (worker processes that host no sockets)."""
+        self._redis = redis
+        self._publish_durable = redis.register_script(_PUBLISH_DURABLE)
+        if not listen:
+            return
+
+        self._pubsub = redis.pubsub()
+
+        # sockets accepted before startup finished
+        held = [
+            _channel(audience, target_id)
+            for audience, conns in self._connections.items()
+            for target_id in conns
+        ]
+        if held:
+            await self._pubsub.subscribe(*held)
+
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+        if self._pubsub:
+            await self._pubsub.aclose()
+        self._redis = self._pubsub = self._publish_durable = self._listener = None
+
+    async def _listen(self):
+        while True:
+            try:
+                # get_message raises until the first SUBSCRIBE
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(1)
+                    continue
+
+                msg = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if not msg:
+                    continue
+
+                _, audience, target_id = msg["channel"].split(":", 2)
+                event_id, data = msg["data"].split(" ", 1)
+
+                message = json.loads(data)
+                if event_id != EPHEMERAL_ID:
+                    message["event_id"] = event_id
+
+                await self._deliver(audience, int(target_id), message)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"WebSocket broker error: {e}")
+                await asyncio.sleep(1)
+
+    # ---------------- CORE ----------------
+    async def _connect(
+        self,
+        audience: str,
+        target_id: int,
+        ws: WebSocket,
+        last_event_id: str | None = None,
+        hello: dict | None = None,
+    ) -> Connection:
         await ws.accept()
-        self.delivery_connections.setdefault(delivery_id, []).append(ws)
+        conn = Connection(
+            ws,
+            self.metrics,
+            lambda c, reason: asyncio.create_task(self._evict(audience, target_id, c, reason)),
+        )
+        # greeting goes out before any replayed event
+        if hello:
+            conn.send(hello)
+        if last_event_id and self._redis:
+            conn.hold()
+
+        sockets = self._connections[audience].setdefault(target_id, [])
+        sockets.append(conn)
+        self.metrics["connects"] += 1
 
-    def disconnect_delivery(self, delivery_id: int, ws: WebSocket):
-        if delivery_id in self.delivery_connections:
-            self.delivery_connections[delivery_id].remove(ws)
-            if not self.delivery_connections[delivery_id]:
-                del self.delivery_connections[delivery_id]
+        # first local socket for this id → start listening for it
+        if len(sockets) == 1 and self._pubsub:
+            await self._pubsub.subscribe(_channel(audience, target_id))
+
+        # subscribed first, so nothing falls between the replay and live
+        if last_event_id and self._redis:
+            conn.resume(await self._replay(audience, target_id, last_event_id))
+
+        return conn
+
+    async def _replay(self, audience: str, target_id: int, last_event_id: str) -> list[dict]:
+        try:
+            _stream_pos(last_event_id)
+            entries = await self._redis.xrange(
+                _stream_key(audience, target_id),
+                min=last_event_id,
+                max="+",
+                count=REPLAY_LIMIT + 2,
+            )
+        except Exception as e:
+            print(f"WebSocket replay failed: {e}")
+            entries = []
+
+        # the client's last id must still be in the stream, otherwise
+        # the gap was trimmed (or expired) and it has to refetch
+        if not entries or entries[0][0] != last_event_id or len(entries) > REPLAY_LIMIT + 1:
+            self.metrics["resyncs"] += 1
+            return [{"type": "RESYNC", "last_event_id": last_event_id}]
+
+        self.metrics["replayed"] += len(entries) - 1
+        return [
+            {**json.loads(fields["data"]), "event_id": event_id}
+            for event_id, fields in entries[1:]
+        ]
+
+    async def _disconnect(self, audience: str, target_id: int, ws: WebSocket):
+        conns = self._connections[audience]
+        if target_id not in conns:
+            return
+
+        for conn in [c for c in conns[target_id] if c.ws is ws]:
+            conns[target_id].remove(conn)
+            conn.detach()
+            self.metrics["disconnects"] += 1
+
+        if not conns[target_id]:
+            del conns[target_id]
+            if self._pubsub:
+                await self._pubsub.unsubscribe(_channel(audience, target_id))
+
+    async def _evict(self, audience: str, target_id: int, conn: Connection, reason: str):
+        if conn not in self._connections[audience].get(target_id, []):
+            return
+
+        print(f"Evicting {audience} socket {target_id}: {reason}")
+        self.metrics["evicted"] += 1
+        await self._disconnect(audience, target_id, conn.ws)
+        await conn.close(WS_TRY_AGAIN_LATER)
+
+    async def _send(self, audience: str, target_id: int, message: dict):
+        if self._redis:
+            data = json.dumps(message, default=str)
+            channel = _channel(audience, target_id)
+            try:
+                if (message.get("type") or message.get("event")) in EPHEMERAL_TYPES:
+                    await self._redis.publish(channel, f"{EPHEMERAL_ID} {data}")
+                else:
+                    await self._publish_durable(
+                        keys=[_stream_key(audience, target_id)],
+                        args=[channel, data, STREAM_MAXLEN, STREAM_TTL],
+                    )
+                return
+            except Exception as e:
+                # broker down – at least reach the sockets held here
+                print(f"WebSocket publish failed: {e}")
+
+        await self._deliver(audience, target_id, message)
+
+    async def _deliver(self, audience: str, target_id: int, message: dict):
+        for conn in self._connections[audience].get(target_id, []):
+            conn.send(message)
+
+    # ---------------- DELIVERY ----------------
+    async def connect_delivery(
+        self, delivery_id: int, ws: WebSocket, last_event_id: str | None = None, hello: dict | None = None
+    ):
+        return await self._connect(DELIVERY, delivery_id, ws, last_event_id, hello)
+
+    async def disconnect_delivery(self, delivery_id: int, ws: WebSocket):
+        await self._disconnect(DELIVERY, delivery_id, ws)
 
     async def send_delivery(self, delivery_id: int, message: dict):
-        for ws in self.delivery_connections.get(delivery_id, []):
-            await ws.send_json(message)
+        await self._send(DELIVERY, delivery_id, message)
 
     # ---------------- PHARMACIST ----------------
-    async def connect_pharmacist(self, pharmacist_id: int, ws: WebSocket):
-        await ws.accept()
-        self.pharmacist_connections.setdefault(pharmacist_id, []).append(ws)
+    async def connect_pharmacist(
+        self, pharmacist_id: int, ws: WebSocket, last_event_id: str | None = None, hello: dict | None = None
+    ):
+        return await self._connect(PHARMACIST, pharmacist_id, ws, last_event_id, hello)
 
-    def disconnect_pharmacist(self, pharmacist_id: int, ws: WebSocket):
-        if pharmacist_id in self.pharmacist_connections:
-            self.pharmacist_connections[pharmacist_id].remove(ws)
-            if not self.pharmacist_connections[pharmacist_id]:
-                del self.pharmacist_connections[pharmacist_id]
+    async def disconnect_pharmacist(self, pharmacist_id: int, ws: WebSocket):
+        await self._disconnect(PHARMACIST, pharmacist_id, ws)
 
     async def send_pharmacist(self, pharmacist_id: int, message: dict):
-        for ws in self.pharmacist_connections.get(pharmacist_id, []):
-            await ws.send_json(message)
+        await self._send(PHARMACIST, pharmacist_id, message)
 
     # ---------------- CUSTOMER ----------------
-    async def connect_user(self, user_id: int, ws: WebSocket):
-        await ws.accept()
-        self.user_connections.setdefault(user_id, []).append(ws)
+    async def connect_user(
+        self, user_id: int, ws: WebSocket, last_event_id: str | None = None, hello: dict | None = None
+    ):
+        return await self._connect(USER, user_id, ws, last_event_id, hello)
 
-    def disconnect_user(self, user_id: int, ws: WebSocket):
-        if user_id in self.user_connections:
-            self.user_connections[user_id].remove(ws)
-            if not self.user_connections[user_id]:
-                del self.user_connections[user_id]
+    async def disconnect_user(self, user_id: int, ws: WebSocket):
+        await self._disconnect(USER, user_id, ws)
 
     async def send_user(self, user_id: int, message: dict):
-        for ws in self.user_connections.get(user_id, []):
-            await ws.send_json(message)
+        await self._send(USER, user_id, message)
 
 
 manager = ConnectionManager()
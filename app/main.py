@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI, Request
 from fastapi.openapi.utils import get_openapi
 from middleware.middleware import auth_middleware
@@ -33,8 +35,21 @@ from api.routers.routes.admin_financial import router as admin_financial
 from api.routers.routes.pharmacy_analytics import router as pharmacy_analytics 
 from api.routers.routes.delivery_analytics import router as delivery_analytics
 from api.routers.routes.pharmacy_sale_analytics import router as pharmacy_sale_analytics
+from api.routers.routes.realtime import router as realtime
 
 from core.database import Base, engine
+from core.razorpay_client import razorpay_client
+from core.redis import redis_client
+from core.websocket_manager import manager
+from services.webhook_service import run_webhook_worker
+from services.pharmacist_assignment_service import run_dispatch_scheduler
+from services.trip_history_service import run_trip_history_worker
+from services.redis_geo_service import run_geo_reaper
+from services.gps_ingest_service import load_ingest_scripts
+from services.batch_dispatch_service import run_batch_dispatcher
+from services.eta_refresh_service import run_eta_refresher
+from services.invoice_service import run_invoice_worker, shutdown_pool
+from services.email_outbox_service import run_email_worker
 
 app = FastAPI(title="Anand Pharma API")
 
@@ -99,6 +114,7 @@ app.include_router(promo_router)
 app.include_router(targeting_rule)
 app.include_router(marketing_router)
 app.include_router(chat)
+app.include_router(realtime)
 
 
 @app.on_event("startup")
@@ -106,6 +122,38 @@ async def startup():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    # 📡 WebSocket fan-out across workers
+    await manager.start(redis_client)
+
+    # 📜 GPS ingest queues plain EVALSHA in its MULTI
+    await load_ingest_scripts(redis_client)
+
+    # 🔁 Background workers (safe to run in every process)
+    app.state.workers = [
+        asyncio.create_task(run_webhook_worker()),
+        asyncio.create_task(run_dispatch_scheduler()),
+        asyncio.create_task(run_trip_history_worker()),
+        asyncio.create_task(run_geo_reaper()),
+        asyncio.create_task(run_batch_dispatcher()),
+        asyncio.create_task(run_eta_refresher()),
+        asyncio.create_task(run_invoice_worker()),
+        asyncio.create_task(run_email_worker()),
+    ]
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in getattr(app.state, "workers", []):
+        task.cancel()
+
+    await manager.stop()
+
+    # 🖨️ invoice render processes
+    shutdown_pool()
+
+    # 🔌 close pooled gateway connections
+    await razorpay_client.close()
+
 # 🔐 THIS ENABLES AUTHORIZE BUTTON
 def custom_openapi():
     if app.openapi_schema:
@@ -2,8 +2,9 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 from jose import jwt, JWTError
 from core.config import settings
+from utils.jwt import WS_RECONNECT_TYP
 
-PUBLIC_PATHS = ["/docs","/chatbot", "/openapi.json","/auth/register", "/auth/login","/auth/verify-otp", "/auth/resend-otp","/auth/forgot-password","/auth/reset-password","/prescription/upload","/products"]
+PUBLIC_PATHS = ["/docs","/chatbot", "/openapi.json","/auth/register", "/auth/login","/auth/verify-otp", "/auth/resend-otp","/auth/forgot-password","/auth/reset-password","/prescription/upload","/products","/payments/webhook"]
 
 async def auth_middleware(request: Request, call_next):
     if any(request.url.path.startswith(p) for p in PUBLIC_PATHS):
@@ -20,8 +21,12 @@ async def auth_middleware(request: Request, call_next):
             settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM]
         )
-        request.state.user = payload
     except JWTError:
         return JSONResponse(status_code=401, content={"detail": "Invalid token"})
 
+    # websocket reconnect tokens only re-open /ws/* sockets
+    if payload.get("typ") == WS_RECONNECT_TYP:
+        return JSONResponse(status_code=401, content={"detail": "Invalid token"})
+    request.state.user = payload
+
     return await call_next(request)
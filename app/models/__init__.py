@@ -18,6 +18,8 @@ from .order_address import OrderAddress
 
 # Payment
 from .payment import Payment
+from .payment_webhook_event import PaymentWebhookEvent
+from .payment_reconciliation import PaymentReconciliationMismatch, MismatchKind
 
 # Prescription
 from .prescription import Prescription
@@ -29,7 +31,7 @@ from .pharmacist_order import PharmacistOrder
 
 # Delivery
 from .delivery import Delivery, DeliveryCancelReason, DeliveryStatus
-from .delivery_location import DeliveryLocation
+from .delivery_location import DeliveryLocation, DeliveryLocationSegment
 
 #refund
 from .refund import Refund, RefundReason, RefundStatus
@@ -6,8 +6,10 @@ from sqlalchemy import (
     ForeignKey,
     String,
     Boolean,
+    Float,
     DateTime,
-    Enum
+    Enum,
+    Index
 )
 from sqlalchemy.sql import func
 from core.database import Base
@@ -83,6 +85,26 @@ class Delivery(Base):
         nullable=True
     )
 
+    # ===============================
+    # 🗺️ Multi-drop route (null = single drop)
+    # ===============================
+    route_id = Column(String(32), nullable=True, index=True)
+    route_seq = Column(Integer, nullable=True)
+
+    # ===============================
+    # 🧭 Trip summary (filled after delivery)
+    # ===============================
+    distance_km = Column(Float, nullable=True)
+    avg_speed_kmh = Column(Float, nullable=True)
+    idle_seconds = Column(Integer, nullable=True)
+    trip_points = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        # invoice date lookups per order, and the GST register's date range
+        Index("ix_deliveries_order_delivered", "order_id", "delivered_at"),
+        Index("ix_deliveries_delivered_at", "delivered_at"),
+    )
+
     # ===============================
     # 🔐 OTP
     # ===============================
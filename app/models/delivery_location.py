@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, Index, LargeBinary
 from core.database import Base
 
 class DeliveryLocation(Base):
@@ -8,3 +8,24 @@ class DeliveryLocation(Base):
     delivery_id = Column(Integer, ForeignKey("deliveries.id"))
     latitude = Column(Float)
     longitude = Column(Float)
+
+
+class DeliveryLocationSegment(Base):
+    """
+    A run of GPS points for one delivery, delta/varint encoded
+    (see utils.track_codec). One row per ~minute of riding instead
+    of one row per ping.
+    """
+    __tablename__ = "delivery_location_segments"
+
+    id = Column(Integer, primary_key=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id"), nullable=False)
+    agent_id = Column(Integer, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=False)
+    point_count = Column(Integer, nullable=False)
+    points = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("ix_delivery_location_segments_delivery_started", "delivery_id", "started_at"),
+    )
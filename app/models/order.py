@@ -57,14 +57,19 @@ class Order(Base):
         nullable=False
     )
 
-    razorpay_order_id = Column(String, nullable=True)
+    razorpay_order_id = Column(String, nullable=True, index=True)
     razorpay_payment_id = Column(String, nullable=True)
+
+    # 🧾 Invoice (content-addressed PDF, see services/invoice_service.py)
+    invoice_path = Column(String, nullable=True)
+    invoice_hash = Column(String(64), nullable=True)
+
     updated_at = Column(
     DateTime,
     default=datetime.utcnow,
     onupdate=datetime.utcnow
     )
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     # 📦 Order Items
     items = relationship(
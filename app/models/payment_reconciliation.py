@@ -0,0 +1,56 @@
+import enum
+from sqlalchemy import (
+    Column,
+    Integer,
+    BigInteger,
+    String,
+    Boolean,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+)
+from sqlalchemy.sql import func
+from core.database import Base
+
+
+class MismatchKind(str, enum.Enum):
+    # 🩹 auto-healed
+    CAPTURED_NOT_MARKED = "CAPTURED_NOT_MARKED"
+    MISSING_PAYMENT_ID = "MISSING_PAYMENT_ID"
+    REFUND_NOT_SETTLED = "REFUND_NOT_SETTLED"
+
+    # 🔍 needs a human
+    MARKED_PAID_NOT_CAPTURED = "MARKED_PAID_NOT_CAPTURED"
+    AMOUNT_MISMATCH = "AMOUNT_MISMATCH"
+    REFUND_NOT_AT_GATEWAY = "REFUND_NOT_AT_GATEWAY"
+    UNKNOWN_GATEWAY_ORDER = "UNKNOWN_GATEWAY_ORDER"
+
+
+class PaymentReconciliationMismatch(Base):
+    __tablename__ = "payment_reconciliation_mismatches"
+
+    id = Column(BigInteger, primary_key=True)
+
+    run_date = Column(Date, nullable=False)
+    kind = Column(Enum(MismatchKind, name="mismatchkind"), nullable=False)
+
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    razorpay_order_id = Column(String(100), nullable=True)
+    razorpay_payment_id = Column(String(100), nullable=True)
+
+    local_payment_status = Column(String, nullable=True)
+    gateway_status = Column(String, nullable=True)
+
+    # 💰 both sides in paise
+    local_amount = Column(BigInteger, nullable=True)
+    gateway_amount = Column(BigInteger, nullable=True)
+
+    healed = Column(Boolean, default=False, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_payment_recon_run_kind", "run_date", "kind"),
+    )
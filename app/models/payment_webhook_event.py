@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from core.database import Base
+
+
+class PaymentWebhookEvent(Base):
+    """
+    One row per Razorpay webhook event already applied.
+    The primary key is the gateway event id, so replays are no-ops.
+    """
+    __tablename__ = "payment_webhook_events"
+
+    event_id = Column(String(100), primary_key=True)
+    event_type = Column(String(50), nullable=False)
+    razorpay_order_id = Column(String(100), nullable=True, index=True)
+
+    processed_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, UniqueConstraint, Index
 from datetime import datetime
 from core.database import Base
 
@@ -10,3 +10,10 @@ class PharmacistOrder(Base):
     pharmacist_id = Column(Integer, ForeignKey("users.id"))
     status = Column(String)  # SENT / ACCEPTED / REJECTED
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # one offer per (order, pharmacist) – lets dispatch use ON CONFLICT DO NOTHING
+    __table_args__ = (
+        UniqueConstraint("order_id", "pharmacist_id", name="uq_pharmacist_orders_order_pharmacist"),
+        # pharmacist feeds: WHERE pharmacist_id, status ORDER BY id DESC (keyset)
+        Index("ix_pharmacist_orders_feed", pharmacist_id, status, id.desc()),
+    )
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, Enum, DateTime
+from sqlalchemy import JSON, Column, Integer, String, Enum, DateTime, ForeignKey
 from core.database import Base
 from datetime import datetime
 import enum
  
 class PrescriptionStatus(str, enum.Enum):
+    queued = "queued"
+    processing = "processing"
+    failed = "failed"
     approved = "approved"
     pharmacist_review = "pharmacist_review"
     rejected = "rejected"
@@ -12,9 +15,13 @@ class Prescription(Base):
     __tablename__ = "prescriptions"
  
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     file_path = Column(String, nullable=False)
     extracted_text = Column(String)
     status = Column(Enum(PrescriptionStatus), nullable=False)
+    # OCR job output: {"available": [...], "unavailable": [...]}
+    matches = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
  
  
\ No newline at end of file
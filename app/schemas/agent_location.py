@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
 class AgentLocationUpdate(BaseModel):
@@ -7,3 +7,11 @@ class AgentLocationUpdate(BaseModel):
     state: str
     pincode: str
     landmark: Optional[str] = None
+
+
+# (ts, lat, lng) – ts in epoch seconds, compact so phones can batch cheaply
+GpsPoint = tuple[float, float, float]
+
+
+class AgentPointsBatch(BaseModel):
+    points: list[GpsPoint] = Field(min_length=1, max_length=500)
@@ -0,0 +1,91 @@
+"""
+Simulate peak-hour delivery dispatch: greedy vs batch (Hungarian).
+
+    python -m scripts.bench_batch_dispatch --agents 300 --orders 250 --rounds 20
+
+Scatters riders and orders (pharmacy + customer) around Hyderabad and
+compares the total ETA minutes of:
+  greedy  – orders in arrival order, each takes the nearest free rider
+            (what /delivery/assign/{id} does one request at a time)
+  batch   – one min-cost assignment over the whole cost matrix
+Both totals cover every order: an order left without a rider (none
+within MAX_PICKUP_KM) costs --penalty minutes, i.e. waiting for the
+next round. Pure simulation – nothing touches Postgres or Redis.
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from services.batch_dispatch_service import INFEASIBLE, build_cost_matrix, solve_assignment
+
+CENTER = (17.385, 78.4867)
+SPREAD_DEG = 0.12        # ~13 km
+PHARMACIES = 40
+
+
+def _scenario(rng, agents: int, orders: int):
+    riders = rng.normal(CENTER, SPREAD_DEG, size=(agents, 2))
+    stores = rng.normal(CENTER, SPREAD_DEG, size=(PHARMACIES, 2))
+    pickup = stores[rng.integers(0, PHARMACIES, size=orders)]
+    drop = pickup + rng.normal(0, 0.03, size=(orders, 2))
+    return riders, np.hstack([pickup, drop])
+
+
+def _greedy(cost: np.ndarray) -> list[tuple[int, int]]:
+    free = np.ones(cost.shape[0], dtype=bool)
+    pairs = []
+    for j in range(cost.shape[1]):
+        column = np.where(free, cost[:, j], np.inf)
+        i = int(np.argmin(column))
+        if column[i] < INFEASIBLE:
+            free[i] = False
+            pairs.append((i, j))
+    return pairs
+
+
+def _total(cost, pairs, penalty: float) -> float:
+    unserved = cost.shape[1] - len(pairs)
+    return float(sum(cost[i, j] for i, j in pairs)) + penalty * unserved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch dispatch simulator")
+    parser.add_argument("--agents", type=int, default=300)
+    parser.add_argument("--orders", type=int, default=250)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--penalty", type=float, default=60, help="minutes per unserved order")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    greedy_min, batch_min, served, solve_ms = [], [], [], []
+
+    for _ in range(args.rounds):
+        riders, orders = _scenario(rng, args.agents, args.orders)
+        cost = build_cost_matrix(riders, orders)
+
+        g = _greedy(cost)
+
+        started = time.perf_counter()
+        b = solve_assignment(cost)
+        solve_ms.append((time.perf_counter() - started) * 1000)
+
+        # same order set for both: served ETA + penalty per unserved order
+        greedy_min.append(_total(cost, g, args.penalty))
+        batch_min.append(_total(cost, b, args.penalty))
+        served.append((len(g), len(b)))
+
+    g_total, b_total = statistics.mean(greedy_min), statistics.mean(batch_min)
+    print(f"\n🛵 {args.agents} riders × {args.orders} orders, {args.rounds} rounds, {args.penalty:.0f} min per unserved order")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"greedy total ETA : {g_total:10.0f} min  (served {statistics.mean(s[0] for s in served):.0f})")
+    print(f"batch  total ETA : {b_total:10.0f} min  (served {statistics.mean(s[1] for s in served):.0f})")
+    print(f"saved            : {g_total - b_total:10.0f} min  ({(1 - b_total / g_total) * 100:.1f}%)")
+    print(f"solve p50        : {statistics.median(solve_ms):10.2f} ms")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Email throughput: connect-per-message vs the pooled outbox worker.
+
+    python -m scripts.mock_smtp_server --port 1025 --latency-ms 20 &
+    EMAIL_HOST=127.0.0.1 EMAIL_PORT=1025 EMAIL_USE_TLS=false \\
+        python -m scripts.bench_email_outbox --messages 2000 --connections 3
+
+  baseline – one SMTP session (connect, STARTTLS if on, login) per
+             message, which is what send_html_email used to do inline
+  outbox   – enqueue latency on the HTTP path, then how fast the worker
+             drains the stream over persistent sessions
+Recipients are @bench.local; use a dev Redis, the live outbox is shared.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.redis import get_redis
+from services.email_outbox_service import (
+    RETRY_KEY,
+    STREAM_KEY,
+    SmtpConnection,
+    build_message,
+    enqueue_email,
+    run_email_worker,
+)
+
+HTML = "<html><body><p>Benchmark message</p></body></html>"
+
+
+def _baseline(count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        conn = SmtpConnection()
+        conn.send(build_message({"to": f"baseline-{i}@bench.local", "subject": "bench", "html": HTML}))
+        conn.close()
+    return count / (time.perf_counter() - started)
+
+
+async def _drained(redis) -> bool:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xlen(STREAM_KEY)
+        pipe.zcard(RETRY_KEY)
+        queued, retrying = await pipe.execute()
+    return queued == 0 and retrying == 0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Email outbox benchmark")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=3)
+    parser.add_argument("--baseline", type=int, default=100)
+    parser.add_argument("--timeout", type=int, default=300)
+    args = parser.parse_args()
+
+    redis = await get_redis()
+
+    baseline_rate = await asyncio.to_thread(_baseline, args.baseline) if args.baseline else 0
+
+    # 📥 HTTP-path cost: one XADD per email
+    enqueue_us = []
+    for i in range(args.messages):
+        started = time.perf_counter()
+        await enqueue_email(f"outbox-{i}@bench.local", "bench", HTML)
+        enqueue_us.append((time.perf_counter() - started) * 1_000_000)
+
+    # 📨 drain with the pooled worker
+    started = time.perf_counter()
+    worker = asyncio.create_task(run_email_worker(args.connections))
+    try:
+        deadline = started + args.timeout
+        while not await _drained(redis):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("outbox not drained before --timeout")
+            await asyncio.sleep(0.05)
+        took = time.perf_counter() - started
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    enqueue_us.sort()
+    print(f"\n📧 {args.messages} emails, {args.connections} pooled SMTP sessions")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    if args.baseline:
+        print(f"baseline      : {baseline_rate:10.1f} msg/s  (connect per message)")
+    print(f"outbox drain  : {args.messages / took:10.1f} msg/s")
+    print(f"enqueue p50   : {statistics.median(enqueue_us):10.1f} µs")
+    print(f"enqueue p99   : {enqueue_us[int(len(enqueue_us) * 0.99) - 1]:10.1f} µs")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
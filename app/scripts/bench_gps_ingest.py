@@ -0,0 +1,93 @@
+"""
+Benchmark raw GPS ingestion against Redis.
+
+    python -m scripts.bench_gps_ingest --agents 2000 --seconds 10 --batch 5
+
+Simulates N riders each posting a batch of (ts, lat, lng) points every
+second through ingest_points (downsample + one MULTI), and reports the
+sustained pings/sec. Agent ids start at 9_000_000 so live riders are
+untouched; their keys and buffered history are removed afterwards.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from core.redis import get_redis
+from services.gps_ingest_service import HISTORY_KEY, ingest_points
+from services.redis_geo_service import RedisGeoService
+
+BASE_AGENT_ID = 9_000_000
+
+
+async def _rider(redis, agent_id: int, batch: int, until: float, latencies: list):
+    lat, lng = 17.385 + random.uniform(-0.1, 0.1), 78.486 + random.uniform(-0.1, 0.1)
+    pings = 0
+
+    while time.perf_counter() < until:
+        now = time.time()
+        points = []
+        for i in range(batch):
+            lat += random.uniform(-0.0002, 0.0002)
+            lng += random.uniform(-0.0002, 0.0002)
+            points.append((now - (batch - i) / batch, lat, lng))
+
+        started = time.perf_counter()
+        await ingest_points(redis, agent_id, points)
+        latencies.append((time.perf_counter() - started) * 1000)
+        pings += batch
+
+        await asyncio.sleep(max(0.0, 1 - (time.perf_counter() - started)))
+
+    return pings
+
+
+async def _cleanup(redis, agent_ids):
+    async with redis.pipeline(transaction=False) as pipe:
+        for agent_id in agent_ids:
+            await RedisGeoService.remove_agent(pipe, agent_id)
+            pipe.delete(f"delivery:agent:{agent_id}", f"delivery:agent:online:{agent_id}")
+        await pipe.execute()
+
+    # drop only the synthetic riders' history, keep real points queued
+    raw = await redis.lrange(HISTORY_KEY, 0, -1)
+    prefix = tuple(f"{a}," for a in agent_ids)
+    await redis.delete(HISTORY_KEY)
+    real = [entry for entry in raw if not entry.startswith(prefix)]
+    if real:
+        await redis.rpush(HISTORY_KEY, *real)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="GPS ingestion benchmark")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=5)
+    args = parser.parse_args()
+
+    redis = await get_redis()
+    agent_ids = [BASE_AGENT_ID + i for i in range(args.agents)]
+    latencies: list[float] = []
+
+    try:
+        until = time.perf_counter() + args.seconds
+        started = time.perf_counter()
+        pings = await asyncio.gather(*(
+            _rider(redis, agent_id, args.batch, until, latencies) for agent_id in agent_ids
+        ))
+        took = time.perf_counter() - started
+
+        latencies.sort()
+        print(f"\n🚴 {args.agents} riders × {args.batch} points/s for {args.seconds}s")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print(f"pings/sec   : {sum(pings) / took:10.0f}")
+        print(f"batch p50   : {statistics.median(latencies):10.2f} ms")
+        print(f"batch p99   : {latencies[int(len(latencies) * 0.99) - 1]:10.2f} ms")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+    finally:
+        await _cleanup(redis, agent_ids)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
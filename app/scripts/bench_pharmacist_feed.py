@@ -0,0 +1,160 @@
+"""
+Benchmark the pharmacist order feeds against a heavy pharmacist.
+
+    python -m scripts.bench_pharmacist_feed --offers 5000 --items 3
+
+Seeds one throw-away pharmacist with N historical offers (mostly
+REJECTED / ACCEPTED, a few PENDING), then times the old per-order item
+query loop against the single keyset-paged query with selectinload.
+All seeded rows are removed afterwards.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import selectinload
+
+import models  # noqa: F401  (register all mappers)
+from core.database import AsyncSessionLocal
+from models.order import Order, OrderStatus
+from models.order_address import OrderAddress
+from models.order_item import OrderItem
+from models.pharmacist_order import PharmacistOrder
+from models.user import User
+
+PAGE = 20
+RUNS = 20
+
+
+async def _seed(offers: int, items: int):
+    tag = uuid.uuid4().hex[:8]
+
+    async with AsyncSessionLocal() as db:
+        customer = User(full_name="Bench Customer", email=f"bench-{tag}-c@test.local", password="x")
+        pharmacist = User(
+            full_name="Bench Pharmacist",
+            email=f"bench-{tag}-p@test.local",
+            password="x",
+            role="pharmacist",
+            is_active=True,
+        )
+        db.add_all([customer, pharmacist])
+        await db.flush()
+
+        order_ids = (
+            await db.execute(
+                insert(Order).returning(Order.id),
+                [
+                    {"user_id": customer.id, "status": OrderStatus.WAITING_PHARMACIST, "total": 100}
+                    for _ in range(offers)
+                ],
+            )
+        ).scalars().all()
+
+        await db.execute(
+            insert(OrderAddress),
+            [{"order_id": oid, "address": "MG Road", "city": "Hyderabad"} for oid in order_ids],
+        )
+        await db.execute(
+            insert(OrderItem),
+            [
+                {"order_id": oid, "product_name": f"Med {n}", "quantity": 1, "price": 10}
+                for oid in order_ids
+                for n in range(items)
+            ],
+        )
+        await db.execute(
+            insert(PharmacistOrder),
+            [
+                {
+                    "order_id": oid,
+                    "pharmacist_id": pharmacist.id,
+                    "status": ("PENDING", "ACCEPTED", "REJECTED", "REJECTED")[i % 4],
+                }
+                for i, oid in enumerate(order_ids)
+            ],
+        )
+        await db.commit()
+
+        return pharmacist.id, [customer.id, pharmacist.id], list(order_ids)
+
+
+async def _old_feed(db, pharmacist_id: int, status: str):
+    result = await db.execute(
+        select(PharmacistOrder, Order)
+        .join(Order, Order.id == PharmacistOrder.order_id)
+        .where(
+            PharmacistOrder.pharmacist_id == pharmacist_id,
+            PharmacistOrder.status == status
+        )
+        .order_by(PharmacistOrder.id.desc())
+    )
+    rows = []
+    for po, order in result.all():
+        items = (
+            await db.execute(select(OrderItem).where(OrderItem.order_id == order.id))
+        ).scalars().all()
+        rows.append((order.id, len(items)))
+    return rows
+
+
+async def _new_feed(db, pharmacist_id: int, status: str):
+    result = await db.execute(
+        select(PharmacistOrder, Order)
+        .join(Order, Order.id == PharmacistOrder.order_id)
+        .options(selectinload(Order.items))
+        .where(
+            PharmacistOrder.pharmacist_id == pharmacist_id,
+            PharmacistOrder.status == status
+        )
+        .order_by(PharmacistOrder.id.desc())
+        .limit(PAGE + 1)
+    )
+    return [(order.id, len(order.items)) for po, order in result.all()[:PAGE]]
+
+
+async def _time(fn, *args):
+    samples = []
+    for _ in range(RUNS):
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await fn(db, *args)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def _cleanup(order_ids, user_ids):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PharmacistOrder).where(PharmacistOrder.order_id.in_(order_ids)))
+        await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+        await db.execute(delete(OrderAddress).where(OrderAddress.order_id.in_(order_ids)))
+        await db.execute(delete(Order).where(Order.id.in_(order_ids)))
+        await db.execute(delete(User).where(User.id.in_(user_ids)))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Pharmacist feed benchmark")
+    parser.add_argument("--offers", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    pharmacist_id, user_ids, order_ids = await _seed(args.offers, args.items)
+
+    try:
+        print(f"\n📦 {args.offers} offers × {args.items} items (median of {RUNS} runs)")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        for status, label in (("PENDING", "nearby-orders"), ("ACCEPTED", "my")):
+            old = await _time(_old_feed, pharmacist_id, status)
+            new = await _time(_new_feed, pharmacist_id, status)
+            print(f"{label:<14} N+1 (all rows): {old:8.1f} ms   keyset page: {new:6.1f} ms")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+    finally:
+        await _cleanup(order_ids, user_ids)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Contention check for first-accept-wins order claiming.
+
+    python -m scripts.check_accept_contention --acceptors 50
+
+Creates one WAITING_PHARMACIST order offered to N throw-away pharmacists,
+fires N concurrent claims (one session each) and asserts that exactly
+one wins, the order belongs to the winner, and every other offer ended
+up REJECTED. All rows it creates are removed afterwards.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy import delete, select
+
+import models  # noqa: F401  (register all mappers)
+from core.database import AsyncSessionLocal
+from models.order import Order, OrderStatus
+from models.pharmacist_order import PharmacistOrder
+from models.user import User
+from services.pharmacist_assignment_service import claim_order
+
+
+async def _setup(acceptors: int):
+    tag = uuid.uuid4().hex[:8]
+
+    async with AsyncSessionLocal() as db:
+        customer = User(
+            full_name="Contention Customer",
+            email=f"contention-{tag}-customer@test.local",
+            password="x",
+            role="user",
+        )
+        pharmacists = [
+            User(
+                full_name=f"Contention Pharmacist {i}",
+                email=f"contention-{tag}-{i}@test.local",
+                password="x",
+                role="pharmacist",
+                is_active=True,
+            )
+            for i in range(acceptors)
+        ]
+        db.add_all([customer, *pharmacists])
+        await db.flush()
+
+        order = Order(user_id=customer.id, status=OrderStatus.WAITING_PHARMACIST)
+        db.add(order)
+        await db.flush()
+
+        db.add_all([
+            PharmacistOrder(order_id=order.id, pharmacist_id=p.id, status="PENDING")
+            for p in pharmacists
+        ])
+        await db.commit()
+
+        return order.id, customer.id, [p.id for p in pharmacists]
+
+
+async def _claim(order_id: int, pharmacist_id: int, start: asyncio.Event):
+    async with AsyncSessionLocal() as db:
+        await start.wait()
+        losers = await claim_order(db, order_id, pharmacist_id)
+        return pharmacist_id, losers
+
+
+async def _cleanup(order_id: int, user_ids: list[int]):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(PharmacistOrder).where(PharmacistOrder.order_id == order_id))
+        await db.execute(delete(Order).where(Order.id == order_id))
+        await db.execute(delete(User).where(User.id.in_(user_ids)))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="First-accept-wins contention check")
+    parser.add_argument("--acceptors", type=int, default=50)
+    args = parser.parse_args()
+
+    order_id, customer_id, pharmacist_ids = await _setup(args.acceptors)
+
+    try:
+        start = asyncio.Event()
+        tasks = [
+            asyncio.create_task(_claim(order_id, pid, start))
+            for pid in pharmacist_ids
+        ]
+        await asyncio.sleep(0)   # park every task on the start line
+
+        started = time.perf_counter()
+        start.set()
+        results = await asyncio.gather(*tasks)
+        took = (time.perf_counter() - started) * 1000
+
+        winners = [(pid, losers) for pid, losers in results if losers is not None]
+
+        async with AsyncSessionLocal() as db:
+            order = await db.get(Order, order_id)
+            statuses = dict(
+                (
+                    await db.execute(
+                        select(PharmacistOrder.pharmacist_id, PharmacistOrder.status)
+                        .where(PharmacistOrder.order_id == order_id)
+                    )
+                ).all()
+            )
+
+        assert len(winners) == 1, f"expected 1 winner, got {len(winners)}"
+        winner, losers = winners[0]
+        assert order.status == OrderStatus.ACCEPTED
+        assert order.pharmacy_id == winner
+        assert statuses[winner] == "ACCEPTED"
+        assert sorted(losers) == sorted(p for p in pharmacist_ids if p != winner)
+        assert all(s == "REJECTED" for p, s in statuses.items() if p != winner)
+
+        print(f"✅ {args.acceptors} concurrent acceptors → 1 winner ({winner}) in {took:.1f} ms")
+
+    except AssertionError as e:
+        print(f"❌ Contention check failed: {e}")
+        sys.exit(1)
+
+    finally:
+        await _cleanup(order_id, [customer_id, *pharmacist_ids])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Monthly GST sales register across all pharmacies.
+
+    python -m scripts.export_gst_register --from 2026-01-01 --to 2026-01-31
+    python -m scripts.export_gst_register --month 2026-01 --xlsx --pdfs --processes 8
+
+Streams delivered/confirmed orders and their items with a server-side
+cursor into a line-level CSV (and optionally an XLSX workbook and a zip
+of invoice PDFs rendered in worker processes). Memory use does not grow
+with the range. Files land in --out (default ./exports).
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, timedelta
+
+import models  # noqa: F401  (register all mappers)
+from services.gst_register_service import export_gst_register
+
+
+def _month(value: str) -> tuple[date, date]:
+    first = date.fromisoformat(f"{value}-01")
+    next_month = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first, next_month - timedelta(days=1)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Export the GST sales register")
+    parser.add_argument("--month", type=_month, default=None, help="YYYY-MM")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--xlsx", action="store_true")
+    parser.add_argument("--pdfs", action="store_true")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    if args.month:
+        start, end = args.month
+    elif args.start and args.end:
+        start, end = args.start, args.end
+    else:
+        parser.error("give --month or both --from and --to")
+
+    summary = await export_gst_register(
+        start,
+        end,
+        args.out,
+        xlsx=args.xlsx,
+        pdfs=args.pdfs,
+        processes=args.processes,
+    )
+
+    print("\n✅ GST register exported")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"📅 Range     : {summary['from']} → {summary['to']}")
+    print(f"🧾 Orders    : {summary['orders']:,}")
+    print(f"📄 Lines     : {summary['lines']:,}")
+    if args.pdfs:
+        print(f"🖨️  PDFs      : {summary['pdfs_rendered']:,} rendered, {summary['pdfs_reused']:,} reused")
+    for kind, path in summary["files"].items():
+        print(f"📁 {kind:<9} : {path}")
+    print(f"⏱️  Took      : {summary['seconds']}s")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+"""
+Local Razorpay stand-in for offline load tests.
+
+    python -m scripts.mock_razorpay_gateway --port 9010 --latency-ms 80 --failure-rate 0.02
+
+Then run the API with:
+
+    PAYMENT_MODE=RAZORPAY
+    RAZORPAY_BASE_URL=http://127.0.0.1:9010/v1
+
+`POST /v1/_mock/orders/{id}/pay` captures a payment and returns the
+ids + signature a checkout page would post to /payments/verify.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "mock_secret").strip()
+LATENCY_MS = float(os.getenv("MOCK_GATEWAY_LATENCY_MS", "0"))
+JITTER_MS = float(os.getenv("MOCK_GATEWAY_JITTER_MS", "0"))
+FAILURE_RATE = float(os.getenv("MOCK_GATEWAY_FAILURE_RATE", "0"))
+
+app = FastAPI(title="Mock Razorpay Gateway")
+
+ORDERS: dict[str, dict] = {}
+PAYMENTS: dict[str, dict] = {}
+
+
+# ======================================================
+# ⏱️ LATENCY + FAILURE INJECTION
+# ======================================================
+@app.middleware("http")
+async def chaos(request: Request, call_next):
+    delay = LATENCY_MS + random.uniform(0, JITTER_MS)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+
+    if not request.url.path.startswith("/v1/_mock") and random.random() < FAILURE_RATE:
+        return JSONResponse(
+            status_code=502,
+            content={"error": {"code": "GATEWAY_ERROR", "description": "Injected failure"}},
+        )
+
+    return await call_next(request)
+
+
+# ======================================================
+# 🧾 ORDERS
+# ======================================================
+@app.post("/v1/orders")
+async def create_order(payload: dict):
+    order_id = f"order_{uuid.uuid4().hex[:14]}"
+    order = {
+        "id": order_id,
+        "entity": "order",
+        "amount": payload["amount"],
+        "amount_paid": 0,
+        "currency": payload.get("currency", "INR"),
+        "receipt": payload.get("receipt"),
+        "status": "created",
+        "created_at": int(time.time()),
+    }
+    ORDERS[order_id] = order
+    return order
+
+
+@app.get("/v1/orders/{order_id}")
+async def fetch_order(order_id: str):
+    order = ORDERS.get(order_id)
+    if not order:
+        raise HTTPException(404, {"code": "BAD_REQUEST_ERROR", "description": "Order not found"})
+    return order
+
+
+# ======================================================
+# 💳 PAYMENTS (paged like the real API: count <= 100)
+# ======================================================
+@app.get("/v1/payments")
+async def list_payments(
+    count: int = 10,
+    skip: int = 0,
+    from_: int = Query(0, alias="from"),
+    to: int = Query(2**31),
+):
+    items = sorted(
+        (p for p in PAYMENTS.values() if from_ <= p["created_at"] < to),
+        key=lambda p: (p["created_at"], p["id"]),
+    )
+    page = items[skip: skip + min(count, 100)]
+    return {"entity": "collection", "count": len(page), "items": page}
+
+
+# ======================================================
+# 💳 SIMULATE CHECKOUT
+# ======================================================
+@app.post("/v1/_mock/orders/{order_id}/pay")
+async def pay_order(order_id: str):
+    order = ORDERS.get(order_id)
+    if not order:
+        raise HTTPException(404, "Order not found")
+
+    payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+    PAYMENTS[payment_id] = {
+        "id": payment_id,
+        "entity": "payment",
+        "order_id": order_id,
+        "amount": order["amount"],
+        "currency": order["currency"],
+        "status": "captured",
+        "amount_refunded": 0,
+        "refund_status": None,
+        "created_at": int(time.time()),
+    }
+    order["status"] = "paid"
+    order["amount_paid"] = order["amount"]
+
+    signature = hmac.new(
+        KEY_SECRET.encode(),
+        f"{order_id}|{payment_id}".encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+    return {
+        "razorpay_order_id": order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+    }
+
+
+def main():
+    global LATENCY_MS, JITTER_MS, FAILURE_RATE
+
+    parser = argparse.ArgumentParser(description="Mock Razorpay gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--failure-rate", type=float, default=FAILURE_RATE)
+    args = parser.parse_args()
+
+    LATENCY_MS = args.latency_ms
+    JITTER_MS = args.jitter_ms
+    FAILURE_RATE = args.failure_rate
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
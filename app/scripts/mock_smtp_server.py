@@ -0,0 +1,87 @@
+"""
+Local SMTP stand-in for offline email tests.
+
+    python -m scripts.mock_smtp_server --port 1025 --latency-ms 20 --failure-rate 0.01
+
+Then run the API / email worker with:
+
+    EMAIL_HOST=127.0.0.1
+    EMAIL_PORT=1025
+    EMAIL_USE_TLS=false
+
+Accepts any AUTH LOGIN/PLAIN credentials, swallows every message and
+prints the accepted count every few seconds. --failure-rate answers DATA
+with a transient 451 so the outbox retry path can be exercised.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+
+class CountingHandler:
+    def __init__(self, latency_ms: float, failure_rate: float):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.accepted = 0
+        self.rejected = 0
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if random.random() < self.failure_rate:
+            self.rejected += 1
+            return "451 4.3.0 Mock transient failure"
+
+        self.accepted += 1
+        return "250 Message accepted for delivery"
+
+
+def _accept_any(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock SMTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    handler = CountingHandler(args.latency_ms, args.failure_rate)
+    controller = Controller(
+        handler,
+        hostname=args.host,
+        port=args.port,
+        authenticator=_accept_any,
+        auth_require_tls=False,
+    )
+    controller.start()
+    print(f"📮 Mock SMTP listening on {args.host}:{args.port}")
+
+    try:
+        while True:
+            time.sleep(5)
+            print(
+                f"accepted={handler.accepted} rejected={handler.rejected} "
+                f"sessions={handler.sessions}"
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Prescription OCR worker.
+
+    python -m scripts.ocr_worker                 # one OCR process per core
+    python -m scripts.ocr_worker --processes 4
+
+/prescription/upload only stores the file and queues a job; this worker
+runs tesseract / pdfplumber in a process pool, writes the text, doctor
+check and medicine matches back to the prescription and pushes
+PRESCRIPTION_PROCESSED to the customer. Run as many as the queue needs
+(they share one consumer group).
+"""
+import argparse
+import asyncio
+
+import models  # noqa: F401  (register all mappers)
+from services.prescription_ocr_service import run_ocr_worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prescription OCR worker")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    asyncio.run(run_ocr_worker(args.processes))
@@ -0,0 +1,49 @@
+"""
+Nightly payment reconciliation (orders / refunds vs Razorpay).
+
+    python -m scripts.reconcile_payments                    # yesterday (IST)
+    python -m scripts.reconcile_payments --date 2026-01-31 --concurrency 32
+    python -m scripts.reconcile_payments --no-heal          # report only
+
+Point RAZORPAY_BASE_URL at scripts/mock_razorpay_gateway.py to run offline.
+Mismatches land in the payment_reconciliation_mismatches table.
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+import models  # noqa: F401  (register all mappers)
+from core.razorpay_client import razorpay_client
+from services.reconciliation_service import IST, reconcile_payments
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Reconcile payments against Razorpay")
+    parser.add_argument("--date", type=date.fromisoformat, default=None)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--no-heal", action="store_true")
+    args = parser.parse_args()
+
+    run_date = args.date or (datetime.now(IST).date() - timedelta(days=1))
+
+    try:
+        summary = await reconcile_payments(
+            run_date,
+            concurrency=args.concurrency,
+            heal=not args.no_heal,
+        )
+    finally:
+        await razorpay_client.close()
+
+    print("\n✅ Reconciliation finished")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print(f"📅 Date      : {summary['run_date']}")
+    print(f"💳 Payments  : {summary['gateway_payments']}")
+    for kind, count in sorted(summary["mismatches"].items()):
+        print(f"⚠️  {kind:<26}: {count}")
+    print(f"⏱️  Took      : {summary['seconds']}s")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
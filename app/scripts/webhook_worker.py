@@ -0,0 +1,16 @@
+"""
+Standalone Razorpay webhook worker.
+
+    python -m scripts.webhook_worker
+
+The API process already runs one consumer; start more of these to
+drain a backlog faster (they share the same consumer group).
+"""
+import asyncio
+
+import models  # noqa: F401  (register all mappers)
+from services.webhook_service import run_webhook_worker
+
+
+if __name__ == "__main__":
+    asyncio.run(run_webhook_worker())
@@ -0,0 +1,212 @@
+from typing import Optional
+
+from core.redis import redis_client, run_script
+from services.redis_geo_service import DELIVERY_INDEX, shards_near
+
+# ======================================================
+# 🟢 AGENT AVAILABILITY INDEX
+#   dispatch:agents:idle    SET  online, no active delivery
+#   dispatch:agents:busy    SET  online, carrying ≥ 1 delivery
+#   dispatch:agent:load     HASH agent → active deliveries
+# not in either set = offline
+# ======================================================
+IDLE_KEY = "dispatch:agents:idle"
+BUSY_KEY = "dispatch:agents:busy"
+LOAD_KEY = "dispatch:agent:load"
+
+MAX_ACTIVE_DELIVERIES = 1
+CANDIDATES = 20               # k nearest, then filter
+
+
+_MARK_ONLINE = redis_client.register_script("""
+if tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0') > 0 then
+    redis.call('SREM', KEYS[1], ARGV[1])
+    redis.call('SADD', KEYS[2], ARGV[1])
+else
+    redis.call('SREM', KEYS[2], ARGV[1])
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+return 1
+""")
+
+# GPS ping: refresh presence only for riders already online – one who
+# went offline is in neither set and stays out of dispatch
+# KEYS: idle, busy, load, online flag, agent hash   ARGV: agent, flag ttl
+_TOUCH_ONLINE = redis_client.register_script("""
+local idle = redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1
+local busy = redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1
+if not idle and not busy then
+    return 0
+end
+if tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0') > 0 then
+    redis.call('SREM', KEYS[1], ARGV[1])
+    redis.call('SADD', KEYS[2], ARGV[1])
+else
+    redis.call('SREM', KEYS[2], ARGV[1])
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+redis.call('SET', KEYS[4], 1, 'EX', ARGV[2])
+redis.call('HSET', KEYS[5], 'online', 1)
+return 1
+""")
+
+_RELEASE = redis_client.register_script("""
+local load = redis.call('HINCRBY', KEYS[3], ARGV[1], -1)
+if load > 0 then
+    return load
+end
+redis.call('HDEL', KEYS[3], ARGV[1])
+-- back to idle only if still online (offline riders are in neither set)
+if redis.call('SREM', KEYS[2], ARGV[1]) == 1 then
+    redis.call('SADD', KEYS[1], ARGV[1])
+end
+return 0
+""")
+
+# k nearest fresh riders per shard, merged nearest-first → first online
+# one under the load cap → reserve
+# KEYS: idle, busy, load, then geo/seen pairs for the shards to search
+_CLAIM_NEAREST = redis_client.register_script("""
+local cutoff = tonumber(ARGV[5])
+local max_load = tonumber(ARGV[6])
+local hits = {}
+
+for k = 4, #KEYS, 2 do
+    local found = redis.call(
+        'GEOSEARCH', KEYS[k], 'FROMLONLAT', ARGV[1], ARGV[2],
+        'BYRADIUS', ARGV[3], 'km', 'ASC', 'COUNT', ARGV[4], 'WITHDIST'
+    )
+    for _, hit in ipairs(found) do
+        local seen = redis.call('ZSCORE', KEYS[k + 1], hit[1])
+        if seen and tonumber(seen) >= cutoff then
+            table.insert(hits, {hit[1], tonumber(hit[2])})
+        end
+    end
+end
+
+table.sort(hits, function(a, b) return a[2] < b[2] end)
+
+for _, hit in ipairs(hits) do
+    local agent = hit[1]
+    if agent ~= ARGV[7] then
+        local idle = redis.call('SISMEMBER', KEYS[1], agent) == 1
+        local busy = redis.call('SISMEMBER', KEYS[2], agent) == 1
+        local load = tonumber(redis.call('HGET', KEYS[3], agent) or '0')
+
+        if (idle or busy) and load < max_load then
+            redis.call('HINCRBY', KEYS[3], agent, 1)
+            redis.call('SREM', KEYS[1], agent)
+            redis.call('SADD', KEYS[2], agent)
+            return agent
+        end
+    end
+end
+return false
+""")
+
+
+# reserve one specific rider (batch dispatcher already chose them)
+# ARGV[3] = deliveries taken at once (a multi-drop route counts each drop)
+_CLAIM = redis_client.register_script("""
+local idle = redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1
+local busy = redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1
+local load = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+
+if (idle or busy) and load < tonumber(ARGV[2]) then
+    redis.call('HINCRBY', KEYS[3], ARGV[1], ARGV[3])
+    redis.call('SREM', KEYS[1], ARGV[1])
+    redis.call('SADD', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+""")
+
+# queued as EVALSHA inside pipelines – load_scripts() these first
+PIPELINED_SCRIPTS = [_MARK_ONLINE, _TOUCH_ONLINE]
+
+
+class AgentAvailability:
+
+    @staticmethod
+    async def mark_online(redis, agent_id: int):
+        """Idle or busy depending on current load. Works in a pipeline."""
+        await run_script(_MARK_ONLINE, keys=[IDLE_KEY, BUSY_KEY, LOAD_KEY], args=[str(agent_id)], client=redis)
+
+    @staticmethod
+    async def touch_online(redis, agent_id: int, online_key: str, agent_key: str, ttl: int):
+        """
+        mark_online for location pings: no-op unless the rider is already
+        online, then also refreshes the online flag and hash. Works in a pipeline.
+        """
+        await run_script(
+            _TOUCH_ONLINE,
+            keys=[IDLE_KEY, BUSY_KEY, LOAD_KEY, online_key, agent_key],
+            args=[str(agent_id), ttl],
+            client=redis,
+        )
+
+    @staticmethod
+    async def mark_offline(redis, agent_id: int):
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.srem(IDLE_KEY, str(agent_id))
+            pipe.srem(BUSY_KEY, str(agent_id))
+            await pipe.execute()
+
+    @staticmethod
+    async def release(redis, agent_id: int) -> int:
+        """One delivery finished or cancelled. Returns the remaining load."""
+        return await _RELEASE(keys=[IDLE_KEY, BUSY_KEY, LOAD_KEY], args=[str(agent_id)], client=redis)
+
+    @staticmethod
+    async def claim_nearest(
+        redis,
+        latitude: float,
+        longitude: float,
+        radius_km: int = 10,
+        exclude_agent_id: int | None = None,
+        max_load: int = MAX_ACTIVE_DELIVERIES,
+    ) -> Optional[int]:
+        """
+        Nearest fresh, online rider below `max_load`, reserved atomically
+        (load +1, moved to busy) so two dispatches can't pick the same one.
+        Call release() if the assignment is then abandoned.
+        """
+        agent_id = await _CLAIM_NEAREST(
+            keys=[
+                IDLE_KEY,
+                BUSY_KEY,
+                LOAD_KEY,
+                *DELIVERY_INDEX.shard_keys(shards_near(latitude, longitude, radius_km)),
+            ],
+            args=[
+                longitude, latitude, radius_km, CANDIDATES,
+                DELIVERY_INDEX.cutoff(), max_load,
+                str(exclude_agent_id or ""),
+            ],
+            client=redis,
+        )
+        return int(agent_id) if agent_id else None
+
+    @staticmethod
+    async def claim(redis, agent_id: int, max_load: int = MAX_ACTIVE_DELIVERIES, units: int = 1):
+        """
+        Reserve a given rider for `units` deliveries (release() each one).
+        Works in a pipeline (result comes from execute).
+        """
+        return await _CLAIM(
+            keys=[IDLE_KEY, BUSY_KEY, LOAD_KEY],
+            args=[str(agent_id), max_load, units],
+            client=redis,
+        )
+
+    @staticmethod
+    async def idle_agents(redis) -> set[str]:
+        return await redis.smembers(IDLE_KEY)
+
+    @staticmethod
+    async def snapshot(redis) -> dict:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.scard(IDLE_KEY)
+            pipe.scard(BUSY_KEY)
+            idle, busy = await pipe.execute()
+        return {"idle": idle, "busy": busy}
@@ -0,0 +1,300 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sqlalchemy import Integer, column, exists, insert, select, update, values
+from sqlalchemy.orm import aliased
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from core.websocket_manager import manager
+from models.delivery import Delivery, DeliveryStatus
+from models.order import Order, OrderStatus
+from models.order_address import OrderAddress
+from models.user import User
+from services.agent_availability_service import AgentAvailability
+from services.eta_service import estimate_eta_minutes, haversine_km
+from services.redis_geo_service import DELIVERY_INDEX
+from services.route_batching_service import PICKUP_MINUTES, build_jobs
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+BATCH_INTERVAL_SECONDS = settings.DELIVERY_BATCH_INTERVAL_SECONDS
+LOCK_KEY = "dispatch:delivery:batch:lock"   # one dispatcher per cycle cluster-wide
+
+MAX_ORDERS = 500
+MAX_PICKUP_KM = 10
+INFEASIBLE = 1e6
+
+ACTIVE_STATES = [DeliveryStatus.ASSIGNED, DeliveryStatus.PICKED_UP]
+
+
+# ======================================================
+# 🧮 COST MATRIX + ASSIGNMENT (pure numpy / scipy)
+# ======================================================
+def build_cost_matrix(agents: np.ndarray, orders: np.ndarray) -> np.ndarray:
+    """
+    agents: (A, 2) lat, lng
+    orders: (O, 4) pickup lat, pickup lng, drop lat, drop lng
+    Returns (A, O) minutes: ride to the pharmacy + pharmacy → customer.
+    """
+    a_lat, a_lng = agents[:, 0:1], agents[:, 1:2]
+    p_lat, p_lng, d_lat, d_lng = orders.T
+
+    to_pickup = estimate_eta_minutes(a_lat, a_lng, p_lat, p_lng)
+    to_drop = estimate_eta_minutes(p_lat, p_lng, d_lat, d_lng)
+    cost = to_pickup + to_drop
+
+    cost[haversine_km(a_lat, a_lng, p_lat, p_lng) > MAX_PICKUP_KM] = INFEASIBLE
+    return cost
+
+
+def build_route_cost_matrix(agents: np.ndarray, jobs: list[dict]) -> np.ndarray:
+    """
+    agents: (A, 2) lat, lng
+    jobs:   routed batches from build_jobs
+    Returns (A, J) total customer minutes: every drop on the route waits
+    for the ride to the pharmacy, plus its own offset along the route.
+    """
+    a_lat, a_lng = agents[:, 0:1], agents[:, 1:2]
+    pickups = np.array([job["pickup"] for job in jobs], dtype=np.float64)
+    drops = np.array([len(job["orders"]) for job in jobs])
+    route_wait = np.array([job["offsets"].sum() for job in jobs])
+
+    to_pickup = estimate_eta_minutes(a_lat, a_lng, pickups[:, 0], pickups[:, 1]) + PICKUP_MINUTES
+    cost = to_pickup * drops + route_wait
+
+    cost[haversine_km(a_lat, a_lng, pickups[:, 0], pickups[:, 1]) > MAX_PICKUP_KM] = INFEASIBLE
+    return cost
+
+
+def solve_assignment(cost: np.ndarray) -> list[tuple[int, int]]:
+    """Min-total-ETA matching (Hungarian); rectangular matrices are fine."""
+    if cost.size == 0:
+        return []
+
+    rows, cols = linear_sum_assignment(cost)
+    feasible = cost[rows, cols] < INFEASIBLE
+    return list(zip(rows[feasible].tolist(), cols[feasible].tolist()))
+
+
+# ======================================================
+# 📥 INPUTS
+# ======================================================
+async def _ready_orders(db):
+    pharmacy = aliased(User)
+    has_delivery = exists().where(
+        Delivery.order_id == Order.id,
+        Delivery.status.in_(ACTIVE_STATES),
+    )
+
+    result = await db.execute(
+        select(
+            Order.id,
+            Order.user_id,
+            Order.pharmacy_id,
+            Order.updated_at,
+            pharmacy.last_latitude.label("p_lat"),
+            pharmacy.last_longitude.label("p_lng"),
+            OrderAddress.latitude.label("d_lat"),
+            OrderAddress.longitude.label("d_lng"),
+        )
+        .join(OrderAddress, OrderAddress.order_id == Order.id)
+        .join(pharmacy, pharmacy.id == Order.pharmacy_id)
+        .where(
+            Order.status == OrderStatus.READY_FOR_DELIVERY,
+            ~has_delivery,
+            pharmacy.last_latitude.isnot(None),
+            pharmacy.last_longitude.isnot(None),
+            OrderAddress.latitude.isnot(None),
+            OrderAddress.longitude.isnot(None),
+        )
+        .order_by(Order.updated_at)
+        .limit(MAX_ORDERS)
+    )
+    return result.all()
+
+
+async def _idle_agents(redis) -> list[tuple[int, float, float]]:
+    idle = await AgentAvailability.idle_agents(redis)
+    if not idle:
+        return []
+
+    positions = await DELIVERY_INDEX.positions(redis)
+    return [
+        (int(agent_id), lat, lng)
+        for agent_id, (lat, lng) in positions.items()
+        if agent_id in idle
+    ]
+
+
+# ======================================================
+# ✅ COMMIT (reserve riders, one DB transaction)
+# ======================================================
+async def _commit(db, redis, picks: list[dict]) -> list[dict]:
+    # one claim per rider, sized to the drops on their route
+    units = Counter(pick["agent_id"] for pick in picks)
+    async with redis.pipeline(transaction=False) as pipe:
+        for agent_id, count in units.items():
+            await AgentAvailability.claim(pipe, agent_id, units=count)
+        reserved = {agent_id for agent_id, ok in zip(units, await pipe.execute()) if ok}
+
+    picks = [pick for pick in picks if pick["agent_id"] in reserved]
+    if not picks:
+        return []
+
+    try:
+        rows = values(
+            column("order_id", Integer),
+            column("agent_id", Integer),
+            name="picks",
+        ).data([(p["order_id"], p["agent_id"]) for p in picks])
+
+        # guarded: a manual /assign may have taken the order meanwhile
+        won = set(
+            (
+                await db.execute(
+                    update(Order)
+                    .where(
+                        Order.id == rows.c.order_id,
+                        Order.status == OrderStatus.READY_FOR_DELIVERY,
+                    )
+                    .values(
+                        delivery_agent_id=rows.c.agent_id,
+                        status=OrderStatus.OUT_FOR_DELIVERY,
+                    )
+                    .returning(Order.id)
+                    .execution_options(synchronize_session=False)
+                )
+            ).scalars()
+        )
+
+        assigned = [p for p in picks if p["order_id"] in won]
+        if assigned:
+            now = datetime.now(timezone.utc)
+            await db.execute(
+                insert(Delivery),
+                [
+                    {
+                        "order_id": p["order_id"],
+                        "delivery_user_id": p["agent_id"],
+                        "status": DeliveryStatus.ASSIGNED,
+                        "assigned_at": now,
+                        "eta_minutes": p["eta_minutes"],
+                        "route_id": p["route_id"],
+                        "route_seq": p["route_seq"],
+                    }
+                    for p in assigned
+                ],
+            )
+        await db.commit()
+
+    except Exception:
+        await db.rollback()
+        assigned = []
+        raise
+
+    finally:
+        # one release per reserved drop that didn't stick
+        for pick in picks:
+            if pick not in assigned:
+                await AgentAvailability.release(redis, pick["agent_id"])
+
+    return assigned
+
+
+async def _announce(redis, assigned: list[dict]):
+    async with redis.pipeline(transaction=False) as pipe:
+        for p in assigned:
+            pipe.hset(
+                f"delivery:order:{p['order_id']}",
+                mapping={"agent_id": p["agent_id"], "status": "ASSIGNED"},
+            )
+            pipe.hset(f"delivery:agent:{p['agent_id']}:orders", p["order_id"], p["user_id"])
+        await pipe.execute()
+
+    for p in assigned:
+        await manager.send_delivery(
+            p["agent_id"],
+            {
+                "event": "DELIVERY_ASSIGNED",
+                "order_id": p["order_id"],
+                "eta_minutes": p["eta_minutes"],
+                "route_id": p["route_id"],
+                "route_seq": p["route_seq"],
+            },
+        )
+        await manager.send_user(
+            p["user_id"],
+            {
+                "event": "DELIVERY_ASSIGNED",
+                "order_id": p["order_id"],
+                "agent_id": p["agent_id"],
+                "eta_minutes": p["eta_minutes"],
+            },
+        )
+
+
+# ======================================================
+# 🔁 ONE CYCLE + LOOP
+# ======================================================
+async def dispatch_ready_orders(db, redis) -> list[dict]:
+    orders = await _ready_orders(db)
+    if not orders:
+        return []
+
+    agents = await _idle_agents(redis)
+    if not agents:
+        return []
+
+    # same-pharmacy orders with nearby drops → one routed job each
+    jobs = build_jobs(orders)
+    positions = np.array([(lat, lng) for _, lat, lng in agents], dtype=np.float64)
+    cost = build_route_cost_matrix(positions, jobs)
+
+    picks = []
+    for i, j in solve_assignment(cost):
+        job = jobs[j]
+        multi = len(job["orders"]) > 1
+        to_pickup = float(
+            estimate_eta_minutes(*positions[i], *job["pickup"])
+        ) + PICKUP_MINUTES
+
+        picks += [
+            {
+                "order_id": order.id,
+                "user_id": order.user_id,
+                "agent_id": agents[i][0],
+                "eta_minutes": max(1, round(to_pickup + float(offset))),
+                "route_id": job["route_id"] if multi else None,
+                "route_seq": seq if multi else None,
+            }
+            for seq, (order, offset) in enumerate(zip(job["orders"], job["offsets"]), start=1)
+        ]
+
+    assigned = await _commit(db, redis, picks)
+    if assigned:
+        await _announce(redis, assigned)
+    return assigned
+
+
+async def run_batch_dispatcher():
+    redis = await get_redis()
+
+    while True:
+        try:
+            # lock lives for one interval → exactly one process per cycle
+            if await redis.set(LOCK_KEY, 1, nx=True, px=BATCH_INTERVAL_SECONDS * 1000):
+                async with AsyncSessionLocal() as db:
+                    await dispatch_ready_orders(db, redis)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Batch dispatcher error: {e}")
+
+        await asyncio.sleep(BATCH_INTERVAL_SECONDS)
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import smtplib
+import socket
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from core.config import settings
+from core.redis import get_redis, redis_client
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+SMTP_HOST = settings.EMAIL_HOST
+SMTP_PORT = settings.EMAIL_PORT
+SMTP_USER = settings.EMAIL_USERNAME
+SMTP_PASSWORD = settings.EMAIL_PASSWORD
+
+# if EMAIL_FROM not in env, fallback to EMAIL_USERNAME
+FROM_EMAIL = settings.EMAIL_FROM or SMTP_USER
+
+STREAM_KEY = "email:outbox"
+CONSUMER_GROUP = "email-senders"
+RETRY_KEY = "email:outbox:retry"       # ZSET retry id → due_ts
+RETRY_DATA_KEY = "email:outbox:retry:data"   # HASH retry id → message json
+DEAD_KEY = "email:outbox:dead"
+
+CONNECTIONS = settings.EMAIL_SMTP_CONNECTIONS
+BATCH_SIZE = 20
+BLOCK_MS = 5000
+RECLAIM_IDLE_MS = 60_000
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2               # seconds → 2, 4, 8, 16, 32
+BACKOFF_MAX = 300
+
+SMTP_TIMEOUT = 15
+SMTP_IDLE_SECONDS = 60         # servers drop idle sessions; reconnect before they do
+DEAD_MAXLEN = 10_000
+
+# due retries → back onto the stream, in one step (nothing lost on a crash)
+_REQUEUE_DUE = redis_client.register_script("""
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(due) do
+    local raw = redis.call('HGET', KEYS[2], id)
+    if raw then
+        local args = {}
+        for k, v in pairs(cjson.decode(raw)) do
+            table.insert(args, k)
+            table.insert(args, tostring(v))
+        end
+        redis.call('XADD', KEYS[3], '*', unpack(args))
+    end
+end
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+    redis.call('HDEL', KEYS[2], unpack(due))
+end
+return #due
+""")
+
+
+# ======================================================
+# 📥 ENQUEUE (HTTP PATH – one XADD, no SMTP)
+# ======================================================
+async def enqueue_email(
+    to_email: str,
+    subject: str,
+    html_body: str,
+    attachment_path: str | None = None,
+):
+    await redis_client.xadd(
+        STREAM_KEY,
+        {
+            "to": to_email,
+            "subject": subject,
+            "html": html_body,
+            "attachment": attachment_path or "",
+            "attempts": 0,
+        },
+    )
+
+
+# ======================================================
+# 📨 MESSAGE + POOLED SMTP CONNECTION
+# ======================================================
+def build_message(fields: dict) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = FROM_EMAIL
+    msg["To"] = fields["to"]
+    msg["Subject"] = fields["subject"]
+
+    msg.attach(MIMEText(fields["html"], "html"))
+
+    # ✅ attachment support
+    if fields.get("attachment"):
+        file_path = Path(fields["attachment"])
+        if file_path.exists():
+            part = MIMEApplication(file_path.read_bytes(), Name=file_path.name)
+            part["Content-Disposition"] = f'attachment; filename="{file_path.name}"'
+            msg.attach(part)
+
+    return msg
+
+
+class SmtpConnection:
+    """One authenticated session, reused across messages (blocking – run in a thread)."""
+
+    def __init__(self):
+        self.smtp: smtplib.SMTP | None = None
+        self.used_at = 0.0
+
+    def _open(self):
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if settings.EMAIL_USE_TLS:
+            smtp.starttls()
+        if SMTP_USER and SMTP_PASSWORD:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        self.smtp = smtp
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+    def send(self, msg):
+        if self.smtp is None or time.monotonic() - self.used_at > SMTP_IDLE_SECONDS:
+            self.close()
+            self._open()
+
+        try:
+            self.smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # session died under us – one fresh connection, then give up
+            self.close()
+            self._open()
+            self.smtp.send_message(msg)
+
+        self.used_at = time.monotonic()
+
+
+# ======================================================
+# 🔁 RETRIES
+# ======================================================
+def _backoff(attempts: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE ** attempts)
+
+
+async def _fail(redis, msg_id: str, fields: dict, error: Exception, permanent: bool):
+    attempts = int(fields.get("attempts", 0)) + 1
+    fields = {**fields, "attempts": attempts, "error": str(error)[:200]}
+
+    if permanent or attempts >= MAX_ATTEMPTS:
+        await redis.xadd(DEAD_KEY, fields, maxlen=DEAD_MAXLEN, approximate=True)
+        print(f"Email to {fields['to']} dead-lettered: {error}")
+        return
+
+    # keyed by stream id – two identical emails stay two retries
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(RETRY_DATA_KEY, msg_id, json.dumps(fields))
+        pipe.zadd(RETRY_KEY, {msg_id: time.time() + _backoff(attempts)})
+        await pipe.execute()
+
+
+async def _requeue_due(redis):
+    await _REQUEUE_DUE(
+        keys=[RETRY_KEY, RETRY_DATA_KEY, STREAM_KEY],
+        args=[time.time(), BATCH_SIZE * CONNECTIONS],
+        client=redis,
+    )
+
+
+# ======================================================
+# 👷 WORKER (N senders, one SMTP session each)
+# ======================================================
+async def _deliver(redis, conn: SmtpConnection, messages):
+    for msg_id, fields in messages:
+        try:
+            await asyncio.to_thread(conn.send, build_message(fields))
+        except smtplib.SMTPRecipientsRefused as e:
+            await _fail(redis, msg_id, fields, e, permanent=True)
+        except Exception as e:
+            await asyncio.to_thread(conn.close)
+            await _fail(redis, msg_id, fields, e, permanent=False)
+
+    ids = [msg_id for msg_id, _ in messages]
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        await pipe.execute()
+
+
+async def _sender(redis, consumer: str):
+    conn = SmtpConnection()
+    try:
+        while True:
+            try:
+                # ♻️ messages left pending by a dead consumer
+                _, stale, _ = await redis.xautoclaim(
+                    STREAM_KEY,
+                    CONSUMER_GROUP,
+                    consumer,
+                    min_idle_time=RECLAIM_IDLE_MS,
+                    start_id="0-0",
+                    count=BATCH_SIZE,
+                )
+                if stale:
+                    await _deliver(redis, conn, stale)
+
+                response = await redis.xreadgroup(
+                    CONSUMER_GROUP,
+                    consumer,
+                    {STREAM_KEY: ">"},
+                    count=BATCH_SIZE,
+                    block=BLOCK_MS,
+                )
+                for _stream, messages in response or []:
+                    await _deliver(redis, conn, messages)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Email sender error: {e}")
+                await asyncio.sleep(1)
+    finally:
+        await asyncio.to_thread(conn.close)
+
+
+async def _retry_mover(redis):
+    while True:
+        try:
+            await _requeue_due(redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Email retry error: {e}")
+        await asyncio.sleep(1)
+
+
+async def _ensure_group(redis):
+    try:
+        await redis.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def run_email_worker(connections: int = CONNECTIONS):
+    redis = await get_redis()
+    await _ensure_group(redis)
+
+    base = f"{socket.gethostname()}-{os.getpid()}"
+    tasks = [asyncio.create_task(_sender(redis, f"{base}-{i}")) for i in range(connections)]
+    tasks.append(asyncio.create_task(_retry_mover(redis)))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,57 +1,17 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-from pathlib import Path
-
-from core.config import settings
-
-
-# ======================================================
-# 🔧 SMTP CONFIG (Updated based on your env names)
-# ======================================================
-SMTP_HOST = settings.EMAIL_HOST
-SMTP_PORT = settings.EMAIL_PORT
-SMTP_USER = settings.EMAIL_USERNAME
-SMTP_PASSWORD = settings.EMAIL_PASSWORD
-
-# if EMAIL_FROM not in env, fallback to EMAIL_USERNAME
-FROM_EMAIL = getattr(settings, "EMAIL_FROM", SMTP_USER)
+from services.email_outbox_service import enqueue_email
 
 
 # ======================================================
 # 🔹 BASE HTML EMAIL SENDER
+# queued on the outbox stream; the email worker does the SMTP
 # ======================================================
-def send_html_email(
+async def send_html_email(
     to_email: str,
     subject: str,
     html_body: str,
     attachment_path: str | None = None,
 ):
-    if not SMTP_USER or not SMTP_PASSWORD:
-        raise RuntimeError("Email credentials not loaded from .env")
-
-    msg = MIMEMultipart()
-    msg["From"] = FROM_EMAIL
-    msg["To"] = to_email
-    msg["Subject"] = subject
-
-    msg.attach(MIMEText(html_body, "html"))
-
-    # ✅ attachment support
-    if attachment_path:
-        file_path = Path(attachment_path)
-        if file_path.exists():
-            with open(file_path, "rb") as f:
-                part = MIMEApplication(f.read(), Name=file_path.name)
-            part["Content-Disposition"] = f'attachment; filename="{file_path.name}"'
-            msg.attach(part)
-
-    # ✅ SMTP send
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.send_message(msg)
+    await enqueue_email(to_email, subject, html_body, attachment_path)
 
 
 # ======================================================
@@ -120,16 +80,16 @@ def _otp_email_template(name: str, otp: str, purpose: str) -> str:
 # ======================================================
 # 🔐 AUTH OTP EMAIL
 # ======================================================
-def send_auth_otp_email(email: str, name: str, otp: str):
-    send_html_email(
+async def send_auth_otp_email(email: str, name: str, otp: str):
+    await send_html_email(
         to_email=email,
         subject="Email Verification OTP – Anand Pharma",
         html_body=_otp_email_template(name, otp, "email verification"),
     )
 
 
-def resend_auth_otp_email(email: str, name: str, otp: str):
-    send_html_email(
+async def resend_auth_otp_email(email: str, name: str, otp: str):
+    await send_html_email(
         to_email=email,
         subject="Resent OTP – Anand Pharma",
         html_body=_otp_email_template(name, otp, "email verification"),
@@ -139,16 +99,16 @@ def resend_auth_otp_email(email: str, name: str, otp: str):
 # ======================================================
 # 📲 DELIVERY OTP EMAIL
 # ======================================================
-def send_delivery_otp_email(email: str, name: str, otp: str):
-    send_html_email(
+async def send_delivery_otp_email(email: str, name: str, otp: str):
+    await send_html_email(
         to_email=email,
         subject="Delivery OTP – Anand Pharma",
         html_body=_otp_email_template(name, otp, "delivery confirmation"),
     )
 
 
-def resend_delivery_otp_email(email: str, name: str, otp: str):
-    send_html_email(
+async def resend_delivery_otp_email(email: str, name: str, otp: str):
+    await send_html_email(
         to_email=email,
         subject="Resent Delivery OTP – Anand Pharma",
         html_body=_otp_email_template(name, otp, "delivery confirmation"),
@@ -158,7 +118,7 @@ def resend_delivery_otp_email(email: str, name: str, otp: str):
 # ======================================================
 # 🚴 DELIVERY AGENT ASSIGNMENT EMAIL
 # ======================================================
-def send_delivery_assignment_email(email: str, order_id: int):
+async def send_delivery_assignment_email(email: str, order_id: int):
     html = f"""
     <html>
     <body style="font-family:Arial,Helvetica,sans-serif;background:#f4f6f8;padding:20px">
@@ -192,7 +152,7 @@ def send_delivery_assignment_email(email: str, order_id: int):
     </html>
     """
 
-    send_html_email(
+    await send_html_email(
         to_email=email,
         subject=f"New Delivery Assigned | Order #{order_id}",
         html_body=html,
@@ -202,7 +162,7 @@ def send_delivery_assignment_email(email: str, order_id: int):
 # ======================================================
 # 🧾 INVOICE EMAIL (POST DELIVERY)
 # ======================================================
-def send_invoice_email(email: str, order_id: int, invoice_path: str):
+async def send_invoice_email(email: str, order_id: int, invoice_path: str):
     html = f"""
     <html>
     <body style="font-family:Arial,Helvetica,sans-serif;background:#f4f6f8;padding:20px">
@@ -246,7 +206,7 @@ def send_invoice_email(email: str, order_id: int, invoice_path: str):
     </html>
     """
 
-    send_html_email(
+    await send_html_email(
         to_email=email,
         subject=f"Invoice & Delivery Confirmation | Order #{order_id}",
         html_body=html,
@@ -0,0 +1,187 @@
+import asyncio
+from itertools import groupby
+
+import numpy as np
+from sqlalchemy import Integer, column, select, update, values
+from sqlalchemy.orm import aliased
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from core.websocket_manager import manager
+from models.delivery import Delivery, DeliveryStatus
+from models.order import Order
+from models.order_address import OrderAddress
+from models.user import User
+from services.eta_service import estimate_eta_minutes
+from services.redis_geo_service import DELIVERY_INDEX
+from services.route_batching_service import DROP_MINUTES, PICKUP_MINUTES
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+REFRESH_SECONDS = settings.DELIVERY_ETA_REFRESH_SECONDS
+LOCK_KEY = "dispatch:eta:refresh:lock"    # one refresher per cycle cluster-wide
+PUSHED_KEY = "dispatch:eta:pushed"        # HASH delivery_id → ETA last sent to the customer
+
+PUSH_THRESHOLD_MINUTES = 2
+
+ACTIVE_STATES = [DeliveryStatus.ASSIGNED, DeliveryStatus.PICKED_UP]
+
+
+# ======================================================
+# 🧮 ETAS (pure numpy)
+# ======================================================
+def compute_etas(rows, positions: dict) -> dict[int, int]:
+    """
+    rows: active deliveries ordered by agent, then route_seq.
+    positions: agent_id (str) → (lat, lng).
+
+    Each rider's remaining path is: current position → pharmacy (while
+    anything is still ASSIGNED) → drops in route order. All legs are
+    priced in one vectorised call, then summed per rider.
+    """
+    starts, ends, waits, seg_lengths, targets = [], [], [], [], []
+
+    for agent_id, group in groupby(rows, key=lambda r: r.delivery_user_id):
+        here = positions.get(str(agent_id))
+        if here is None:
+            continue
+
+        group = list(group)
+        legs = 0
+        wait = 0.0
+
+        pending = next((r for r in group if r.status == DeliveryStatus.ASSIGNED), None)
+        if pending:
+            starts.append(here)
+            ends.append((pending.p_lat, pending.p_lng))
+            waits.append(0.0)
+            here, wait, legs = ends[-1], PICKUP_MINUTES, 1
+
+        for row in group:
+            starts.append(here)
+            ends.append((row.d_lat, row.d_lng))
+            waits.append(wait)
+            targets.append((row.id, len(ends) - 1))
+            here, wait, legs = ends[-1], DROP_MINUTES, legs + 1
+
+        seg_lengths.append(legs)
+
+    if not targets:
+        return {}
+
+    a = np.array(starts, dtype=np.float64)
+    b = np.array(ends, dtype=np.float64)
+    minutes = estimate_eta_minutes(a[:, 0], a[:, 1], b[:, 0], b[:, 1]) + np.array(waits)
+
+    # cumulative minutes, restarted at every rider's first leg
+    total = np.cumsum(minutes)
+    first = np.cumsum([0] + seg_lengths[:-1])
+    base = np.repeat(total[first] - minutes[first], seg_lengths)
+    arrival = total - base
+
+    return {delivery_id: max(1, round(float(arrival[i]))) for delivery_id, i in targets}
+
+
+# ======================================================
+# 🔁 ONE CYCLE + LOOP
+# ======================================================
+async def _active_deliveries(db):
+    pharmacy = aliased(User)
+    result = await db.execute(
+        select(
+            Delivery.id,
+            Delivery.order_id,
+            Delivery.delivery_user_id,
+            Delivery.status,
+            Delivery.eta_minutes,
+            Order.user_id,
+            pharmacy.last_latitude.label("p_lat"),
+            pharmacy.last_longitude.label("p_lng"),
+            OrderAddress.latitude.label("d_lat"),
+            OrderAddress.longitude.label("d_lng"),
+        )
+        .join(Order, Order.id == Delivery.order_id)
+        .join(OrderAddress, OrderAddress.order_id == Order.id)
+        .join(pharmacy, pharmacy.id == Order.pharmacy_id)
+        .where(
+            Delivery.status.in_(ACTIVE_STATES),
+            pharmacy.last_latitude.isnot(None),
+            pharmacy.last_longitude.isnot(None),
+            OrderAddress.latitude.isnot(None),
+            OrderAddress.longitude.isnot(None),
+        )
+        .order_by(Delivery.delivery_user_id, Delivery.route_seq.nulls_first(), Delivery.id)
+    )
+    return result.all()
+
+
+async def refresh_etas(db, redis) -> int:
+    rows = await _active_deliveries(db)
+    if not rows:
+        return 0
+
+    positions = await DELIVERY_INDEX.positions_of(redis, {r.delivery_user_id for r in rows})
+    etas = compute_etas(rows, positions)
+
+    changed = [r for r in rows if r.id in etas and etas[r.id] != r.eta_minutes]
+    if not changed:
+        return 0
+
+    fresh = values(
+        column("delivery_id", Integer),
+        column("eta", Integer),
+        name="fresh",
+    ).data([(r.id, etas[r.id]) for r in changed])
+
+    await db.execute(
+        update(Delivery)
+        .where(Delivery.id == fresh.c.delivery_id, Delivery.status.in_(ACTIVE_STATES))
+        .values(eta_minutes=fresh.c.eta)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    # small drift is persisted but not worth a push – measured against the
+    # ETA the customer last saw, so a slow 1-minute-per-cycle drift still
+    # gets pushed once it adds up
+    pushed = await redis.hmget(PUSHED_KEY, [r.id for r in changed])
+    sent = {}
+    for r, last in zip(changed, pushed):
+        if last is None or abs(etas[r.id] - int(last)) >= PUSH_THRESHOLD_MINUTES:
+            await manager.send_user(
+                r.user_id,
+                {"event": "ETA_UPDATED", "order_id": r.order_id, "eta_minutes": etas[r.id]},
+            )
+            sent[r.id] = etas[r.id]
+
+    # forget deliveries that are no longer active
+    active = {str(r.id) for r in rows}
+    stale = [d for d in await redis.hkeys(PUSHED_KEY) if d not in active]
+
+    async with redis.pipeline(transaction=False) as pipe:
+        if sent:
+            pipe.hset(PUSHED_KEY, mapping=sent)
+        if stale:
+            pipe.hdel(PUSHED_KEY, *stale)
+        await pipe.execute()
+
+    return len(changed)
+
+
+async def run_eta_refresher():
+    redis = await get_redis()
+
+    while True:
+        try:
+            if await redis.set(LOCK_KEY, 1, nx=True, px=REFRESH_SECONDS * 1000):
+                async with AsyncSessionLocal() as db:
+                    await refresh_etas(db, redis)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"ETA refresher error: {e}")
+
+        await asyncio.sleep(REFRESH_SECONDS)
@@ -0,0 +1,115 @@
+import math
+from datetime import datetime, timezone
+
+from redis.exceptions import NoScriptError
+
+from core.redis import load_scripts
+from core.websocket_manager import manager
+from services import agent_availability_service, redis_geo_service
+from services.agent_availability_service import AgentAvailability
+from services.redis_geo_service import RedisGeoService
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+HISTORY_KEY = "delivery:gps:history"   # RPUSH "agent,ts,lat,lng" → trip history worker
+OFFLINE_TTL = 30
+
+MIN_INTERVAL_SECONDS = 3     # keep at most one point per 3s …
+MIN_DISTANCE_METERS = 15     # … unless the rider actually moved
+MAX_POINT_AGE_SECONDS = 6 * 3600
+
+
+def _meters(lat1, lng1, lat2, lng2) -> float:
+    # equirectangular – plenty for points a few seconds apart
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6_371_000 * math.hypot(x, y)
+
+
+# ======================================================
+# ✂️ DOWNSAMPLE
+# ======================================================
+def downsample(points) -> list[tuple[float, float, float]]:
+    """
+    Sort a batch by timestamp and drop points that are both too close
+    in time and in space to the last kept one. The newest point is
+    always kept so the live position never lags.
+    """
+    now = datetime.now(timezone.utc).timestamp()
+    valid = sorted(
+        (ts, lat, lng)
+        for ts, lat, lng in points
+        if -90 <= lat <= 90
+        and -180 <= lng <= 180
+        and now - MAX_POINT_AGE_SECONDS <= ts <= now + 60
+    )
+    if not valid:
+        return []
+
+    kept = [valid[0]]
+    for point in valid[1:-1]:
+        ts, lat, lng = point
+        last_ts, last_lat, last_lng = kept[-1]
+        if (
+            ts - last_ts >= MIN_INTERVAL_SECONDS
+            or _meters(last_lat, last_lng, lat, lng) >= MIN_DISTANCE_METERS
+        ):
+            kept.append(point)
+
+    if len(valid) > 1:
+        kept.append(valid[-1])
+    return kept
+
+
+# ======================================================
+# 📥 INGEST (one MULTI round trip per batch)
+# the two scripts go in as plain EVALSHA – call load_ingest_scripts()
+# at startup so execute() needs no SCRIPT EXISTS check
+# ======================================================
+async def load_ingest_scripts(redis):
+    await load_scripts(
+        redis,
+        *redis_geo_service.PIPELINED_SCRIPTS,
+        *agent_availability_service.PIPELINED_SCRIPTS,
+    )
+
+
+async def ingest_points(redis, agent_id: int, points) -> dict:
+    kept = downsample(points)
+    if not kept:
+        return {"accepted": 0, "dropped": len(points)}
+
+    ts, lat, lng = kept[-1]
+    recorded_at = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+    agent_key = f"delivery:agent:{agent_id}"
+    online_key = f"delivery:agent:online:{agent_id}"
+
+    async with redis.pipeline(transaction=True) as pipe:
+        await RedisGeoService.update_agent_location(pipe, agent_id, lat, lng)
+        # presence only for riders already online – a ping never undoes go-offline
+        await AgentAvailability.touch_online(pipe, agent_id, online_key, agent_key, OFFLINE_TTL)
+        pipe.hset(agent_key, mapping={"lat": lat, "lng": lng, "updated_at": recorded_at})
+        pipe.rpush(HISTORY_KEY, *(f"{agent_id},{p[0]},{p[1]},{p[2]}" for p in kept))
+        pipe.hgetall(f"delivery:agent:{agent_id}:orders")
+        results = await pipe.execute(raise_on_error=False)
+
+    # script cache flushed (Redis restart) – the rest of the MULTI still ran,
+    # so reload and redo only the two script writes
+    if any(isinstance(r, NoScriptError) for r in results[:2]):
+        await load_ingest_scripts(redis)
+        await RedisGeoService.update_agent_location(redis, agent_id, lat, lng)
+        await AgentAvailability.touch_online(redis, agent_id, online_key, agent_key, OFFLINE_TTL)
+    for r in results:
+        if isinstance(r, Exception) and not isinstance(r, NoScriptError):
+            raise r
+    riding = results[-1]
+
+    # 📡 rider echo + customers with an active delivery by this agent
+    location_event = {"type": "AGENT_LOCATION", "agent_id": agent_id, "lat": lat, "lng": lng}
+    await manager.send_delivery(agent_id, location_event)
+    for order_id, user_id in riding.items():
+        await manager.send_user(int(user_id), {**location_event, "order_id": int(order_id)})
+
+    return {"accepted": len(kept), "dropped": len(points) - len(kept), "lat": lat, "lng": lng}
@@ -0,0 +1,285 @@
+import asyncio
+import csv
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import exists, func, select, union_all
+
+from core.database import AsyncSessionLocal
+from models.delivery import Delivery
+from models.order import Order, OrderStatus
+from models.order_item import OrderItem
+from services.invoice_service import IST, content_hash, invoice_file, render_invoice
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+FETCH_ROWS = 10_000            # server-side cursor batch
+PROGRESS_EVERY = 25_000        # orders
+XLSX_MAX_ROWS = 1_048_576      # Excel sheet limit → roll over to a new sheet
+INFLIGHT_PER_PROCESS = 4       # bounded PDF queue keeps memory flat
+
+SALE_STATES = [OrderStatus.DELIVERED]   # invoiced on OTP delivery, same as the live engine
+
+COLUMNS = [
+    "invoice_no", "order_id", "order_number", "order_date", "invoice_date",
+    "pharmacy_id", "customer_id", "status", "payment_method",
+    "product", "quantity", "price", "line_total",
+    "order_subtotal", "order_cgst", "order_sgst",
+    "handling_fee", "delivery_fee", "surge_fee", "order_total",
+]
+
+
+def _day_bounds(start: date, end: date) -> tuple[datetime, datetime]:
+    """[start 00:00 IST, end+1 00:00 IST) – end date is inclusive."""
+    lo = IST.localize(datetime.combine(start, datetime.min.time()))
+    hi = IST.localize(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return lo, hi
+
+
+def _register_query(lo: datetime, hi: datetime):
+    # same date the invoice prints: latest delivery, else order creation.
+    # Both halves are range scans on an index, never a per-order lookup.
+    delivered = (
+        select(
+            Delivery.order_id.label("order_id"),
+            func.max(Delivery.delivered_at).label("issued_at"),
+        )
+        .where(Delivery.delivered_at >= lo)
+        .group_by(Delivery.order_id)
+        .having(func.max(Delivery.delivered_at) < hi)
+    )
+    never_delivered = (
+        select(Order.id.label("order_id"), Order.created_at.label("issued_at"))
+        .where(
+            Order.created_at >= lo,
+            Order.created_at < hi,
+            ~exists().where(
+                Delivery.order_id == Order.id,
+                Delivery.delivered_at.isnot(None),
+            ),
+        )
+    )
+    issued = union_all(delivered, never_delivered).subquery("issued")
+
+    # ordered by order → each order's lines arrive together
+    return (
+        select(
+            Order.id,
+            Order.order_number,
+            Order.created_at,
+            issued.c.issued_at,
+            Order.pharmacy_id,
+            Order.user_id,
+            Order.status,
+            Order.payment_method,
+            Order.subtotal,
+            Order.cgst,
+            Order.sgst,
+            Order.handling_fee,
+            Order.delivery_fee,
+            Order.surge_fee,
+            Order.total,
+            OrderItem.product_name,
+            OrderItem.quantity,
+            OrderItem.price,
+        )
+        .select_from(issued)
+        .join(Order, Order.id == issued.c.order_id)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.status.in_(SALE_STATES))
+        .order_by(Order.id, OrderItem.id)
+        .execution_options(yield_per=FETCH_ROWS)
+    )
+
+
+def _register_row(r) -> list:
+    issued = r.issued_at
+    return [
+        f"INV-{r.id}", r.id, r.order_number,
+        r.created_at.astimezone(IST).date().isoformat() if r.created_at else "",
+        issued.astimezone(IST).date().isoformat() if issued else "",
+        r.pharmacy_id, r.user_id, r.status.value, r.payment_method or "",
+        r.product_name or "", r.quantity, f"{r.price:.2f}", f"{r.price * r.quantity:.2f}",
+        f"{r.subtotal or 0:.2f}", f"{r.cgst or 0:.2f}", f"{r.sgst or 0:.2f}",
+        f"{r.handling_fee or 0:.2f}", f"{r.delivery_fee or 0:.2f}", f"{r.surge_fee or 0:.2f}",
+        f"{r.total or 0:.2f}",
+    ]
+
+
+# ======================================================
+# 📒 XLSX (write-only workbook → rows are not kept in memory)
+# ======================================================
+class _XlsxRegister:
+    def __init__(self, path: Path):
+        try:
+            from openpyxl import Workbook
+        except ImportError as e:
+            raise RuntimeError("XLSX export needs openpyxl (pip install openpyxl)") from e
+
+        self.path = path
+        self.book = Workbook(write_only=True)
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        self.sheet = self.book.create_sheet(f"register_{self.sheets}")
+        self.sheet.append(COLUMNS)
+        self.rows = 1
+
+    def append(self, row: list):
+        if self.rows >= XLSX_MAX_ROWS:
+            self._new_sheet()
+        self.sheet.append(row)
+        self.rows += 1
+
+    def close(self):
+        self.book.save(self.path)
+
+
+# ======================================================
+# 🗜️ PDF ZIP (parallel render, bounded in-flight)
+# ======================================================
+class _PdfZip:
+    def __init__(self, path: Path, processes: int):
+        self.zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+        self.pool = ProcessPoolExecutor(max_workers=processes)
+        self.limit = processes * INFLIGHT_PER_PROCESS
+        self.pending: set[asyncio.Future] = set()
+        self.rendered = 0
+        self.reused = 0
+
+    def _add(self, order_id: int, path: Path):
+        # PDFs are already compressed → stored, not deflated
+        self.zip.write(path, arcname=f"invoice_order_{order_id}.pdf")
+
+    async def _drain(self, until: int):
+        while len(self.pending) > until:
+            done, self.pending = await asyncio.wait(self.pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                order_id, path = fut.result()
+                self._add(order_id, path)
+
+    async def submit(self, payload: dict):
+        path = invoice_file(content_hash(payload))
+
+        # same content hash as the live invoice engine → reuse its files
+        if path.exists():
+            self.reused += 1
+            self._add(payload["order_id"], path)
+            return
+
+        await self._drain(self.limit - 1)
+
+        loop = asyncio.get_running_loop()
+        order_id = payload["order_id"]
+        fut = loop.run_in_executor(self.pool, render_invoice, payload, str(path))
+        self.pending.add(asyncio.ensure_future(_tagged(fut, order_id, path)))
+        self.rendered += 1
+
+    async def close(self):
+        try:
+            await self._drain(0)
+        finally:
+            self.pool.shutdown()
+            self.zip.close()
+
+
+async def _tagged(fut, order_id: int, path: Path):
+    await fut
+    return order_id, path
+
+
+# ======================================================
+# 🚀 EXPORT
+# ======================================================
+async def export_gst_register(
+    start: date,
+    end: date,
+    out_dir: str,
+    xlsx: bool = False,
+    pdfs: bool = False,
+    processes: int = 4,
+    progress=print,
+) -> dict:
+    """
+    Stream every sale line invoiced between `start` and `end` (IST, inclusive)
+    into gst_register_<start>_<end>.csv, and optionally .xlsx and a zip
+    of invoice PDFs. Memory stays flat regardless of the range.
+    """
+    started = time.perf_counter()
+    lo, hi = _day_bounds(start, end)
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    stem = f"gst_register_{start.isoformat()}_{end.isoformat()}"
+
+    files = {"csv": str(out / f"{stem}.csv")}
+    book = _XlsxRegister(out / f"{stem}.xlsx") if xlsx else None
+    archive = _PdfZip(out / f"{stem}_invoices.zip", processes) if pdfs else None
+    if book:
+        files["xlsx"] = str(book.path)
+    if archive:
+        files["zip"] = str(out / f"{stem}_invoices.zip")
+
+    orders = lines = 0
+    current = None          # (row, items) of the order being assembled for the PDF zip
+
+    async def _flush_order():
+        if archive and current:
+            head, items = current
+            await archive.submit({
+                "order_id": head.id,
+                "user_id": head.user_id,
+                "date": head.issued_at.astimezone(IST).strftime("%d-%m-%Y"),
+                "items": items,
+            })
+
+    try:
+        with open(files["csv"], "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(COLUMNS)
+
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(_register_query(lo, hi))
+
+                async for batch in result.partitions():
+                    rows = [_register_row(r) for r in batch]
+                    writer.writerows(rows)
+                    if book:
+                        for row in rows:
+                            book.append(row)
+
+                    for r in batch:
+                        if current is None or current[0].id != r.id:
+                            await _flush_order()
+                            current = (r, [])
+                            orders += 1
+                            if orders % PROGRESS_EVERY == 0 and progress:
+                                rate = orders / (time.perf_counter() - started)
+                                progress(f"… {orders:,} orders, {lines:,} lines ({rate:,.0f} orders/s)")
+                        current[1].append([r.product_name, r.quantity, r.price])
+                        lines += 1
+
+            await _flush_order()
+
+    finally:
+        if book:
+            book.close()
+        if archive:
+            await archive.close()
+
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "orders": orders,
+        "lines": lines,
+        "pdfs_rendered": archive.rendered if archive else 0,
+        "pdfs_reused": archive.reused if archive else 0,
+        "files": files,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
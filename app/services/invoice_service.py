@@ -1,15 +1,87 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytz
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from datetime import datetime
-from pathlib import Path
+from sqlalchemy import select
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from models.delivery import Delivery
+from models.order import Order
+from models.order_item import OrderItem
+from models.user import User
+from services.email_service import send_invoice_email
 
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
 INVOICE_DIR = "invoices"
 Path(INVOICE_DIR).mkdir(exist_ok=True)
 
+TEMPLATE_VERSION = 2         # bump when the layout changes → every hash changes
+
+IST = pytz.timezone("Asia/Kolkata")   # printed dates are Indian calendar days
+
+STREAM_KEY = "invoices:jobs"
+CONSUMER_GROUP = "invoice-workers"
+JOB_TTL = 24 * 3600
+
+BATCH_SIZE = 16
+BLOCK_MS = 5000
+RECLAIM_IDLE_MS = 120_000
+
+QUEUED, RENDERING, READY, FAILED = "QUEUED", "RENDERING", "READY", "FAILED"
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def job_key(order_id: int) -> str:
+    return f"invoice:job:{order_id}"
+
+
+# ======================================================
+# 🧾 PAYLOAD + CONTENT HASH
+# ======================================================
+def invoice_payload(order, items, issued_at: datetime | None) -> dict:
+    """Plain, picklable snapshot of everything printed on the invoice."""
+    return {
+        "order_id": order.id,
+        "user_id": order.user_id,
+        "date": (issued_at or datetime.now(timezone.utc)).astimezone(IST).strftime("%d-%m-%Y"),
+        "items": [[item.product_name, item.quantity, item.price] for item in items],
+    }
+
+
+def content_hash(payload: dict) -> str:
+    canonical = json.dumps(
+        {"template": TEMPLATE_VERSION, **payload},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
 
-def generate_gst_invoice(order, items):
-    file_path = f"{INVOICE_DIR}/invoice_order_{order.id}.pdf"
-    c = canvas.Canvas(file_path, pagesize=A4)
+
+def invoice_file(digest: str) -> Path:
+    return Path(INVOICE_DIR) / digest[:2] / f"{digest}.pdf"
+
+
+# ======================================================
+# 🖨️ RENDER (CPU-bound – runs in a worker process)
+# ======================================================
+def render_invoice(payload: dict, file_path: str) -> str:
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+
+    c = canvas.Canvas(tmp_path, pagesize=A4)
     width, height = A4
 
     y = height - 50
@@ -24,11 +96,11 @@ def generate_gst_invoice(order, items):
 
     # 🧾 Invoice info
     c.setFont("Helvetica", 10)
-    c.drawString(50, y, f"Invoice No: INV-{order.id}")
-    c.drawString(350, y, f"Date: {datetime.now().strftime('%d-%m-%Y')}")
+    c.drawString(50, y, f"Invoice No: INV-{payload['order_id']}")
+    c.drawString(350, y, f"Date: {payload['date']}")
     y -= 20
 
-    c.drawString(50, y, f"Customer ID: {order.user_id}")
+    c.drawString(50, y, f"Customer ID: {payload['user_id']}")
     y -= 30
 
     # 🧾 Table Header
@@ -45,13 +117,13 @@ def generate_gst_invoice(order, items):
     c.setFont("Helvetica", 10)
     subtotal = 0
 
-    for item in items:
-        line_total = item.price * item.quantity
+    for product_name, quantity, price in payload["items"]:
+        line_total = price * quantity
         subtotal += line_total
 
-        c.drawString(50, y, item.product_name)
-        c.drawString(260, y, str(item.quantity))
-        c.drawString(300, y, f"{item.price:.2f}")
+        c.drawString(50, y, product_name or "")
+        c.drawString(260, y, str(quantity))
+        c.drawString(300, y, f"{price:.2f}")
         c.drawString(360, y, f"{line_total:.2f}")
         y -= 20
 
@@ -90,4 +162,180 @@ def generate_gst_invoice(order, items):
     c.drawString(50, y, "This is a computer generated invoice.")
 
     c.save()
+
+    # readers never see a half-written PDF
+    os.replace(tmp_path, file_path)
     return file_path
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.INVOICE_RENDER_PROCESSES)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def render(payload: dict) -> tuple[str, str]:
+    """(hash, path). Identical content is rendered once and then reused."""
+    digest = content_hash(payload)
+    path = invoice_file(digest)
+
+    if not path.exists():
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_pool(), render_invoice, payload, str(path))
+
+    return digest, str(path)
+
+
+# ======================================================
+# 📄 ORDER → INVOICE (skips unchanged orders)
+# ======================================================
+async def build_invoice(db, order_id: int) -> Order | None:
+    order = await db.get(Order, order_id)
+    if not order:
+        return None
+
+    items = (
+        await db.execute(
+            select(OrderItem).where(OrderItem.order_id == order_id).order_by(OrderItem.id)
+        )
+    ).scalars().all()
+
+    delivered_at = (
+        await db.execute(
+            select(Delivery.delivered_at)
+            .where(Delivery.order_id == order_id, Delivery.delivered_at.isnot(None))
+            .order_by(Delivery.delivered_at.desc())
+            .limit(1)
+        )
+    ).scalar_one_or_none()
+
+    payload = invoice_payload(order, items, delivered_at or order.created_at)
+    digest = content_hash(payload)
+
+    if order.invoice_hash == digest and order.invoice_path and Path(order.invoice_path).exists():
+        return order
+
+    order.invoice_hash, order.invoice_path = await render(payload)
+    await db.commit()
+    return order
+
+
+# ======================================================
+# 📥 JOBS (HTTP PATH – no rendering)
+# ======================================================
+async def enqueue_invoice(redis, order_id: int, email: bool = True):
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            job_key(order_id),
+            mapping={"status": QUEUED, "updated_at": datetime.now(timezone.utc).isoformat()},
+        )
+        pipe.expire(job_key(order_id), JOB_TTL)
+        pipe.xadd(STREAM_KEY, {"order_id": order_id, "email": int(email)})
+        await pipe.execute()
+
+
+async def invoice_status(redis, order_id: int) -> dict | None:
+    job = await redis.hgetall(job_key(order_id))
+    return job or None
+
+
+async def _set_status(redis, order_id: int, status: str, **fields):
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(
+            job_key(order_id),
+            mapping={"status": status, "updated_at": datetime.now(timezone.utc).isoformat(), **fields},
+        )
+        pipe.expire(job_key(order_id), JOB_TTL)
+        await pipe.execute()
+
+
+# ======================================================
+# 👷 WORKER
+# ======================================================
+async def _process(redis, order_id: int, email: bool):
+    await _set_status(redis, order_id, RENDERING)
+    try:
+        async with AsyncSessionLocal() as db:
+            order = await build_invoice(db, order_id)
+            if not order:
+                await _set_status(redis, order_id, FAILED, error="Order not found")
+                return
+
+            customer = await db.get(User, order.user_id)
+
+        await _set_status(redis, order_id, READY, hash=order.invoice_hash)
+
+        if email and customer and customer.email:
+            await send_invoice_email(customer.email, order_id, order.invoice_path)
+
+    except Exception as e:
+        await _set_status(redis, order_id, FAILED, error=str(e)[:200])
+        print(f"Invoice job {order_id} failed: {e}")
+
+
+async def _ensure_group(redis):
+    try:
+        await redis.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _handle(redis, messages):
+    if not messages:
+        return
+
+    # renders overlap in the process pool; the event loop only awaits
+    await asyncio.gather(*(
+        _process(redis, int(fields["order_id"]), fields.get("email") == "1")
+        for _, fields in messages
+    ))
+
+    ids = [msg_id for msg_id, _ in messages]
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        await pipe.execute()
+
+
+async def run_invoice_worker(consumer: str | None = None):
+    redis = await get_redis()
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    await _ensure_group(redis)
+
+    while True:
+        try:
+            # ♻️ jobs left pending by a dead consumer
+            _, stale, _ = await redis.xautoclaim(
+                STREAM_KEY,
+                CONSUMER_GROUP,
+                consumer,
+                min_idle_time=RECLAIM_IDLE_MS,
+                start_id="0-0",
+                count=BATCH_SIZE,
+            )
+            await _handle(redis, stale)
+
+            response = await redis.xreadgroup(
+                CONSUMER_GROUP,
+                consumer,
+                {STREAM_KEY: ">"},
+                count=BATCH_SIZE,
+                block=BLOCK_MS,
+            )
+            for _stream, messages in response or []:
+                await _handle(redis, messages)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Invoice worker error: {e}")
+            await asyncio.sleep(1)
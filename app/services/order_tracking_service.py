@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from core.database import AsyncSessionLocal
+from models.delivery import Delivery
+from models.order import Order
+from models.order_address import OrderAddress
+from services.map_services import get_route_polyline
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+SNAPSHOT_TTL = 2              # seconds – everyone watching an order shares one build
+POLYLINE_TTL = 60             # Google directions at most once a minute per order
+MAX_CACHED = 10_000
+
+# order_id → (expires_at, snapshot)
+_cache: dict[int, tuple[float, dict | None]] = {}
+# order_id → build in progress (single-flight)
+_inflight: dict[int, asyncio.Task] = {}
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+# ======================================================
+# 🧱 BUILD (1 SQL query + 1 Redis pipeline)
+# ======================================================
+async def _load_order(order_id: int):
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(
+                Order.id,
+                Order.user_id,
+                Order.status,
+                Order.delivery_agent_id,
+                Order.created_at,
+                Order.updated_at,
+                Delivery.status.label("delivery_status"),
+                Delivery.delivery_user_id,
+                Delivery.eta_minutes,
+                Delivery.route_seq,
+                Delivery.assigned_at,
+                Delivery.picked_at,
+                Delivery.delivered_at,
+                OrderAddress.latitude,
+                OrderAddress.longitude,
+            )
+            .outerjoin(Delivery, Delivery.order_id == Order.id)
+            .outerjoin(OrderAddress, OrderAddress.order_id == Order.id)
+            .where(Order.id == order_id)
+            # a cancelled delivery may have been reassigned – newest wins
+            .order_by(Delivery.id.desc().nulls_last())
+            .limit(1)
+        )
+        return result.first()
+
+
+async def _build(redis, order_id: int) -> dict | None:
+    row = await _load_order(order_id)
+    if not row:
+        return None
+
+    agent_id = row.delivery_user_id or row.delivery_agent_id
+    polyline_key = f"tracking:order:{order_id}:polyline"
+
+    agent = None
+    polyline = None
+    live_status = None
+
+    if agent_id:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(f"delivery:agent:{agent_id}")
+            pipe.exists(f"delivery:agent:online:{agent_id}")
+            pipe.hget(f"delivery:order:{order_id}", "status")
+            pipe.get(polyline_key)
+            position, online, live_status, polyline = await pipe.execute()
+
+        if position.get("lat") and position.get("lng"):
+            agent = {
+                "id": agent_id,
+                "lat": float(position["lat"]),
+                "lng": float(position["lng"]),
+                "updated_at": position.get("updated_at"),
+                "online": bool(online),
+            }
+
+        if agent and not polyline and row.latitude is not None:
+            polyline = await asyncio.to_thread(
+                get_route_polyline,
+                f"{agent['lat']},{agent['lng']}",
+                f"{row.latitude},{row.longitude}",
+            )
+            await redis.setex(polyline_key, POLYLINE_TTL, polyline)
+
+    return {
+        "user_id": row.user_id,
+        "order_id": row.id,
+        "status": row.status.value if row.status else None,
+        "delivery_status": live_status or (row.delivery_status.value if row.delivery_status else None),
+        "agent": agent,
+        "eta_minutes": row.eta_minutes,
+        "route_seq": row.route_seq,
+        "destination": (
+            {"lat": row.latitude, "lng": row.longitude} if row.latitude is not None else None
+        ),
+        "polyline": polyline,
+        "timestamps": {
+            "created_at": _iso(row.created_at),
+            "updated_at": _iso(row.updated_at),
+            "assigned_at": _iso(row.assigned_at),
+            "picked_at": _iso(row.picked_at),
+            "delivered_at": _iso(row.delivered_at),
+        },
+    }
+
+
+# ======================================================
+# ⚡ MICRO-CACHE + SINGLE-FLIGHT
+# ======================================================
+def _prune(now: float):
+    if len(_cache) < MAX_CACHED:
+        return
+    for order_id in [k for k, (expires, _) in _cache.items() if expires <= now]:
+        del _cache[order_id]
+
+
+async def get_order_snapshot(redis, order_id: int) -> dict | None:
+    """
+    Status, rider position, ETA, polyline and timestamps for one order.
+    Concurrent callers for the same order await a single build, and the
+    result is reused for SNAPSHOT_TTL seconds.
+    """
+    now = time.monotonic()
+    cached = _cache.get(order_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    task = _inflight.get(order_id)
+    if task is None:
+        # detached task: a caller disconnecting doesn't cancel the others
+        task = asyncio.create_task(_build(redis, order_id))
+        _inflight[order_id] = task
+
+        def _done(t: asyncio.Task):
+            _inflight.pop(order_id, None)
+            if not t.cancelled() and t.exception() is None:
+                _prune(time.monotonic())
+                _cache[order_id] = (time.monotonic() + SNAPSHOT_TTL, t.result())
+
+        task.add_done_callback(_done)
+
+    return await asyncio.shield(task)
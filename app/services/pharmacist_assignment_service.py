@@ -1,5 +1,10 @@
+import asyncio
+import time
+from datetime import datetime
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, literal, update, exists
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import selectinload
 
 from models.user import User
@@ -8,6 +13,181 @@ from models.pharmacist_order import PharmacistOrder
 from core.websocket_manager import manager
 from services.redis_geo_service import RedisGeoService
 from core.redis import get_redis
+from core.config import settings
+from core.database import AsyncSessionLocal
+
+NOTIFY_TIMEOUT = 2  # seconds per WebSocket send
+
+# ======================================================
+# 📡 TIERED DISPATCH CONFIG
+# ring 1 first; expand radius + offer count if nobody accepts
+# ======================================================
+DISPATCH_RINGS = [
+    {"radius_km": 3, "count": 3},
+    {"radius_km": 5, "count": 6},
+    {"radius_km": 10, "count": 12},
+    {"radius_km": 25, "count": 25},
+]
+RING_WAIT_SECONDS = settings.DISPATCH_RING_WAIT_SECONDS
+
+DEADLINES_KEY = "dispatch:pharmacist:deadlines"      # ZSET order_id -> expand-at
+STATE_KEY = "dispatch:pharmacist:order:{order_id}"   # HASH lat / lng / ring
+STATE_TTL = 3600
+RETRY_SECONDS = 10          # assignment that crashed → scheduler tries again
+
+TICK_SECONDS = 1
+POP_BATCH = 100
+
+# pop every due order atomically so only one worker expands it
+_POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+async def create_offers(
+    db: AsyncSession,
+    order_id: int,
+    pharmacist_ids: list | None = None,
+) -> list[int]:
+    """
+    Insert PENDING offers in one statement and return only the
+    pharmacists that did not already have one.
+    pharmacist_ids=None offers the order to every active pharmacist.
+    """
+    now = datetime.utcnow()
+
+    if pharmacist_ids is None:
+        stmt = insert(PharmacistOrder).from_select(
+            ["order_id", "pharmacist_id", "status", "created_at"],
+            select(
+                literal(order_id),
+                User.id,
+                literal("PENDING"),
+                literal(now),
+            ).where(
+                User.role == "pharmacist",
+                User.is_active == True
+            ),
+        )
+    elif pharmacist_ids:
+        stmt = insert(PharmacistOrder).values([
+            {
+                "order_id": order_id,
+                "pharmacist_id": int(pid),
+                "status": "PENDING",
+                "created_at": now,
+            }
+            for pid in pharmacist_ids
+        ])
+    else:
+        return []
+
+    result = await db.execute(
+        stmt
+        .on_conflict_do_nothing(index_elements=["order_id", "pharmacist_id"])
+        .returning(PharmacistOrder.pharmacist_id)
+    )
+    return list(result.scalars())
+
+
+async def notify_pharmacists(pharmacist_ids: list[int], message: dict):
+    # 🔔 fan out concurrently – one slow socket can't hold up the rest
+    await asyncio.gather(
+        *(
+            asyncio.wait_for(manager.send_pharmacist(pid, message), NOTIFY_TIMEOUT)
+            for pid in pharmacist_ids
+        ),
+        return_exceptions=True,
+    )
+
+
+# ======================================================
+# 📡 RING OFFERS
+# ======================================================
+def _new_order_message(order_id: int) -> dict:
+    return {
+        "event": "NEW_ORDER",
+        "order_id": order_id,
+        "status": "WAITING_PHARMACIST"
+    }
+
+
+async def _offer_from_ring(db, redis, order_id: int, lat, lng, ring: int) -> int:
+    """
+    Walk outwards from `ring` until someone new gets the offer.
+    Schedules the next expansion, or broadcasts once rings run out.
+    """
+    state_key = STATE_KEY.format(order_id=order_id)
+
+    while ring < len(DISPATCH_RINGS):
+        tier = DISPATCH_RINGS[ring]
+        pharmacist_ids = await RedisGeoService.find_nearest_pharmacists(
+            redis,
+            latitude=lat,
+            longitude=lng,
+            radius_km=tier["radius_km"],
+            count=tier["count"],
+        )
+
+        offered = await create_offers(db, order_id, pharmacist_ids)
+        await db.commit()
+
+        if offered:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(state_key, mapping={"lat": lat, "lng": lng, "ring": ring})
+                pipe.expire(state_key, STATE_TTL)
+                pipe.zadd(DEADLINES_KEY, {str(order_id): time.time() + RING_WAIT_SECONDS})
+                await pipe.execute()
+
+            await notify_pharmacists(offered, _new_order_message(order_id))
+            return ring
+
+        ring += 1
+
+    # 🔥 FALLBACK — rings exhausted → every active pharmacist
+    await redis.delete(state_key)
+    offered = await create_offers(db, order_id)
+    await db.commit()
+    await notify_pharmacists(offered, _new_order_message(order_id))
+    return ring
+
+
+async def cancel_dispatch(redis, order_id: int):
+    # ✅ someone accepted – stop expanding
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(DEADLINES_KEY, str(order_id))
+        pipe.delete(STATE_KEY.format(order_id=order_id))
+        await pipe.execute()
+
+
+async def expedite_dispatch(redis, order_id: int):
+    # ⏩ expand on the next tick (only if still scheduled)
+    await redis.zadd(DEADLINES_KEY, {str(order_id): 0}, xx=True)
+
+
+async def retry_assignment(redis, order_id: int, delay: int = RETRY_SECONDS):
+    """Hand a failed first assignment to the scheduler (state retry=1)."""
+    state_key = STATE_KEY.format(order_id=order_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(state_key, mapping={"retry": 1})
+        pipe.expire(state_key, STATE_TTL)
+        pipe.zadd(DEADLINES_KEY, {str(order_id): time.time() + delay})
+        await pipe.execute()
+
+
+async def assign_or_retry(db: AsyncSession, redis, order_id: int):
+    """assign_nearest_pharmacists that never loses the order on error."""
+    try:
+        await assign_nearest_pharmacists(db, order_id)
+    except Exception as e:
+        print(f"Pharmacist assignment for order {order_id} failed, retrying: {e}")
+        await db.rollback()
+        await retry_assignment(redis, order_id)
+
 
 async def assign_nearest_pharmacists(db: AsyncSession, order_id: int):
     result = await db.execute(
@@ -20,77 +200,165 @@ async def assign_nearest_pharmacists(db: AsyncSession, order_id: int):
     if not order:
         return
 
-    pharmacist_ids = []
+    redis = await get_redis()
 
-    # 1️⃣ Try GEO-based matching (BEST)
+    # 1️⃣ GEO-based tiered offers (BEST)
     if order.address and order.address.latitude and order.address.longitude:
-        redis = await get_redis()
-        pharmacist_ids = await RedisGeoService.find_nearest_pharmacists(
+        await _offer_from_ring(
+            db,
             redis,
-            latitude=order.address.latitude,
-            longitude=order.address.longitude
+            order_id,
+            order.address.latitude,
+            order.address.longitude,
+            ring=0,
         )
+        return
 
-    # 2️⃣ 🔥 FALLBACK — ALWAYS ASSIGN
-    if not pharmacist_ids:
-        result = await db.execute(
-            select(User.id)
+    # 2️⃣ 🔥 FALLBACK — no coordinates → every active pharmacist
+    offered = await create_offers(db, order_id)
+    await db.commit()
+
+    # 3️⃣ Notify only the newly offered pharmacists, after commit
+    await notify_pharmacists(offered, _new_order_message(order_id))
+
+
+# ======================================================
+# 🏁 FIRST-ACCEPT-WINS CLAIM
+# ======================================================
+async def claim_order(db: AsyncSession, order_id: int, pharmacist_id: int) -> list[int] | None:
+    """
+    Atomically claim an order for a pharmacist.
+
+    A single conditional UPDATE decides the winner: concurrent callers
+    block on the row lock and re-check `status`, so exactly one wins.
+    Returns the losing pharmacist ids (already committed as REJECTED),
+    or None if this pharmacist did not win.
+    """
+    claimed = (
+        await db.execute(
+            update(Order)
             .where(
-                User.role == "pharmacist",
-                User.is_active == True
+                Order.id == order_id,
+                Order.status == OrderStatus.WAITING_PHARMACIST,
+                exists().where(
+                    PharmacistOrder.order_id == order_id,
+                    PharmacistOrder.pharmacist_id == pharmacist_id,
+                    PharmacistOrder.status == "PENDING",
+                ),
             )
+            .values(status=OrderStatus.ACCEPTED, pharmacy_id=pharmacist_id)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        )
+    ).scalar_one_or_none()
+
+    if claimed is None:
+        await db.rollback()
+        return None
+
+    await db.execute(
+        update(PharmacistOrder)
+        .where(
+            PharmacistOrder.order_id == order_id,
+            PharmacistOrder.pharmacist_id == pharmacist_id,
         )
-        pharmacist_ids = [row[0] for row in result.all()]
+        .values(status="ACCEPTED")
+        .execution_options(synchronize_session=False)
+    )
 
-    # 3️⃣ Create assignments safely
-    for pid in pharmacist_ids:
-        exists = await db.execute(
-            select(PharmacistOrder)
+    losers = (
+        await db.execute(
+            update(PharmacistOrder)
             .where(
                 PharmacistOrder.order_id == order_id,
-                PharmacistOrder.pharmacist_id == pid
-            )
-        )
-        if exists.scalar_one_or_none():
-            continue
-
-        db.add(
-            PharmacistOrder(
-                order_id=order_id,
-                pharmacist_id=pid,
-                status="PENDING"
+                PharmacistOrder.pharmacist_id != pharmacist_id,
+                PharmacistOrder.status == "PENDING",
             )
+            .values(status="REJECTED")
+            .returning(PharmacistOrder.pharmacist_id)
+            .execution_options(synchronize_session=False)
         )
-
-        await manager.send_pharmacist(
-            pid,
-            {
-                "event": "NEW_ORDER",
-                "order_id": order_id,
-                "status": "WAITING_PHARMACIST"
-            }
-        )
+    ).scalars().all()
 
     await db.commit()
+    return list(losers)
 
-                
 
 async def notify_next_pharmacist(db: AsyncSession, order_id: int):
+    # Last open offer in this ring was rejected → expand right away
     result = await db.execute(
-        select(PharmacistOrder)
+        select(PharmacistOrder.id)
         .where(
             PharmacistOrder.order_id == order_id,
             PharmacistOrder.status == "PENDING"
         )
         .limit(1)
     )
-    po = result.scalar_one_or_none()
 
-    if po:
-        await manager.send_pharmacist(
-            po.pharmacist_id,
-            {
-                "event": "NEW_ORDER",
-                "order_id": order_id
-            }
+    if result.scalar_one_or_none() is None:
+        redis = await get_redis()
+        await expedite_dispatch(redis, order_id)
+
+
+# ======================================================
+# ⏱️ DISPATCH SCHEDULER
+# One loop per process over a shared Redis ZSET of deadlines –
+# no sleeping task per order.
+# ======================================================
+async def _expand_due(redis, order_ids: list[int]):
+    async with AsyncSessionLocal() as db:
+        waiting = set(
+            (
+                await db.execute(
+                    select(Order.id).where(
+                        Order.id.in_(order_ids),
+                        Order.status == OrderStatus.WAITING_PHARMACIST,
+                    )
+                )
+            ).scalars()
         )
+
+        for order_id in order_ids:
+            state_key = STATE_KEY.format(order_id=order_id)
+
+            if order_id not in waiting:
+                await redis.delete(state_key)
+                continue
+
+            state = await redis.hgetall(state_key)
+            if not state:
+                continue
+
+            # first assignment never went through – start from ring 0
+            if state.get("retry"):
+                await redis.delete(state_key)
+                await assign_or_retry(db, redis, order_id)
+                continue
+
+            await _offer_from_ring(
+                db,
+                redis,
+                order_id,
+                float(state["lat"]),
+                float(state["lng"]),
+                ring=int(state["ring"]) + 1,
+            )
+
+
+async def run_dispatch_scheduler():
+    redis = await get_redis()
+    pop_due = redis.register_script(_POP_DUE)
+
+    while True:
+        try:
+            due = await pop_due(keys=[DEADLINES_KEY], args=[time.time(), POP_BATCH])
+            if due:
+                await _expand_due(redis, [int(order_id) for order_id in due])
+                continue   # more may be due – don't sleep
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dispatch scheduler error: {e}")
+
+        await asyncio.sleep(TICK_SECONDS)
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import update
+
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from core.websocket_manager import manager
+from models.prescription import Prescription, PrescriptionStatus
+from services.ocr_service import extract_text
+from services.prescription_medicine_matcher import match_products
+from services.prescription_validator import has_doctor_details
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+STREAM_KEY = "prescriptions:ocr"
+CONSUMER_GROUP = "ocr-workers"
+
+BLOCK_MS = 5000
+RECLAIM_IDLE_MS = 5 * 60_000     # a multi-page scan can take a while
+
+
+# ======================================================
+# 📥 ENQUEUE (HTTP PATH – no OCR)
+# ======================================================
+async def enqueue_ocr(redis, prescription_id: int):
+    await redis.xadd(STREAM_KEY, {"prescription_id": prescription_id})
+
+
+def prescription_result(prescription: Prescription) -> dict:
+    matches = prescription.matches or {}
+    return {
+        "prescription_id": prescription.id,
+        "status": prescription.status,
+        "prescription_image": f"/{prescription.file_path}",
+        "available_medicines": matches.get("available", []),
+        "unavailable_medicines": matches.get("unavailable", []),
+        "error": prescription.error,
+    }
+
+
+# ======================================================
+# 🔬 ONE JOB
+# ======================================================
+async def _set_status(db, prescription_id: int, **values):
+    await db.execute(
+        update(Prescription).where(Prescription.id == prescription_id).values(**values)
+    )
+    await db.commit()
+
+
+async def _process(pool, prescription_id: int):
+    async with AsyncSessionLocal() as db:
+        prescription = await db.get(Prescription, prescription_id)
+        if not prescription:
+            return
+
+        await _set_status(db, prescription_id, status=PrescriptionStatus.processing)
+
+        try:
+            # tesseract / pdfplumber are CPU-bound → worker process
+            loop = asyncio.get_running_loop()
+            text = await loop.run_in_executor(pool, extract_text, prescription.file_path)
+
+            if has_doctor_details(text):
+                status = PrescriptionStatus.approved
+                available, unavailable = await match_products(db, text)
+            else:
+                status = PrescriptionStatus.rejected
+                available, unavailable = [], []
+
+            await _set_status(
+                db,
+                prescription_id,
+                extracted_text=text,
+                status=status,
+                matches={"available": available, "unavailable": unavailable},
+                error=None,
+            )
+
+        except Exception as e:
+            print(f"OCR job {prescription_id} failed: {e}")
+            await db.rollback()
+            await _set_status(db, prescription_id, status=PrescriptionStatus.failed, error=str(e)[:200])
+
+        await db.refresh(prescription)
+
+    # 🔔 PUSH TO CUSTOMER (polling GET /prescription/{id} works too)
+    if prescription.user_id:
+        await manager.send_user(
+            prescription.user_id,
+            {"event": "PRESCRIPTION_PROCESSED", **prescription_result(prescription)},
+        )
+
+
+# ======================================================
+# 👷 WORKER
+# ======================================================
+async def _ensure_group(redis):
+    try:
+        await redis.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _handle(redis, pool, messages):
+    if not messages:
+        return
+
+    await asyncio.gather(*(
+        _process(pool, int(fields["prescription_id"])) for _, fields in messages
+    ))
+
+    ids = [msg_id for msg_id, _ in messages]
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        await pipe.execute()
+
+
+async def run_ocr_worker(processes: int | None = None, consumer: str | None = None):
+    processes = processes or os.cpu_count() or 2
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+
+    redis = await get_redis()
+    await _ensure_group(redis)
+
+    # WebSocket pushes from this process go out over Redis pub/sub;
+    # it hosts no sockets, so nothing to listen for
+    await manager.start(redis, listen=False)
+
+    # one job per core in flight; the pool does the OCR
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        try:
+            while True:
+                try:
+                    # ♻️ jobs left pending by a dead worker
+                    _, stale, _ = await redis.xautoclaim(
+                        STREAM_KEY,
+                        CONSUMER_GROUP,
+                        consumer,
+                        min_idle_time=RECLAIM_IDLE_MS,
+                        start_id="0-0",
+                        count=processes,
+                    )
+                    await _handle(redis, pool, stale)
+
+                    response = await redis.xreadgroup(
+                        CONSUMER_GROUP,
+                        consumer,
+                        {STREAM_KEY: ">"},
+                        count=processes,
+                        block=BLOCK_MS,
+                    )
+                    for _stream, messages in response or []:
+                        await _handle(redis, pool, messages)
+
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"OCR worker error: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            await manager.stop()
@@ -1,7 +1,6 @@
-import razorpay
 import uuid
-import asyncio
 from core.config import settings
+from core.razorpay_client import razorpay_client
 from utils.payment_id import generate_payment_id   # ✅ import
 
 class RazorpayService:
@@ -14,12 +13,8 @@ class RazorpayService:
         if not settings.RAZORPAY_KEY_ID or not settings.RAZORPAY_KEY_SECRET:
             raise RuntimeError("Razorpay keys missing")
 
-        self.client = razorpay.Client(
-            auth=(
-                settings.RAZORPAY_KEY_ID.strip(),
-                settings.RAZORPAY_KEY_SECRET.strip(),
-            )
-        )
+        # ✅ pooled async client (no executor threads)
+        self.client = razorpay_client
 
     async def create_order(self, amount: float, currency: str = "INR"):
         payment_id = generate_payment_id()   # ✅ your unique payment id
@@ -34,41 +29,29 @@ class RazorpayService:
                 "payment_id": payment_id,    # ✅ add here
             }
 
-        loop = asyncio.get_running_loop()
-
-        order = await loop.run_in_executor(
-            None,
-            self.client.order.create,
+        order = await self.client.create_order(
             {
                 "amount": int(amount * 100),
                 "currency": currency,
                 "payment_capture": 1,
                 "receipt": payment_id,   # ✅ store in Razorpay itself
-            },
+            }
         )
 
         # ✅ return to frontend
         order["payment_id"] = payment_id
         return order
 
-    async def verify_payment(self, order_id, payment_id, signature):
+    async def verify_payment(self, order_id, payment_id, signature) -> bool:
         # ✅ MOCK VERIFY ALWAYS SUCCESS
         if settings.PAYMENT_MODE != "RAZORPAY":
             return True
 
-        data = {
-            "razorpay_order_id": order_id,
-            "razorpay_key_id": payment_id,   # ✅ FIXED KEY NAME
-            "razorpay_signature": signature,
-        }
-
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(
-            None,
-            self.client.utility.verify_payment_signature,
-            data,
+        # ✅ pure HMAC – runs inline, no thread hop
+        return self.client.verify_payment_signature(
+            order_id,
+            payment_id,
+            signature,
         )
 
-        return True
-
 razorpay_service = RazorpayService()
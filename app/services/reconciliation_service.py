@@ -0,0 +1,455 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytz
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    MetaData,
+    String,
+    Table,
+    and_,
+    cast,
+    delete,
+    func,
+    case,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+
+from core.database import AsyncSessionLocal, engine
+from core.razorpay_client import RazorpayError, razorpay_client
+from core.redis import get_redis
+from models.order import Order, OrderStatus
+from models.refund import Refund, RefundStatus
+from models.payment_reconciliation import (
+    MismatchKind,
+    PaymentReconciliationMismatch as Mismatch,
+)
+from services.pharmacist_assignment_service import assign_or_retry
+from services.webhook_service import PAYABLE_STATES
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+IST = pytz.timezone("Asia/Kolkata")
+
+PAGE_SIZE = 100            # gateway max page size
+SLICE_SECONDS = 300        # the day is paged as parallel 5-minute windows
+COPY_CHUNK = 10_000        # gateway rows per COPY
+ORDER_CHUNK = 50_000       # order ids per set-based compare
+MAX_RETRIES = 5
+
+MOCK_ORDER_PREFIX = "order_mock_"   # PAYMENT_MODE=MOCK orders never hit the gateway
+
+orders = Order.__table__
+refunds = Refund.__table__
+mismatches = Mismatch.__table__
+
+# ======================================================
+# 🗂️ SESSION-LOCAL STAGING TABLES (not part of Base)
+# ======================================================
+_staging = MetaData()
+
+gateway_payments = Table(
+    "recon_gateway_payments",
+    _staging,
+    Column("razorpay_payment_id", String),
+    Column("razorpay_order_id", String),
+    Column("status", String),
+    Column("amount", BigInteger),
+    Column("amount_refunded", BigInteger),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="PRESERVE ROWS",
+)
+
+# one row per gateway order (a customer may retry a payment)
+gateway_orders = Table(
+    "recon_gateway_orders",
+    _staging,
+    Column("razorpay_order_id", String, primary_key=True),
+    Column("captured", Boolean),
+    Column("payment_id", String),
+    Column("status", String),
+    Column("amount", BigInteger),
+    Column("amount_refunded", BigInteger),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="PRESERVE ROWS",
+)
+
+GATEWAY_COLUMNS = [c.name for c in gateway_payments.columns]
+
+
+# ======================================================
+# 🌐 GATEWAY PAGING (BOUNDED CONCURRENCY)
+# ======================================================
+async def _list_page(from_ts: int, to_ts: int, skip: int) -> list[dict]:
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await razorpay_client.list_payments(
+                from_ts, to_ts, count=PAGE_SIZE, skip=skip
+            )
+        except (RazorpayError, httpx.HTTPError) as e:
+            retryable = (
+                not isinstance(e, RazorpayError)
+                or e.status_code >= 500
+                or e.status_code == 429
+            )
+            if not retryable or attempt == MAX_RETRIES - 1:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def _fetch_slice(from_ts, to_ts, sem, queue):
+    skip = 0
+    while True:
+        async with sem:
+            items = await _list_page(from_ts, to_ts, skip)
+
+        if items:
+            await queue.put([
+                (
+                    p["id"],
+                    p.get("order_id"),
+                    p.get("status"),
+                    int(p.get("amount") or 0),
+                    int(p.get("amount_refunded") or 0),
+                )
+                for p in items
+            ])
+
+        if len(items) < PAGE_SIZE:
+            return
+        skip += PAGE_SIZE
+
+
+async def _fetch_gateway(from_ts: int, to_ts: int, concurrency: int, queue):
+    """[from_ts, to_ts) – the gateway's from/to are inclusive, so each slice
+    stops one second short of the next (a boundary payment is fetched once)."""
+    sem = asyncio.Semaphore(concurrency)
+    try:
+        await asyncio.gather(*(
+            _fetch_slice(start, min(start + SLICE_SECONDS, to_ts) - 1, sem, queue)
+            for start in range(from_ts, to_ts, SLICE_SECONDS)
+        ))
+    finally:
+        await queue.put(None)
+
+
+async def _copy_gateway(conn, queue) -> int:
+    raw = (await conn.get_raw_connection()).driver_connection
+    buffer, total = [], 0
+
+    async def flush():
+        nonlocal total
+        if buffer:
+            await raw.copy_records_to_table(
+                gateway_payments.name,
+                records=buffer,
+                columns=GATEWAY_COLUMNS,
+            )
+            total += len(buffer)
+            buffer.clear()
+
+    while (rows := await queue.get()) is not None:
+        buffer.extend(rows)
+        if len(buffer) >= COPY_CHUNK:
+            await flush()
+
+    await flush()
+    return total
+
+
+# ======================================================
+# 🧮 SET-BASED COMPARE (ONE CHUNK OF ORDER IDS)
+# ======================================================
+def _report(run_date, kind, source, condition, healed=False, payment_id=None):
+    gw = gateway_orders.c
+    local_amount = cast(func.round(orders.c.total * 100), BigInteger)
+
+    return insert(mismatches).from_select(
+        [
+            "run_date", "kind", "order_id", "razorpay_order_id",
+            "razorpay_payment_id", "local_payment_status", "gateway_status",
+            "local_amount", "gateway_amount", "healed",
+        ],
+        select(
+            literal(run_date, Date),
+            cast(literal(kind.value), mismatches.c.kind.type),
+            orders.c.id,
+            orders.c.razorpay_order_id,
+            payment_id if payment_id is not None else gw.payment_id,
+            orders.c.payment_status,
+            gw.status,
+            local_amount,
+            gw.amount,
+            literal(healed) if isinstance(healed, bool) else healed,
+        )
+        .select_from(source)
+        .where(condition),
+    )
+
+
+async def _compare_chunk(conn, run_date, lo, hi, window, heal: bool):
+    gw = gateway_orders.c
+    start, end = window
+
+    in_scope = and_(
+        orders.c.id.between(lo, hi),
+        orders.c.razorpay_order_id.isnot(None),
+        ~orders.c.razorpay_order_id.startswith(MOCK_ORDER_PREFIX),
+        or_(orders.c.created_at.between(start, end), gw.razorpay_order_id.isnot(None)),
+    )
+    source = orders.outerjoin(gateway_orders, gw.razorpay_order_id == orders.c.razorpay_order_id)
+
+    paid = func.coalesce(orders.c.payment_status, "") == "SUCCESS"
+    captured = func.coalesce(gw.captured, False)
+    local_amount = cast(func.round(orders.c.total * 100), BigInteger)
+
+    ref = (
+        select(
+            refunds.c.order_id,
+            func.bool_or(refunds.c.status == RefundStatus.success).label("settled"),
+            func.bool_or(
+                refunds.c.status.in_([RefundStatus.initiated, RefundStatus.processing])
+            ).label("open"),
+            # paise asked of the gateway, failed attempts excluded
+            cast(
+                func.round(func.sum(
+                    case((refunds.c.status != RefundStatus.failed, refunds.c.amount), else_=0)
+                ) * 100),
+                BigInteger,
+            ).label("requested"),
+        )
+        .where(refunds.c.order_id.between(lo, hi))
+        .group_by(refunds.c.order_id)
+        .subquery("ref")
+    )
+    refund_source = source.join(ref, ref.c.order_id == orders.c.id)
+
+    # 1️⃣ Report (reads the pre-heal state)
+    for stmt in (
+        _report(run_date, MismatchKind.CAPTURED_NOT_MARKED, source,
+                and_(in_scope, captured, ~paid),
+                healed=(orders.c.status != OrderStatus.CANCELLED) if heal else False),
+        _report(run_date, MismatchKind.MISSING_PAYMENT_ID, source,
+                and_(in_scope, captured, paid, orders.c.razorpay_payment_id.is_(None)),
+                healed=heal),
+        _report(run_date, MismatchKind.MARKED_PAID_NOT_CAPTURED, source,
+                and_(in_scope, paid, ~captured),
+                payment_id=orders.c.razorpay_payment_id),
+        _report(run_date, MismatchKind.AMOUNT_MISMATCH, source,
+                and_(in_scope, captured, gw.amount != local_amount)),
+        _report(run_date, MismatchKind.REFUND_NOT_SETTLED, refund_source,
+                and_(in_scope, ref.c.open, gw.amount_refunded >= ref.c.requested),
+                healed=heal),
+        _report(run_date, MismatchKind.REFUND_NOT_AT_GATEWAY, refund_source,
+                and_(in_scope, ref.c.settled, gw.razorpay_order_id.isnot(None),
+                     func.coalesce(gw.amount_refunded, 0) == 0)),
+    ):
+        await conn.execute(stmt)
+
+    # 2️⃣ Auto-heal trivially fixable states
+    paid_order_ids = []
+    if heal:
+        # captured but never marked → same transition the webhook makes
+        result = await conn.execute(
+            update(orders)
+            .where(
+                orders.c.id.between(lo, hi),
+                orders.c.razorpay_order_id == gw.razorpay_order_id,
+                gw.captured.is_(True),
+                orders.c.status != OrderStatus.CANCELLED,
+                func.coalesce(orders.c.payment_status, "") != "SUCCESS",
+            )
+            .values(
+                payment_status="SUCCESS",
+                razorpay_payment_id=func.coalesce(gw.payment_id, orders.c.razorpay_payment_id),
+                payment_method=func.coalesce(orders.c.payment_method, "RAZORPAY"),
+                status=case(
+                    (orders.c.status.in_(PAYABLE_STATES), OrderStatus.WAITING_PHARMACIST),
+                    else_=orders.c.status,
+                ),
+            )
+            .returning(orders.c.id, orders.c.status)
+        )
+        paid_order_ids = [
+            order_id
+            for order_id, status in result.all()
+            if status == OrderStatus.WAITING_PHARMACIST
+        ]
+
+        # marked paid, payment id missing
+        await conn.execute(
+            update(orders)
+            .where(
+                orders.c.id.between(lo, hi),
+                orders.c.razorpay_order_id == gw.razorpay_order_id,
+                gw.captured.is_(True),
+                orders.c.payment_status == "SUCCESS",
+                orders.c.razorpay_payment_id.is_(None),
+            )
+            .values(razorpay_payment_id=gw.payment_id)
+        )
+
+        # only once the gateway has refunded everything that was asked for
+        await conn.execute(
+            update(refunds)
+            .where(
+                refunds.c.order_id == orders.c.id,
+                refunds.c.order_id == ref.c.order_id,
+                orders.c.id.between(lo, hi),
+                orders.c.razorpay_order_id == gw.razorpay_order_id,
+                gw.amount_refunded >= ref.c.requested,
+                refunds.c.status.in_([RefundStatus.initiated, RefundStatus.processing]),
+            )
+            .values(status=RefundStatus.success)
+        )
+
+    await conn.commit()
+    return paid_order_ids
+
+
+async def _assign_healed(order_ids):
+    if not order_ids:
+        return
+
+    redis = await get_redis()
+    async with AsyncSessionLocal() as db:
+        for order_id in order_ids:
+            await assign_or_retry(db, redis, order_id)
+
+
+# ======================================================
+# 🌙 NIGHTLY RUN
+# ======================================================
+async def reconcile_payments(
+    run_date: date,
+    concurrency: int = 16,
+    heal: bool = True,
+) -> dict:
+    started = time.monotonic()
+
+    start = IST.localize(datetime.combine(run_date, datetime.min.time()))
+    end = start + timedelta(days=1)
+    window = (start, end)
+
+    async with engine.connect() as conn:
+        await conn.run_sync(_staging.create_all)
+        await conn.exec_driver_sql(
+            f"TRUNCATE {gateway_payments.name}, {gateway_orders.name}"
+        )
+        await conn.execute(delete(mismatches).where(mismatches.c.run_date == run_date))
+        await conn.commit()
+
+        # 1️⃣ Stream gateway pages straight into COPY
+        queue = asyncio.Queue(maxsize=concurrency * 4)
+        fetched, _ = await asyncio.gather(
+            _copy_gateway(conn, queue),
+            _fetch_gateway(int(start.timestamp()), int(end.timestamp()), concurrency, queue),
+        )
+        print(f"📥 Gateway payments loaded: {fetched}")
+
+        # 2️⃣ Collapse retries into one row per gateway order
+        gp = gateway_payments.c
+        is_captured = gp.status == "captured"
+        await conn.execute(
+            insert(gateway_orders).from_select(
+                [c.name for c in gateway_orders.columns],
+                select(
+                    gp.razorpay_order_id,
+                    func.bool_or(is_captured),
+                    func.max(case((is_captured, gp.razorpay_payment_id))),
+                    case(
+                        (func.bool_or(is_captured), "captured"),
+                        else_=func.max(gp.status),
+                    ),
+                    func.coalesce(func.sum(case((is_captured, gp.amount), else_=0)), 0),
+                    func.coalesce(func.max(gp.amount_refunded), 0),
+                )
+                .where(gp.razorpay_order_id.isnot(None))
+                .group_by(gp.razorpay_order_id)
+            )
+        )
+        await conn.exec_driver_sql(f"ANALYZE {gateway_orders.name}")
+
+        # 3️⃣ Gateway orders we have never heard of
+        await conn.execute(
+            insert(mismatches).from_select(
+                [
+                    "run_date", "kind", "razorpay_order_id", "razorpay_payment_id",
+                    "gateway_status", "gateway_amount", "healed",
+                ],
+                select(
+                    literal(run_date, Date),
+                    cast(literal(MismatchKind.UNKNOWN_GATEWAY_ORDER.value), mismatches.c.kind.type),
+                    gateway_orders.c.razorpay_order_id,
+                    gateway_orders.c.payment_id,
+                    gateway_orders.c.status,
+                    gateway_orders.c.amount,
+                    literal(False),
+                )
+                .select_from(
+                    gateway_orders.outerjoin(
+                        orders,
+                        orders.c.razorpay_order_id == gateway_orders.c.razorpay_order_id,
+                    )
+                )
+                .where(orders.c.id.is_(None))
+            )
+        )
+        await conn.commit()
+
+        # 4️⃣ Walk the affected order ids in fixed-size chunks
+        lo, hi = (
+            await conn.execute(
+                select(func.min(orders.c.id), func.max(orders.c.id))
+                .select_from(
+                    orders.outerjoin(
+                        gateway_orders,
+                        gateway_orders.c.razorpay_order_id == orders.c.razorpay_order_id,
+                    )
+                )
+                .where(
+                    or_(
+                        orders.c.created_at.between(start, end),
+                        gateway_orders.c.razorpay_order_id.isnot(None),
+                    )
+                )
+            )
+        ).one()
+
+        if lo is not None:
+            for chunk_lo in range(lo, hi + 1, ORDER_CHUNK):
+                chunk_hi = min(chunk_lo + ORDER_CHUNK - 1, hi)
+                paid_order_ids = await _compare_chunk(
+                    conn, run_date, chunk_lo, chunk_hi, window, heal
+                )
+                # healed orders were paid but never offered to a pharmacist
+                await _assign_healed(paid_order_ids)
+                print(f"🔎 Orders {chunk_lo}–{chunk_hi} reconciled")
+
+        summary = {
+            kind: count
+            for kind, count in (
+                await conn.execute(
+                    select(mismatches.c.kind, func.count())
+                    .where(mismatches.c.run_date == run_date)
+                    .group_by(mismatches.c.kind)
+                )
+            ).all()
+        }
+
+    return {
+        "run_date": run_date.isoformat(),
+        "gateway_payments": fetched,
+        "mismatches": {k.value if hasattr(k, "value") else k: v for k, v in summary.items()},
+        "seconds": round(time.monotonic() - started, 1),
+    }
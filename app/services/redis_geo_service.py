@@ -1,10 +1,374 @@
+import asyncio
+import math
+import time
 from typing import Optional, List
 
+from core.redis import load_scripts, redis_client, run_script
+
+KM_PER_DEGREE = 111.32
+
+# ======================================================
+# 🗺️ GEO INDEX LAYOUT (one place for every geo key)
+#   geo:{role}:{city}         GEO set of members
+#   geo:{role}:{city}:seen    ZSET member → last-seen epoch
+#   geo:{role}:cities         SET of shards in use
+#   geo:{role}:city_of        HASH member → shard
+# {role} is a hash tag: one role's shards share a cluster slot, so
+# the scripts below can touch several of them atomically
+# ======================================================
+CITY_CENTERS = {
+    "hyderabad": (17.3850, 78.4867),
+    "bengaluru": (12.9716, 77.5946),
+    "chennai": (13.0827, 80.2707),
+    "mumbai": (19.0760, 72.8777),
+    "pune": (18.5204, 73.8567),
+    "delhi": (28.6139, 77.2090),
+    "kolkata": (22.5726, 88.3639),
+    "vijayawada": (16.5062, 80.6480),
+    "visakhapatnam": (17.6868, 83.2185),
+}
+CITY_RADIUS_KM = 60
+OTHER_CITY = "other"
+SHARDS = [*CITY_CENTERS, OTHER_CITY]
+
+AGENT_TTL_SECONDS = 30        # same as delivery:agent:online:{id}
+REAP_INTERVAL_SECONDS = 10
+REAP_BATCH = 1000
+
+CANDIDATE_FACTOR = 4          # over-fetch, then drop stale members
+
+LEGACY_KEYS = {
+    "delivery": ["delivery:agents:live", "delivery_agents:live"],
+    "pharmacist": ["pharmacists:live"],
+}
+
+
+def _km(lat1, lng1, lat2, lng2) -> float:
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371 * math.hypot(x, y)
+
+
+def city_for(latitude: float, longitude: float) -> str:
+    """Shard for a coordinate: nearest known city centre, else 'other'."""
+    best, best_km = OTHER_CITY, CITY_RADIUS_KM
+    for city, (lat, lng) in CITY_CENTERS.items():
+        km = _km(latitude, longitude, lat, lng)
+        if km <= best_km:
+            best, best_km = city, km
+    return best
+
+
+def shards_near(latitude: float, longitude: float, radius_km: float) -> list[str]:
+    """
+    Shards that can hold a member within radius_km of the point: every
+    city whose CITY_RADIUS_KM disc reaches the search circle, plus 'other'.
+    """
+    return [
+        city
+        for city, (lat, lng) in CITY_CENTERS.items()
+        if _km(latitude, longitude, lat, lng) <= CITY_RADIUS_KM + radius_km
+    ] + [OTHER_CITY]
+
+
+# ======================================================
+# 📜 LUA (one round trip per write / query / reap)
+# ======================================================
+# KEYS: city_of, cities, then geo/seen for every shard in SHARDS order
+# ARGV: member, lng, lat, new shard, now, then the SHARDS names
+_UPSERT = redis_client.register_script("""
+local slot = {}
+for i = 6, #ARGV do
+    slot[ARGV[i]] = 2 * (i - 5) + 1
+end
+
+local new = slot[ARGV[4]]
+local old = redis.call('HGET', KEYS[1], ARGV[1])
+if old and old ~= ARGV[4] and slot[old] then
+    redis.call('ZREM', KEYS[slot[old]], ARGV[1])
+    redis.call('ZREM', KEYS[slot[old] + 1], ARGV[1])
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[4])
+redis.call('SADD', KEYS[2], ARGV[4])
+redis.call('GEOADD', KEYS[new], ARGV[2], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[new + 1], ARGV[5], ARGV[1])
+return 1
+""")
+
+# KEYS: city_of, then geo/seen for every shard in SHARDS order
+# ARGV: member, then the SHARDS names
+_REMOVE = redis_client.register_script("""
+local city = redis.call('HGET', KEYS[1], ARGV[1])
+if not city then
+    return 0
+end
+for i = 2, #ARGV do
+    if ARGV[i] == city then
+        redis.call('ZREM', KEYS[2 * i - 2], ARGV[1])
+        redis.call('ZREM', KEYS[2 * i - 1], ARGV[1])
+    end
+end
+redis.call('HDEL', KEYS[1], ARGV[1])
+return 1
+""")
+
+# GEOSEARCH every geo/seen pair in KEYS, keep only members seen after
+# the cutoff (-1 = no TTL), merge nearest-first across shards
+_SEARCH_FRESH = redis_client.register_script("""
+local cutoff = tonumber(ARGV[7])
+local want = tonumber(ARGV[8])
+local out = {}
+
+for k = 1, #KEYS, 2 do
+    local args = {'GEOSEARCH', KEYS[k], 'FROMLONLAT', ARGV[1], ARGV[2]}
+    if ARGV[3] == 'BYBOX' then
+        table.insert(args, 'BYBOX'); table.insert(args, ARGV[4]); table.insert(args, ARGV[5])
+    else
+        table.insert(args, 'BYRADIUS'); table.insert(args, ARGV[4])
+    end
+    table.insert(args, 'km')
+    table.insert(args, 'ASC')
+    if tonumber(ARGV[6]) > 0 then
+        table.insert(args, 'COUNT'); table.insert(args, ARGV[6])
+    end
+    table.insert(args, 'WITHDIST')
+    table.insert(args, 'WITHCOORD')
+
+    local kept = 0
+    for _, hit in ipairs(redis.call(unpack(args))) do
+        local fresh = cutoff < 0
+        if not fresh then
+            local seen = redis.call('ZSCORE', KEYS[k + 1], hit[1])
+            fresh = seen and tonumber(seen) >= cutoff
+        end
+        if fresh then
+            table.insert(out, {hit[1], tonumber(hit[2]), hit[3][1], hit[3][2]})
+            kept = kept + 1
+            if want > 0 and kept >= want then
+                break
+            end
+        end
+    end
+end
+
+table.sort(out, function(a, b) return a[2] < b[2] end)
+
+local result = {}
+for i, hit in ipairs(out) do
+    if want > 0 and i > want then
+        break
+    end
+    table.insert(result, {hit[1], hit[3], hit[4]})
+end
+return result
+""")
+
+# queued as EVALSHA inside pipelines – load_scripts() these first
+PIPELINED_SCRIPTS = [_UPSERT]
+
+_REAP = redis_client.register_script("""
+local stale = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[1], 'LIMIT', 0, ARGV[2])
+if #stale > 0 then
+    redis.call('ZREM', KEYS[1], unpack(stale))
+    redis.call('ZREM', KEYS[2], unpack(stale))
+    redis.call('HDEL', KEYS[3], unpack(stale))
+end
+return #stale
+""")
+
+
+class GeoIndex:
+    def __init__(self, role: str, ttl: int | None):
+        self.role = role
+        self.ttl = ttl
+        self.prefix = f"geo:{{{role}}}"
+        self.cities_key = f"{self.prefix}:cities"
+        self.city_of_key = f"{self.prefix}:city_of"
+
+    def geo_key(self, city: str) -> str:
+        return f"{self.prefix}:{city}"
+
+    def seen_key(self, city: str) -> str:
+        return f"{self.prefix}:{city}:seen"
+
+    def shard_keys(self, cities) -> list[str]:
+        """geo/seen pairs, in the order the scripts expect them."""
+        return [key for city in cities for key in (self.geo_key(city), self.seen_key(city))]
+
+    def cutoff(self) -> float:
+        return time.time() - self.ttl if self.ttl else -1
+
+    async def upsert(self, redis, member, latitude: float, longitude: float):
+        """`redis` may be a pipeline – a plain EVALSHA is queued with it."""
+        return await run_script(
+            _UPSERT,
+            keys=[self.city_of_key, self.cities_key, *self.shard_keys(SHARDS)],
+            args=[
+                str(member), longitude, latitude,
+                city_for(latitude, longitude), time.time(), *SHARDS,
+            ],
+            client=redis,
+        )
+
+    async def remove(self, redis, member):
+        return await _REMOVE(
+            keys=[self.city_of_key, *self.shard_keys(SHARDS)],
+            args=[str(member), *SHARDS],
+            client=redis,
+        )
+
+    async def search(self, redis, latitude, longitude, radius_km, count=0) -> list:
+        # neighbouring shards too – a member can sit just across a boundary
+        hits = await _SEARCH_FRESH(
+            keys=self.shard_keys(shards_near(latitude, longitude, radius_km)),
+            args=[
+                longitude, latitude, "BYRADIUS", radius_km, "",
+                count * CANDIDATE_FACTOR if count else 0,
+                self.cutoff(), count,
+            ],
+            client=redis,
+        )
+        return [member for member, _lng, _lat in hits]
+
+    async def in_box(self, redis, min_lat, min_lng, max_lat, max_lng) -> dict:
+        center_lat = (min_lat + max_lat) / 2
+        center_lng = (min_lng + max_lng) / 2
+
+        # widest at the edge nearest the equator
+        widest = math.cos(math.radians(min(abs(min_lat), abs(max_lat))))
+        height_km = max((max_lat - min_lat) * KM_PER_DEGREE, 0.001)
+        width_km = max((max_lng - min_lng) * KM_PER_DEGREE * widest, 0.001)
+
+        cities = await redis.smembers(self.cities_key)
+        if not cities:
+            return {}
+
+        hits = await _SEARCH_FRESH(
+            keys=self.shard_keys(cities),
+            args=[
+                center_lng, center_lat, "BYBOX", width_km, height_km,
+                0, self.cutoff(), 0,
+            ],
+            client=redis,
+        )
+
+        # the km box is slightly larger than the lat/lng box
+        return {
+            member: (float(lat), float(lng))
+            for member, lng, lat in hits
+            if min_lat <= float(lat) <= max_lat and min_lng <= float(lng) <= max_lng
+        }
+
+    async def fresh_members(self, redis) -> dict:
+        """city → members seen within the TTL."""
+        cities = list(await redis.smembers(self.cities_key))
+        async with redis.pipeline(transaction=False) as pipe:
+            for city in cities:
+                pipe.zrangebyscore(self.seen_key(city), self.cutoff(), "+inf")
+            members = await pipe.execute()
+        return dict(zip(cities, members))
+
+    async def positions(self, redis) -> dict:
+        by_city = {c: m for c, m in (await self.fresh_members(redis)).items() if m}
+        if not by_city:
+            return {}
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for city, members in by_city.items():
+                pipe.geopos(self.geo_key(city), *members)
+            results = await pipe.execute()
+
+        return {
+            member: (float(pos[1]), float(pos[0]))
+            for members, positions in zip(by_city.values(), results)
+            for member, pos in zip(members, positions)
+            if pos
+        }
+
+    async def positions_of(self, redis, members) -> dict:
+        """Fresh positions of specific members: one HMGET, then one pipeline."""
+        members = [str(m) for m in members]
+        if not members:
+            return {}
+
+        by_city: dict[str, list] = {}
+        for member, city in zip(members, await redis.hmget(self.city_of_key, members)):
+            if city:
+                by_city.setdefault(city, []).append(member)
+        if not by_city:
+            return {}
+
+        async with redis.pipeline(transaction=False) as pipe:
+            for city, group in by_city.items():
+                pipe.geopos(self.geo_key(city), *group)
+                pipe.zmscore(self.seen_key(city), group)
+            results = await pipe.execute()
+
+        cutoff = self.cutoff()
+        return {
+            member: (float(pos[1]), float(pos[0]))
+            for group, positions, seen in zip(by_city.values(), results[0::2], results[1::2])
+            for member, pos, score in zip(group, positions, seen)
+            if pos and (not self.ttl or (score is not None and score >= cutoff))
+        }
+
+    async def position(self, redis, member) -> Optional[tuple]:
+        city = await redis.hget(self.city_of_key, str(member))
+        if not city:
+            return None
+
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.geopos(self.geo_key(city), str(member))
+            pipe.zscore(self.seen_key(city), str(member))
+            (pos,), seen = await pipe.execute()
+
+        if not pos or (self.ttl and (seen is None or seen < self.cutoff())):
+            return None
+        return float(pos[1]), float(pos[0])
+
+    async def reap(self, redis) -> int:
+        if not self.ttl:
+            return 0
+
+        cutoff = self.cutoff()
+        removed = 0
+        for city in await redis.smembers(self.cities_key):
+            while True:
+                n = await _REAP(
+                    keys=[self.geo_key(city), self.seen_key(city), self.city_of_key],
+                    args=[cutoff, REAP_BATCH],
+                    client=redis,
+                )
+                removed += n
+                if n < REAP_BATCH:
+                    break
+        return removed
+
+    async def migrate_legacy(self, redis):
+        """Move members of the old single GEO keys and untagged shards into the index."""
+        untagged = f"geo:{self.role}"
+        keys = list(LEGACY_KEYS.get(self.role, []))
+        keys += [f"{untagged}:{city}" for city in await redis.smembers(f"{untagged}:cities")]
+
+        for key in keys:
+            members = await redis.zrange(key, 0, -1)
+            if members:
+                positions = await redis.geopos(key, *members)
+                async with redis.pipeline(transaction=False) as pipe:
+                    for member, pos in zip(members, positions):
+                        if pos:
+                            await self.upsert(pipe, member, float(pos[1]), float(pos[0]))
+                    await pipe.execute()
+            await redis.delete(key, f"{key}:seen")
+
+        await redis.delete(f"{untagged}:cities", f"{untagged}:city_of")
+
+
+DELIVERY_INDEX = GeoIndex("delivery", ttl=AGENT_TTL_SECONDS)
+PHARMACIST_INDEX = GeoIndex("pharmacist", ttl=None)   # online until go-offline
+
 
 class RedisGeoService:
-    # Redis GEO Keys
-    DELIVERY_KEY = "delivery:agents:live"
-    PHARMACIST_KEY = "pharmacists:live"
 
     # =========================================================
     # 🚚 DELIVERY AGENTS
@@ -18,23 +382,17 @@ class RedisGeoService:
         longitude: float,
     ):
         """
-        Add or update delivery agent live location in Redis GEO.
-        IMPORTANT: Redis expects (longitude, latitude, member)
+        Add or update delivery agent live location (and last-seen).
+        Works on a client or a pipeline.
         """
-        await redis.geoadd(
-            RedisGeoService.DELIVERY_KEY,
-            (longitude, latitude, str(agent_id))
-        )
+        await DELIVERY_INDEX.upsert(redis, agent_id, latitude, longitude)
 
     @staticmethod
     async def remove_agent(redis, agent_id: int):
         """
         Remove delivery agent from live tracking (offline).
         """
-        await redis.zrem(
-            RedisGeoService.DELIVERY_KEY,
-            str(agent_id),
-        )
+        await DELIVERY_INDEX.remove(redis, agent_id)
 
     @staticmethod
     async def find_nearest_agent(
@@ -44,31 +402,51 @@ class RedisGeoService:
         radius_km: int = 10,
     ) -> Optional[str]:
         """
-        Find nearest available delivery agent.
-        Uses Redis 7 GEOSEARCH (recommended).
+        Find nearest delivery agent seen within the last AGENT_TTL_SECONDS.
         """
-        results = await redis.georadius(
-            RedisGeoService.DELIVERY_KEY,
-            longitude,
-            latitude,
-            radius_km,
-            unit="km",
-            count=1,
-            sort="ASC",
-        )
-
+        results = await DELIVERY_INDEX.search(redis, latitude, longitude, radius_km, count=1)
         return results[0] if results else None
 
+    @staticmethod
+    async def get_agent_location(redis, agent_id) -> Optional[dict]:
+        position = await DELIVERY_INDEX.position(redis, agent_id)
+        if not position:
+            return None
+        lat, lng = position
+        return {"lat": lat, "lng": lng}
+
     @staticmethod
     async def get_all_live_agents(redis) -> List[str]:
         """
-        Debug helper – get all live agents.
+        Debug helper – get all fresh agents.
         """
-        return await redis.zrange(
-            RedisGeoService.DELIVERY_KEY,
-            0,
-            -1,
-        )
+        return [
+            member
+            for members in (await DELIVERY_INDEX.fresh_members(redis)).values()
+            for member in members
+        ]
+
+    @staticmethod
+    async def get_all_agent_positions(redis) -> dict:
+        """
+        Every fresh agent's position: one pipelined ZRANGEBYSCORE and one
+        pipelined variadic GEOPOS over all city shards.
+        """
+        return await DELIVERY_INDEX.positions(redis)
+
+    @staticmethod
+    async def get_agents_in_box(
+        redis,
+        min_lat: float,
+        min_lng: float,
+        max_lat: float,
+        max_lng: float,
+    ) -> dict:
+        """
+        Fresh agents inside a map viewport (GEOSEARCH BYBOX over every
+        shard in one script), exact lat/lng filter applied.
+        """
+        return await DELIVERY_INDEX.in_box(redis, min_lat, min_lng, max_lat, max_lng)
 
     # =========================================================
     # 💊 PHARMACISTS
@@ -81,17 +459,11 @@ class RedisGeoService:
         latitude: float,
         longitude: float,
     ):
-        await redis.geoadd(
-            RedisGeoService.PHARMACIST_KEY,
-            (longitude, latitude, str(pharmacist_id))
-        )
+        await PHARMACIST_INDEX.upsert(redis, pharmacist_id, latitude, longitude)
 
     @staticmethod
     async def remove_pharmacist(redis, pharmacist_id: int):
-        await redis.zrem(
-            RedisGeoService.PHARMACIST_KEY,
-            str(pharmacist_id),
-        )
+        await PHARMACIST_INDEX.remove(redis, pharmacist_id)
 
     @staticmethod
     async def find_nearest_pharmacists(
@@ -101,12 +473,23 @@ class RedisGeoService:
         radius_km: int = 5,
         count: int = 5,
     ) -> List[str]:
-        return await redis.georadius(
-            RedisGeoService.PHARMACIST_KEY,
-            longitude,
-            latitude,
-            radius_km,
-            unit="km",
-            count=count,
-            sort="ASC",
-        )
\ No newline at end of file
+        return await PHARMACIST_INDEX.search(redis, latitude, longitude, radius_km, count=count)
+
+
+# ======================================================
+# 🧹 REAPER
+# ======================================================
+async def run_geo_reaper():
+    redis = redis_client
+    await load_scripts(redis, *PIPELINED_SCRIPTS)   # migrate_legacy queues EVALSHA
+    for index in (DELIVERY_INDEX, PHARMACIST_INDEX):
+        await index.migrate_legacy(redis)
+
+    while True:
+        try:
+            await DELIVERY_INDEX.reap(redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Geo reaper error: {e}")
+        await asyncio.sleep(REAP_INTERVAL_SECONDS)
@@ -76,7 +76,7 @@ Your refund request has been successfully initiated.
 
 Thanks for choosing Anand Pharma 💊
 """
-    send_html_email(customer_email, subject, message)
+    await send_html_email(customer_email, subject, message)
 
     # ✅ background update
     asyncio.create_task(refund_success_after_delay(refund.id))
@@ -128,4 +128,4 @@ Hi {customer_name},
 Thank you,
 Anand Pharma
 """
-        send_html_email(customer_email, subject, message)
+        await send_html_email(customer_email, subject, message)
@@ -0,0 +1,128 @@
+import uuid
+
+import numpy as np
+
+from services.eta_service import AVG_SPEED_KMH, ROAD_FACTOR, haversine_km
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+MAX_DROPS = 4                # orders per rider route
+DROP_RADIUS_KM = 3           # drops must be this close to the first drop
+BATCH_WINDOW_SECONDS = 300   # orders ready within 5 min of each other
+
+PICKUP_MINUTES = 3           # handover at the counter
+DROP_MINUTES = 4             # doorstep + OTP per stop
+
+
+def _minutes(km):
+    return km * ROAD_FACTOR / AVG_SPEED_KMH * 60
+
+
+# ======================================================
+# 🧭 SMALL TSP (open path from the pharmacy)
+# ======================================================
+def solve_route(pickup: tuple, drops: np.ndarray) -> list[int]:
+    """
+    Order of `drops` (n, 2 lat/lng) starting at `pickup`, not returning.
+    Nearest neighbour, then 2-opt with each pass vectorised over k.
+    """
+    n = len(drops)
+    if n <= 1:
+        return list(range(n))
+
+    points = np.vstack([np.asarray(pickup, dtype=np.float64), drops])
+    dist = haversine_km(points[:, None, 0], points[:, None, 1], points[None, :, 0], points[None, :, 1])
+
+    # dummy end node at zero distance turns the open path into a fixed-ends path
+    dist = np.pad(dist, ((0, 1), (0, 1)))
+    end = n + 1
+
+    # 1️⃣ nearest neighbour
+    tour = [0]
+    unvisited = np.ones(n + 1, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n):
+        row = np.where(unvisited, dist[tour[-1], : n + 1], np.inf)
+        nxt = int(np.argmin(row))
+        tour.append(nxt)
+        unvisited[nxt] = False
+    tour = np.array(tour + [end])
+
+    # 2️⃣ 2-opt: reverse tour[i..k] when it shortens the path
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n):
+            ks = np.arange(i + 1, n + 1)
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[ks], tour[ks + 1]
+            delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                k = ks[best]
+                tour[i : k + 1] = tour[i : k + 1][::-1]
+                improved = True
+
+    return [int(t) - 1 for t in tour[1:-1]]
+
+
+def drop_offsets(pickup: tuple, drops: np.ndarray) -> np.ndarray:
+    """Minutes from leaving the pharmacy to reaching each drop, in order."""
+    path = np.vstack([np.asarray(pickup, dtype=np.float64), drops])
+    legs = _minutes(haversine_km(path[:-1, 0], path[:-1, 1], path[1:, 0], path[1:, 1]))
+    stops = np.arange(len(drops)) * DROP_MINUTES
+    return np.cumsum(legs) + stops
+
+
+# ======================================================
+# 📦 BATCHES → ROUTED JOBS
+# ======================================================
+def build_jobs(orders) -> list[dict]:
+    """
+    orders: rows with id, user_id, pharmacy_id, updated_at and
+    pickup/drop coordinates (p_lat, p_lng, d_lat, d_lng), oldest first.
+
+    Groups orders of one pharmacy whose drops sit within DROP_RADIUS_KM
+    of the group's first drop and became ready within the window, then
+    routes each group. Singles come out as one-drop jobs.
+    """
+    by_pharmacy: dict[int, list] = {}
+    for order in orders:
+        by_pharmacy.setdefault(order.pharmacy_id, []).append(order)
+
+    jobs = []
+    for group in by_pharmacy.values():
+        remaining = list(group)
+
+        while remaining:
+            seed = remaining.pop(0)
+            batch = [seed]
+
+            if len(remaining):
+                d_lat = np.array([o.d_lat for o in remaining])
+                d_lng = np.array([o.d_lng for o in remaining])
+                near = haversine_km(seed.d_lat, seed.d_lng, d_lat, d_lng) <= DROP_RADIUS_KM
+                in_window = np.array([
+                    abs((o.updated_at - seed.updated_at).total_seconds()) <= BATCH_WINDOW_SECONDS
+                    for o in remaining
+                ])
+                picked = set(np.flatnonzero(near & in_window)[: MAX_DROPS - 1].tolist())
+
+                batch += [o for i, o in enumerate(remaining) if i in picked]
+                remaining = [o for i, o in enumerate(remaining) if i not in picked]
+
+            pickup = (seed.p_lat, seed.p_lng)
+            drops = np.array([(o.d_lat, o.d_lng) for o in batch], dtype=np.float64)
+            order_seq = solve_route(pickup, drops)
+
+            routed = [batch[i] for i in order_seq]
+            jobs.append({
+                "route_id": uuid.uuid4().hex,
+                "pickup": pickup,
+                "orders": routed,
+                "offsets": drop_offsets(pickup, drops[order_seq]),
+            })
+
+    return jobs
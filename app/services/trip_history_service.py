@@ -0,0 +1,243 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import select, update
+
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from models.delivery import Delivery, DeliveryStatus
+from models.delivery_location import DeliveryLocationSegment
+from services.gps_ingest_service import HISTORY_KEY
+from utils.track_codec import decode_points, encode_points
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+FLUSH_BATCH = 5000
+FLUSH_IDLE_SECONDS = 1
+
+SEGMENT_POINTS = 120         # close a segment at this many points …
+SEGMENT_MAX_AGE = 60         # … or once its first point is this old
+RING_SIZE = SEGMENT_POINTS * 4
+
+# every worker holds part of a trip in memory – wait until all of them
+# have flushed before summarising
+SUMMARY_KEY = "delivery:trip:summaries"
+SUMMARY_DELAY = SEGMENT_MAX_AGE + 30
+
+IDLE_SPEED_MS = 0.5
+EARTH_RADIUS_M = 6_371_000
+
+ACTIVE_STATES = [DeliveryStatus.ASSIGNED, DeliveryStatus.PICKED_UP]
+
+SEGMENT_COLUMNS = [
+    "delivery_id", "agent_id", "started_at", "ended_at", "point_count", "points",
+]
+
+_POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+# ======================================================
+# 🔁 RING BUFFER (per delivery, in this process)
+# ======================================================
+class TripRingBuffer:
+    def __init__(self):
+        self._points: dict[int, deque] = {}
+        self._agents: dict[int, int] = {}
+        self._opened: dict[int, float] = {}
+
+    def __len__(self):
+        return sum(map(len, self._points.values()))
+
+    def append(self, delivery_id: int, agent_id: int, point: tuple):
+        if delivery_id not in self._points:
+            self._points[delivery_id] = deque(maxlen=RING_SIZE)
+            self._agents[delivery_id] = agent_id
+            self._opened[delivery_id] = time.monotonic()
+        self._points[delivery_id].append(point)
+
+    def drain(self, force: bool = False) -> list[tuple]:
+        """Encode full or aged buffers into COPY-ready segment records."""
+        now = time.monotonic()
+        records = []
+
+        for delivery_id in list(self._points):
+            points = self._points[delivery_id]
+            if not (
+                force
+                or len(points) >= SEGMENT_POINTS
+                or now - self._opened[delivery_id] >= SEGMENT_MAX_AGE
+            ):
+                continue
+
+            track = sorted(points)
+            records.append((
+                delivery_id,
+                self._agents.pop(delivery_id),
+                datetime.fromtimestamp(track[0][0], timezone.utc),
+                datetime.fromtimestamp(track[-1][0], timezone.utc),
+                len(track),
+                encode_points(track),
+            ))
+            del self._points[delivery_id], self._opened[delivery_id]
+
+        return records
+
+
+# ======================================================
+# 🧮 TRIP SUMMARY (vectorised)
+# ======================================================
+def summarize_trip(track: np.ndarray) -> dict:
+    """track: (n, 3) array of ts seconds, lat, lng in any order."""
+    if len(track) < 2:
+        return {"distance_km": 0.0, "avg_speed_kmh": 0.0, "idle_seconds": 0, "trip_points": len(track)}
+
+    track = track[np.argsort(track[:, 0], kind="stable")]
+    lat = np.radians(track[:, 1])
+    lng = np.radians(track[:, 2])
+
+    a = (
+        np.sin(np.diff(lat) / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    )
+    meters = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    dt = np.diff(track[:, 0])
+
+    speed = np.divide(meters, dt, out=np.zeros_like(meters), where=dt > 0)
+    idle = float(dt[speed < IDLE_SPEED_MS].sum())
+    moving = float(track[-1, 0] - track[0, 0]) - idle
+    distance = float(meters.sum())
+
+    return {
+        "distance_km": round(distance / 1000, 3),
+        "avg_speed_kmh": round(distance / moving * 3.6, 2) if moving > 0 else 0.0,
+        "idle_seconds": int(idle),
+        "trip_points": len(track),
+    }
+
+
+async def compute_trip_summary(db, delivery_id: int) -> dict:
+    segments = (
+        await db.execute(
+            select(DeliveryLocationSegment.points)
+            .where(DeliveryLocationSegment.delivery_id == delivery_id)
+            .order_by(DeliveryLocationSegment.started_at)
+        )
+    ).scalars().all()
+
+    tracks = [decode_points(data) for data in segments]
+    summary = summarize_trip(np.vstack(tracks) if tracks else np.empty((0, 3)))
+
+    await db.execute(
+        update(Delivery).where(Delivery.id == delivery_id).values(**summary)
+    )
+    await db.commit()
+    return summary
+
+
+async def schedule_trip_summary(redis, delivery_id: int):
+    await redis.zadd(SUMMARY_KEY, {str(delivery_id): time.time() + SUMMARY_DELAY})
+
+
+# ======================================================
+# 🗄️ WORKER (Redis buffer → ring buffers → COPY segments)
+# ======================================================
+def _parse_history(raw: list[str]) -> list[tuple[int, tuple]]:
+    points = []
+    for entry in raw:
+        agent_id, ts, lat, lng = entry.split(",")
+        points.append((int(agent_id), (float(ts), float(lat), float(lng))))
+    return points
+
+
+async def _active_deliveries(db, agent_ids) -> dict[int, list[int]]:
+    rows = await db.execute(
+        select(Delivery.delivery_user_id, Delivery.id).where(
+            Delivery.delivery_user_id.in_(agent_ids),
+            Delivery.status.in_(ACTIVE_STATES),
+        )
+    )
+    by_agent: dict[int, list[int]] = {}
+    for agent_id, delivery_id in rows.all():
+        by_agent.setdefault(agent_id, []).append(delivery_id)
+    return by_agent
+
+
+async def _copy_segments(records: list[tuple]):
+    if not records:
+        return
+
+    async with AsyncSessionLocal() as db:
+        conn = await db.connection()
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.copy_records_to_table(
+            DeliveryLocationSegment.__tablename__,
+            records=records,
+            columns=SEGMENT_COLUMNS,
+        )
+        await db.commit()
+
+
+async def _buffer_history(redis, buffer: TripRingBuffer) -> int:
+    raw = await redis.lpop(HISTORY_KEY, FLUSH_BATCH)
+    if not raw:
+        return 0
+
+    points = _parse_history(raw)
+    async with AsyncSessionLocal() as db:
+        by_agent = await _active_deliveries(db, {agent_id for agent_id, _ in points})
+
+    # points outside an active delivery aren't part of any trip
+    for agent_id, point in points:
+        for delivery_id in by_agent.get(agent_id, []):
+            buffer.append(delivery_id, agent_id, point)
+
+    return len(raw)
+
+
+async def _summarize_due(redis, pop_due):
+    due = await pop_due(keys=[SUMMARY_KEY], args=[time.time(), 100])
+    if not due:
+        return
+
+    async with AsyncSessionLocal() as db:
+        for delivery_id in due:
+            await compute_trip_summary(db, int(delivery_id))
+
+
+async def run_trip_history_worker():
+    redis = await get_redis()
+    pop_due = redis.register_script(_POP_DUE)
+    buffer = TripRingBuffer()
+
+    try:
+        while True:
+            try:
+                popped = await _buffer_history(redis, buffer)
+                await _copy_segments(buffer.drain())
+                await _summarize_due(redis, pop_due)
+
+                if popped < FLUSH_BATCH:
+                    await asyncio.sleep(FLUSH_IDLE_SECONDS)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Trip history worker error: {e}")
+                await asyncio.sleep(1)
+    finally:
+        # 🧹 don't lose what this process still holds
+        if len(buffer):
+            try:
+                await _copy_segments(buffer.drain(force=True))
+            except Exception as e:
+                print(f"Trip history final flush failed: {e}")
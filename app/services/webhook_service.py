@@ -1,14 +1,260 @@
-import hmac
+import asyncio
 import hashlib
-from core.config import RAZORPAY_WEBHOOK_SECRET
+import hmac
+import json
+import os
+import socket
+
+from sqlalchemy import String, case, column, func, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.redis import get_redis
+from models.order import Order, OrderStatus
+from models.payment_webhook_event import PaymentWebhookEvent
+from services.pharmacist_assignment_service import assign_or_retry
+from utils.payment_id import generate_payment_id
+
+# ======================================================
+# 🔧 CONFIG
+# ======================================================
+STREAM_KEY = "payments:webhooks"
+CONSUMER_GROUP = "payment-webhook-workers"
+
+BATCH_SIZE = 200
+BLOCK_MS = 5000
+RECLAIM_IDLE_MS = 60_000   # re-take events a crashed worker never acked
+
+CAPTURED_EVENTS = {"payment.captured", "order.paid"}
+FAILED_EVENTS = {"payment.failed"}
+
+PAYABLE_STATES = [
+    OrderStatus.PENDING,
+    OrderStatus.PAYMENT_INITIATED,
+    OrderStatus.PAID,
+]
+
 
 class WebhookService:
 
     def verify_razorpay(self, body: bytes, signature: str):
+        if not settings.RAZORPAY_WEBHOOK_SECRET:
+            return False
+
         expected = hmac.new(
-            RAZORPAY_WEBHOOK_SECRET.encode(),
+            settings.RAZORPAY_WEBHOOK_SECRET.encode(),
             body,
             hashlib.sha256
         ).hexdigest()
 
-        return hmac.compare_digest(expected, signature)
+        return hmac.compare_digest(expected, signature or "")
+
+    # ======================================================
+    # 📥 INGEST (HTTP PATH – no DB work)
+    # ======================================================
+    async def enqueue(self, redis, event_id: str, body: bytes):
+        await redis.xadd(
+            STREAM_KEY,
+            {"event_id": event_id, "body": body.decode("utf-8")},
+        )
+
+
+webhook_service = WebhookService()
+
+
+# ======================================================
+# 🧩 PARSE
+# ======================================================
+def _parse_event(event_id: str, raw: str) -> dict | None:
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+
+    payload = data.get("payload", {})
+    payment = payload.get("payment", {}).get("entity", {})
+    order = payload.get("order", {}).get("entity", {})
+
+    return {
+        "event_id": event_id,
+        "event_type": data.get("event", ""),
+        "created_at": data.get("created_at", 0),
+        "razorpay_order_id": payment.get("order_id") or order.get("id"),
+        "razorpay_payment_id": payment.get("id"),
+    }
+
+
+# ======================================================
+# ✅ APPLY A BATCH (IDEMPOTENT)
+# ======================================================
+async def apply_webhook_events(db: AsyncSession, messages) -> list[int]:
+    """
+    Apply a batch of stream entries in one transaction.
+    Returns the order ids that became paid in this batch.
+    """
+    events = {}
+    for _msg_id, fields in messages:
+        event = _parse_event(fields.get("event_id", ""), fields.get("body", ""))
+        if event and event["event_id"]:
+            events[event["event_id"]] = event
+
+    if not events:
+        return []
+
+    # 1️⃣ Dedup by event id – only unseen ids come back
+    fresh = set(
+        (
+            await db.execute(
+                insert(PaymentWebhookEvent)
+                .values([
+                    {
+                        "event_id": e["event_id"],
+                        "event_type": e["event_type"],
+                        "razorpay_order_id": e["razorpay_order_id"],
+                    }
+                    for e in events.values()
+                ])
+                .on_conflict_do_nothing(index_elements=["event_id"])
+                .returning(PaymentWebhookEvent.event_id)
+            )
+        ).scalars()
+    )
+
+    # 2️⃣ Collapse to the final state per gateway order
+    captured: dict[str, str] = {}
+    failed: set[str] = set()
+
+    for e in sorted(events.values(), key=lambda e: e["created_at"]):
+        oid = e["razorpay_order_id"]
+        if e["event_id"] not in fresh or not oid:
+            continue
+
+        if e["event_type"] in CAPTURED_EVENTS:
+            captured[oid] = e["razorpay_payment_id"] or captured.get(oid)
+            failed.discard(oid)
+        elif e["event_type"] in FAILED_EVENTS and oid not in captured:
+            failed.add(oid)
+
+    paid_order_ids = []
+
+    # 3️⃣ One UPDATE ... FROM (VALUES ...) for every captured order
+    if captured:
+        rows = values(
+            column("rzp_order_id", String),
+            column("rzp_payment_id", String),
+            column("payment_id", String),
+            name="captured",
+        ).data([
+            (oid, pid, generate_payment_id())
+            for oid, pid in captured.items()
+        ])
+
+        result = await db.execute(
+            update(Order)
+            .where(
+                Order.razorpay_order_id == rows.c.rzp_order_id,
+                Order.payment_status != "SUCCESS",
+            )
+            .values(
+                payment_status="SUCCESS",
+                payment_method="RAZORPAY",
+                razorpay_payment_id=func.coalesce(
+                    rows.c.rzp_payment_id, Order.razorpay_payment_id
+                ),
+                payment_id=func.coalesce(Order.payment_id, rows.c.payment_id),
+                status=case(
+                    (Order.status.in_(PAYABLE_STATES), OrderStatus.WAITING_PHARMACIST),
+                    else_=Order.status,
+                ),
+            )
+            .returning(Order.id, Order.status)
+            .execution_options(synchronize_session=False)
+        )
+        paid_order_ids = [
+            order_id
+            for order_id, status in result.all()
+            if status == OrderStatus.WAITING_PHARMACIST
+        ]
+
+    # 4️⃣ Failed payments never downgrade a successful one
+    if failed:
+        await db.execute(
+            update(Order)
+            .where(
+                Order.razorpay_order_id.in_(failed),
+                Order.payment_status != "SUCCESS",
+            )
+            .values(payment_status="FAILED")
+            .execution_options(synchronize_session=False)
+        )
+
+    await db.commit()
+    return paid_order_ids
+
+
+# ======================================================
+# 🔁 WORKER LOOP
+# ======================================================
+async def _ensure_group(redis):
+    try:
+        await redis.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _handle(redis, messages):
+    if not messages:
+        return
+
+    async with AsyncSessionLocal() as db:
+        paid_order_ids = await apply_webhook_events(db, messages)
+
+        # 🔔 Notify pharmacists for orders that just became paid.
+        # The events are already deduped, so a failure here must not
+        # rely on redelivery – it goes to the dispatch scheduler instead.
+        for order_id in paid_order_ids:
+            await assign_or_retry(db, redis, order_id)
+
+    ids = [msg_id for msg_id, _ in messages]
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        await pipe.execute()
+
+
+async def run_webhook_worker(consumer: str | None = None):
+    redis = await get_redis()
+    consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+    await _ensure_group(redis)
+
+    while True:
+        try:
+            # ♻️ events left pending by a dead consumer
+            _, stale, _ = await redis.xautoclaim(
+                STREAM_KEY,
+                CONSUMER_GROUP,
+                consumer,
+                min_idle_time=RECLAIM_IDLE_MS,
+                start_id="0-0",
+                count=BATCH_SIZE,
+            )
+            await _handle(redis, stale)
+
+            response = await redis.xreadgroup(
+                CONSUMER_GROUP,
+                consumer,
+                {STREAM_KEY: ">"},
+                count=BATCH_SIZE,
+                block=BLOCK_MS,
+            )
+            for _stream, messages in response or []:
+                await _handle(redis, messages)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Webhook worker error: {e}")
+            await asyncio.sleep(1)
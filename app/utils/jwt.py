@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from fastapi import Request
 from jose import jwt
@@ -16,3 +17,29 @@ def create_access_token(data: dict):
         algorithm=settings.ALGORITHM
     )
 
+
+# ======================================================
+# 🔌 WEBSOCKET RECONNECT TOKEN
+# short-lived, only valid for re-opening a /ws/* socket and
+# never valid past the access token the session started with
+# ======================================================
+WS_RECONNECT_TOKEN_MINUTES = 10
+WS_RECONNECT_TYP = "ws_reconnect"   # every HTTP auth path rejects this typ
+
+
+def create_ws_reconnect_token(user_id: int, role: str, session_exp: int):
+    exp = min(
+        int(time.time()) + WS_RECONNECT_TOKEN_MINUTES * 60,
+        int(session_exp),
+    )
+    return jwt.encode(
+        {
+            "sub": str(user_id),
+            "role": role,
+            "typ": WS_RECONNECT_TYP,
+            "session_exp": int(session_exp),
+            "exp": exp,
+        },
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
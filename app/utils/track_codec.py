@@ -0,0 +1,62 @@
+import numpy as np
+
+# ======================================================
+# 🗜️ GPS TRACK CODEC
+# (ts, lat, lng) → delta + zigzag + varint bytes
+#   ts  : milliseconds
+#   lat/lng : 1e-5 degrees (~1.1 m), same precision as Google polylines
+# consecutive pings differ by a few hundred units, so most deltas fit
+# in 1–2 bytes instead of 24 bytes of floats per point
+# ======================================================
+COORD_SCALE = 100_000
+TS_SCALE = 1000
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def encode_points(points) -> bytes:
+    """points: iterable of (ts_seconds, lat, lng), already time-ordered."""
+    out = bytearray()
+    prev = (0, 0, 0)
+
+    for ts, lat, lng in points:
+        current = (
+            round(ts * TS_SCALE),
+            round(lat * COORD_SCALE),
+            round(lng * COORD_SCALE),
+        )
+        for value, last in zip(current, prev):
+            n = _zigzag(value - last)
+            while n >= 0x80:
+                out.append((n & 0x7F) | 0x80)
+                n >>= 7
+            out.append(n)
+        prev = current
+
+    return bytes(out)
+
+
+def decode_points(data: bytes) -> np.ndarray:
+    """Returns an (n, 3) float array of ts seconds, lat, lng."""
+    deltas = []
+    n = shift = 0
+
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        deltas.append(_unzigzag(n))
+        n = shift = 0
+
+    if not deltas:
+        return np.empty((0, 3))
+
+    values = np.cumsum(np.array(deltas, dtype=np.int64).reshape(-1, 3), axis=0)
+    return values / np.array([TS_SCALE, COORD_SCALE, COORD_SCALE], dtype=np.float64)